@@ -2,7 +2,7 @@ import os
 import json
 import dotenv
 
-from typing import Tuple, Optional, Dict, TypedDict
+from typing import Any, Tuple, Optional, Dict, TypedDict
 
 from clova.general.logger import BaseLogger
 
@@ -36,6 +36,7 @@ class ConfigPersona(TypedDict):
 class ConfigCharacter(TypedDict):
     tts: ConfigTTS
     persona: ConfigPersona
+    playback_speed: float
 
 
 class SystemConfig(TypedDict):
@@ -71,21 +72,99 @@ class ConfigSNS(TypedDict):
     line: ConfigLine
 
 
+class ConfigVAD(TypedDict):
+    system: str
+    params: Dict[str, float]
+
+
+class ConfigWakeWordParams(TypedDict, total=False):
+    sensitivity: float
+    threshold: float
+    template_dir: str
+
+
+class ConfigWakeWord(TypedDict):
+    system: Optional[str]
+    armed_duration: int
+    params: ConfigWakeWordParams
+
+
 class ConfigMicrophone(TypedDict):
     num_ch: int
-    index: int
+    index: Optional[int]
+    device_name: Optional[str]
     silent_thresh: int
     term_duration: int
+    min_term_duration: int
+    follow_up_term_duration: int
+    pre_roll_duration: int
+    trail_duration: int
+    channel_mode: str
+    vad: ConfigVAD
+    wake_word: ConfigWakeWord
+
+
+class ConfigMixer(TypedDict):
+    control: str
+    card: int
+
+
+class ConfigPlaybackSpeed(TypedDict):
+    base: float
+    step: float
+    skills: Dict[str, float]
 
 
 class ConfigSpeaker(TypedDict):
     num_ch: int
-    index: int
+    index: Optional[int]
+    device_name: Optional[str]
+    block_frames: int
+    limiter_threshold: Optional[float]
+    duck_gain: float
+    mixer: Optional[ConfigMixer]
+    speed: ConfigPlaybackSpeed
+
+
+class ConfigBargeIn(TypedDict):
+    enabled: bool
+    min_speech_duration: int
+    warm_up: int
+    params: Dict[str, float]
+
+
+class ConfigEarcon(TypedDict):
+    enabled: bool
+    level: float
+    thinking_delay: int
+    files: Dict[str, str]
+
+
+class ConfigTTSCache(TypedDict):
+    enabled: bool
+    max_size_mb: int
+
+
+class ConfigTTSChunk(TypedDict):
+    enabled: bool
+    first_duration: float
+    target_duration: float
+
+
+class ConfigAudioBackend(TypedDict):
+    system: str
+    params: Dict[str, Any]
 
 
 class ConfigAudio(TypedDict):
+    backend: ConfigAudioBackend
     microphone: ConfigMicrophone
     speaker: ConfigSpeaker
+    barge_in: ConfigBargeIn
+    earcon: ConfigEarcon
+    tts_cache: ConfigTTSCache
+    tts_lookahead: int
+    tts_chunk: ConfigTTSChunk
 
 
 class ConfigHardware(TypedDict):
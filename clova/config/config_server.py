@@ -1,4 +1,5 @@
 import json
+import time
 import http.server
 from socket import socket
 from socketserver import BaseServer
@@ -7,10 +8,12 @@ from typing import Tuple, Union
 
 from urllib.parse import parse_qs
 
-from clova.general.globals import global_config_prov
+from clova.general.globals import global_config_prov, global_mic_level
 
 from clova.general.logger import BaseLogger
 
+LEVEL_STREAM_INTERVAL = 0.2  # マイクのレベルを送る間隔 (秒)
+
 # TODO: add support for changing apis
 # TODO: add support for checking new config meets requirements before changing
 
@@ -21,10 +24,17 @@ from clova.general.logger import BaseLogger
 
 class HttpReqSettingHandler(http.server.BaseHTTPRequestHandler, BaseLogger):
     def __init__(self, request: Union[socket, Tuple[bytes, socket]], client_address: Tuple[str, int], server: BaseServer) -> None:
+        # BaseHTTPRequestHandler はコンストラクタ内でリクエストを処理するため、ログの初期化を先に行う
+        BaseLogger.__init__(self)
         super().__init__(request, client_address, server)
 
     # GETリクエストを受け取った場合の処理
     def do_GET(self) -> None:
+        # マイクのレベル (設定画面から Server-Sent Events で受け取る)
+        if self.path.split("?")[0] == "/levels":
+            self.stream_levels()
+            return
+
         # キャラクタの選択肢を作成する。
         with open("./assets/CLOVA_systems.json", "r", encoding="utf-8") as char_file:
             file_text = char_file.read()
@@ -62,6 +72,20 @@ class HttpReqSettingHandler(http.server.BaseHTTPRequestHandler, BaseLogger):
         self.end_headers()
         self.wfile.write(html.encode("utf-8"))
 
+    # マイクのレベルを、ページを閉じるまで一定間隔で送り続ける
+    def stream_levels(self) -> None:
+        self.send_response(200)
+        self.send_header("Content-type", "text/event-stream; charset=utf-8")
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        try:
+            while True:
+                self.wfile.write("data: {}\n\n".format(json.dumps(global_mic_level.snapshot(), ensure_ascii=False)).encode("utf-8"))
+                self.wfile.flush()
+                time.sleep(LEVEL_STREAM_INTERVAL)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
     # POSTリクエストを受け取った場合の処理
     def do_POST(self) -> None:
         sys_config = global_config_prov.get_user_config()
@@ -1,9 +1,12 @@
 import datetime
-from typing import Dict, Union, Type, List, Callable, Optional
+import threading
+from typing import Dict, Union, Type, List, Callable, Optional, Tuple
 
 from clova.processor.conversation.base_conversation import BaseConversationProvider
 from clova.processor.conversation.chatgpt import OpenAIChatGPTConversationProvider
 from clova.processor.conversation.bard import BardConversationProvider
+from clova.processor.conversation.sentence import SentenceSplitter
+from clova.processor.tts.chunker import UtteranceChunker, TTS_CHUNK_DEFAULT_FIRST_DURATION, TTS_CHUNK_DEFAULT_TARGET_DURATION
 
 from clova.processor.skill.base_skill import BaseSkillProvider
 from clova.processor.skill.timer import TimerSkillProvider
@@ -13,11 +16,14 @@ from clova.processor.skill.line import LineSkillProvider
 from clova.processor.skill.datetime import DateTimeSkillProvider
 from clova.processor.skill.music import MusicSkillProvider
 from clova.processor.skill.alarm import AlarmSkillProvider
+from clova.processor.skill.speed import SpeedSkillProvider
 
-from clova.general.globals import global_speech_queue, global_config_prov, global_character_prov, global_led_ill, GLOBAL_CHARACTER_CONFIG_PROMPT
+from clova.general.globals import global_speech_queue, global_config_prov, global_character_prov, global_led_ill, global_playback_speed, global_tts_rate, GLOBAL_CHARACTER_CONFIG_PROMPT
 
 from clova.general.logger import BaseLogger
 
+SKILL_CALL_PREFIX = "CALL_"  # AI がスキルを呼び出す応答の先頭
+
 # ==================================
 #          会話制御クラス
 # ==================================
@@ -30,7 +36,7 @@ class ConversationController(BaseLogger):
     }
     SKILL_MODULES: List[BaseSkillProvider] = [
         TimerSkillProvider(), NewsSkillProvider(), WeatherSkillProvider(), LineSkillProvider(),
-        DateTimeSkillProvider(), MusicSkillProvider(), AlarmSkillProvider()
+        DateTimeSkillProvider(), MusicSkillProvider(), AlarmSkillProvider(), SpeedSkillProvider()
     ]
 
     # コンストラクタ
@@ -52,21 +58,33 @@ class ConversationController(BaseLogger):
 
         return None
 
+    # 直前の応答がユーザーへの質問か (問いかけごとに 1 回呼ぶ)
+    def expects_follow_up(self, answer: str) -> bool:
+        # スキルの状態は読むと消えるので、途中で打ち切らずにすべて読む
+        skill_follow_up = [skill.expects_follow_up() for skill in self.SKILL_MODULES]
+        if answer.rstrip().endswith(("？", "?")):
+            return True
+
+        return any(skill_follow_up)
+
     # 問いかけに答える
-    def get_answer(self, prompt: str) -> str:
+    #   on_sentence を指定した場合は、AI の応答を生成しながら、完成した文から順に渡す
+    #   (名前・スキルへの応答など、一度に決まる応答は行ごとに渡す)。戻り値は応答全体
+    def get_answer(self, prompt: str, on_sentence: Optional[Callable[[str], None]] = None) -> str:
         # 無言なら無応答
         if (prompt == ""):
             return ""
 
         # 名前に応答
         if ((prompt == "ねえクローバー") or (prompt == "ねえクローバ")):
-            return "はい。何でしょう。"
+            return self._deliver("はい。何でしょう。", on_sentence)
 
-        # スキル
+        # スキル (応答の読み上げには、応答したスキルの再生速度を使う)
         for skill in self.SKILL_MODULES:
             result = skill.try_get_answer(prompt, not self.provider.supports_prompt_skill())
             if result is not None:
-                return result
+                global_playback_speed.set_skill(type(skill).__name__)
+                return self._deliver(result, on_sentence)
 
         # どれにも該当しないときには AI に任せる。
         kwargs = global_config_prov.get_user_config()["apis"]["conversation"]["params"] or {}
@@ -84,19 +102,146 @@ class ConversationController(BaseLogger):
         # 底面 LED をピンクに
         global_led_ill.set_all(global_led_ill.RGB_PINK)
 
-        result = self.provider.get_answer(actual_prompt, **kwargs)
+        global_playback_speed.set_skill(None)
+        if on_sentence is None:
+            result = self.provider.get_answer(actual_prompt, **kwargs) or ""
+            delivered = False
+        else:
+            result, delivered = self._stream_answer(actual_prompt, kwargs, on_sentence)
 
         if not result:
             # AI が利用不可の場合は謝るしかない…
-            return "すみません。質問が理解できませんでした。"
+            return self._deliver("すみません。質問が理解できませんでした。", on_sentence)
 
         # スキル (post process)
-        for skill in self.SKILL_MODULES:
-            response = skill.try_get_answer_post_process(result)
-            if response is not None:
-                return response
+        if not delivered:
+            for skill in self.SKILL_MODULES:
+                response = skill.try_get_answer_post_process(result)
+                if response is not None:
+                    global_playback_speed.set_skill(type(skill).__name__)
+                    return self._deliver(response, on_sentence)
+
+        return result if delivered else self._deliver(result, on_sentence)
+
+    # 一度に決まった応答を行ごとに渡す
+    def _deliver(self, answer: str, on_sentence: Optional[Callable[[str], None]]) -> str:
+        if on_sentence is not None:
+            for line in answer.split("\n"):
+                on_sentence(line)
+        return answer
+
+    # AI の応答を生成しながら、完成した文から on_sentence に渡す
+    # 応答が CALL_ で始まる場合 (スキルの呼び出し) は読み上げずに最後まで受け取る
+    # 戻り値: (応答全体, 文を渡したか)
+    def _stream_answer(self, prompt: str, kwargs: Dict[str, str], on_sentence: Callable[[str], None]) -> Tuple[str, bool]:
+        splitter = SentenceSplitter()
+        text = ""
+        streaming = False
+        for chunk in self.provider.stream_answer(prompt, **kwargs):
+            text += chunk
+            if not streaming:
+                # CALL_ で始まるかどうか分かるまでは溜めておく
+                if text.startswith(SKILL_CALL_PREFIX) or SKILL_CALL_PREFIX.startswith(text):
+                    continue
+                streaming = True
+                chunk = text
+            for sentence in splitter.feed(chunk):
+                on_sentence(sentence)
+
+        if not streaming:
+            return text, False
+        for sentence in splitter.flush():
+            on_sentence(sentence)
+        return text, True
+
+
+# ==================================
+#        応答の生成タスククラス
+# ==================================
+
+
+class StreamingAnswer(BaseLogger):
+    # 問いかけへの応答をバックグラウンドで生成し、完成した文から発話キューに追加する
+    # (応答全体の生成を待たずに、最初の文の音声合成・再生を始められる)
+    # 文・行は UtteranceChunker で音声合成 1 回分の長さにまとめ直してから追加する
+    # (まとめている途中でも、再生する音声が尽きたらその分を追加する)
+
+    # コンストラクタ
+    def __init__(self, conv: ConversationController, prompt: str) -> None:
+        super().__init__()
+
+        chunk_conf = global_config_prov.get_user_config()["hardware"]["audio"].get("tts_chunk", {"enabled": True,
+                                                                                               "first_duration": TTS_CHUNK_DEFAULT_FIRST_DURATION,
+                                                                                               "target_duration": TTS_CHUNK_DEFAULT_TARGET_DURATION})
+        self._chunker: Optional[UtteranceChunker] = None
+        if chunk_conf["enabled"]:
+            self._chunker = UtteranceChunker(global_tts_rate, chunk_conf.get("first_duration", TTS_CHUNK_DEFAULT_FIRST_DURATION),
+                                             chunk_conf.get("target_duration", TTS_CHUNK_DEFAULT_TARGET_DURATION))
+
+        self.result = ""
+        self._cond = threading.Condition()
+        self._done = False
+        self._cancelled = False
+        self._thread = threading.Thread(target=self._run, args=[conv, prompt], daemon=True)
+        self._thread.start()
+
+    # デストラクタ
+    def __del__(self) -> None:
+        super().__del__()
+
+    def _run(self, conv: ConversationController, prompt: str) -> None:
+        result = ""
+        try:
+            result = conv.get_answer(prompt, self._add_sentence)
+        except Exception as e:
+            self.log("_run", "応答の生成に失敗しました:{}".format(e))
+        finally:
+            with self._cond:
+                if self._chunker is not None:
+                    self._push(self._chunker.drain())
+                self.result = result
+                self._done = True
+                self._cond.notify_all()
+
+    def _add_sentence(self, sentence: str) -> None:
+        with self._cond:
+            self._push(self._chunker.add(sentence) if self._chunker is not None else [sentence])
+
+    # 発話キューに追加する (ロックを取った状態で呼ぶ)
+    def _push(self, chunks: List[str]) -> None:
+        # 打ち切った後の文は読み上げない
+        if self._cancelled:
+            return
+        for chunk in chunks:
+            global_speech_queue.add(chunk)
+        self._cond.notify_all()
+
+    # 発話キューに読み上げる文が入るか、応答の生成が終わるまで待つ
+    # 戻り値: 生成が終わった (または打ち切った) か
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        # 再生する音声が無い時は、まとめている途中の文があれば待たずに戻って読み上げる
+        def idle_with_pending() -> bool:
+            return len(global_speech_queue) == 0 and self._chunker is not None and self._chunker.pending
+
+        with self._cond:
+            self._cond.wait_for(lambda: self._done or self._cancelled or len(global_speech_queue) > 0 or idle_with_pending(), timeout)
+            if idle_with_pending():
+                assert self._chunker is not None
+                self._push(self._chunker.drain())
+            return self._done or self._cancelled
+
+    # 応答の読み上げを打ち切る (生成は止められないが、以降の文は発話キューに追加しない)
+    def cancel(self) -> None:
+        with self._cond:
+            if not self._done and not self._cancelled:
+                self.log("cancel", "応答の読み上げを打ち切ります")
+            self._cancelled = True
+            self._cond.notify_all()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled
 
-        return result
 
 # ==================================
 #       本クラスのテスト用処理
@@ -104,8 +249,97 @@ class ConversationController(BaseLogger):
 
 
 def module_test() -> None:
-    # 現状何もしない
-    pass
+    import time
+    from unittest import mock
+    from typing import Iterator
+
+    class StreamingProvider(BaseConversationProvider):
+        def __init__(self, chunks: List[str]) -> None:
+            self.chunks = chunks
+
+        def set_persona(self, prompt: str, **kwargs: str) -> None:
+            pass
+
+        def supports_prompt_skill(self) -> bool:
+            return True
+
+        def get_answer(self, prompt: str, **kwargs: str) -> Optional[str]:
+            return "".join(self.chunks)
+
+        def stream_answer(self, prompt: str, **kwargs: str) -> Iterator[str]:
+            for chunk in self.chunks:
+                time.sleep(0.1)
+                yield chunk
+
+    global_character_prov.get_character_settings()  # キャラクタを選択 (プロンプトに使う)
+    conv = ConversationController()
+    sentences: List[Tuple[str, float]] = []
+
+    # 最初の文は、応答全体 (0.6 秒) を待たずに届く
+    conv.provider = StreamingProvider(["こんにちは", "！今日は", "いい天気", "ですね。", "散歩は", "いかが？"])
+    start = time.perf_counter()
+    result = conv.get_answer("調子はどう", lambda sentence: sentences.append((sentence, time.perf_counter() - start)))
+    print(sentences)
+    assert result == "こんにちは！今日はいい天気ですね。散歩はいかが？"
+    assert [s for s, _ in sentences] == ["こんにちは！", "今日はいい天気ですね。", "散歩はいかが？"]
+    assert sentences[0][1] < 0.3 and sentences[1][1] < 0.6
+
+    # スキルの呼び出しは読み上げずに、スキルの応答を渡す
+    sentences.clear()
+    conv.provider = StreamingProvider(["CAL", "L_DATE", "TIME date\n"])
+    result = conv.get_answer("今何時", lambda sentence: sentences.append((sentence, 0.0)))
+    print(sentences)
+    assert len(sentences) == 1 and sentences[0][0] == result and result.startswith("今は")
+
+    # ニュースの番号を尋ねた直後だけ短い返答を待ち、関係の無い問いかけの後は通常の待ち受けに戻る
+    headlines_html = '<a href="https://news.yahoo.co.jp/pickup/1">見出しA</a><a href="https://news.yahoo.co.jp/pickup/2">見出しB</a>'
+    with mock.patch("clova.processor.skill.news.requests.get", return_value=mock.Mock(content=headlines_html.encode())):
+        conv.provider = StreamingProvider(["CALL_NEWS トップ"])
+        result = conv.get_answer("ニュースを教えて")
+    assert "選んでください" in result and conv.expects_follow_up(result)
+    conv.provider = StreamingProvider(["今日は晴れです。"])
+    result = conv.get_answer("今日の天気は")
+    assert result == "今日は晴れです。" and not conv.expects_follow_up(result)
+
+    # 発話キューへの追加
+    global_speech_queue.clear()
+    conv.provider = StreamingProvider(["はい。", "わかりました。"])
+    answering = StreamingAnswer(conv, "調子はどう")
+    answering.wait()
+    assert global_speech_queue.get() == "はい。"
+    while not answering.wait():
+        time.sleep(0.05)
+    assert answering.result == "はい。わかりました。" and global_speech_queue.peek(2) == ["わかりました。"]
+
+    # 再生を待っている間に届いた短い行は、まとめて追加する
+    global_speech_queue.clear()
+    conv.provider = StreamingProvider(["以下のニュースがあります。\n", "1. 見出しA\n", "2. 見出しB\n", "3. 見出しC\n"])
+    answering = StreamingAnswer(conv, "調子はどう")
+    while not answering.wait():
+        time.sleep(0.05)
+    assert global_speech_queue.peek(3) == ["以下のニュースがあります。", "1. 見出しA。2. 見出しB。3. 見出しC"]
+
+    # 再生する音声が尽きたら、まとめている途中の行を待たずに追加する
+    global_speech_queue.clear()
+    answering = StreamingAnswer(conv, "調子はどう")
+    answering.wait()
+    assert global_speech_queue.get() == "以下のニュースがあります。"
+    time.sleep(0.15)
+    started = time.perf_counter()
+    assert not answering.wait(1.0) and time.perf_counter() - started < 0.05
+    assert global_speech_queue.peek(2) == ["1. 見出しA"]
+    while not answering.wait():
+        time.sleep(0.05)
+
+    # 打ち切った後の文は追加しない
+    global_speech_queue.clear()
+    conv.provider = StreamingProvider(["はい。", "わかりました。", "以上です。"])
+    answering = StreamingAnswer(conv, "調子はどう")
+    answering.wait()
+    answering.cancel()
+    time.sleep(0.4)
+    assert answering.wait() and global_speech_queue.peek(3) == ["はい。"]
+    print("ConversationController OK")
 
 
 # ==================================
@@ -0,0 +1,173 @@
+import threading
+import numpy as np
+import numpy.typing as npt
+
+from typing import Callable, Dict, Optional
+
+from clova.general.globals import global_vol
+
+from clova.io.local.speaker import AudioMixer
+
+from clova.processor.audio.decoder import decode_audio
+from clova.processor.audio.dsp import GainStage
+
+from clova.general.logger import BaseLogger
+
+# 効果音の名前
+EARCON_LISTEN_END = "listen_end"  # 聞き取り終了
+EARCON_THINKING = "thinking"  # 応答待ち (繰り返し再生)
+
+EARCON_MAX_QUEUED_SECONDS = 2.0
+
+# ==================================
+#          効果音の生成処理
+# ==================================
+
+
+# 聞き取り終了: 上がっていく 2 音のチャイム (0.3 秒)
+def synthesize_listen_end(rate: int) -> npt.NDArray[np.float32]:
+    out = np.zeros(int(rate * 0.3), dtype=np.float32)
+    for start, freq in ((0.0, 1046.5), (0.09, 1568.0)):
+        t = np.arange(len(out) - int(rate * start)) / rate
+        tone = np.sin(2 * np.pi * freq * t) + 0.3 * np.sin(2 * np.pi * freq * 2 * t)
+        out[int(rate * start):] += (tone * np.exp(-t * 18) * np.minimum(1.0, t * 400)).astype(np.float32)
+    return out / np.float32(np.abs(out).max())
+
+
+# 応答待ち: 柔らかく膨らんで消える低めの音 + 無音 (1 周期 1.2 秒)
+def synthesize_thinking(rate: int) -> npt.NDArray[np.float32]:
+    out = np.zeros(int(rate * 1.2), dtype=np.float32)
+    n = int(rate * 0.4)
+    t = np.arange(n) / rate
+    envelope = np.sin(np.pi * np.arange(n) / n) ** 2
+    out[:n] = ((np.sin(2 * np.pi * 523.3 * t) + 0.5 * np.sin(2 * np.pi * 784.0 * t)) * envelope / 1.5).astype(np.float32)
+    return out
+
+
+EARCON_SYNTHESIZERS: Dict[str, Callable[[int], npt.NDArray[np.float32]]] = {
+    EARCON_LISTEN_END: synthesize_listen_end,
+    EARCON_THINKING: synthesize_thinking,
+}
+
+# ==================================
+#         効果音再生クラス
+# ==================================
+
+
+class EarconPlayer(BaseLogger):
+    # 効果音を起動時に再生形式 (ミキサーのサンプリングレート・チャンネル数) の PCM にしてメモリに置き、
+    # 再生時はミキサーの効果音用の音源に書き込むだけにする (ネットワーク・ffmpeg・デコードの待ち時間が無い)
+    #   level: 効果音の音量 (フルスケールに対する割合。さらにボリューム倍率を掛ける)
+    #   files: 効果音の名前 -> 音声ファイル (指定が無いものは生成した音を使う)
+
+    # コンストラクタ
+    def __init__(self, mixer: AudioMixer, enabled: bool, level: float, files: Dict[str, str]) -> None:
+        super().__init__()
+
+        self.enabled = enabled
+        self._source = mixer.open_source("earcon", EARCON_MAX_QUEUED_SECONDS)
+        self._cues: Dict[str, npt.NDArray[np.float32]] = {}
+        for name, synthesize in EARCON_SYNTHESIZERS.items():
+            self._cues[name] = self._load(name, files.get(name), synthesize, mixer.rate, mixer.num_ch, level)
+
+        self._gain = GainStage(max(len(cue) for cue in self._cues.values()), mixer.num_ch)
+        self._lock = threading.Lock()
+        self._loop_stop = threading.Event()
+        self._loop_thread: Optional[threading.Thread] = None
+
+    # デストラクタ
+    def __del__(self) -> None:
+        super().__del__()
+
+    # (フレーム, チャンネル) の float32 (S16 相当のスケール) にする
+    def _load(self, name: str, path: Optional[str], synthesize: Callable[[int], npt.NDArray[np.float32]], rate: int, num_ch: int, level: float) -> npt.NDArray[np.float32]:
+        if path:
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+                cue = np.concatenate(list(decode_audio(data, rate, num_ch, rate)))
+                self.log("_load", "{}: {} ({:.2f}秒)".format(name, path, len(cue) / rate))
+                return np.asarray(cue * np.float32(level), dtype=np.float32)
+            except Exception as e:
+                self.log("_load", "{}: {} を読み込めないため既定の音を使います ({})".format(name, path, e))
+
+        mono = synthesize(rate) * np.float32(32767 * level)
+        return np.asarray(np.repeat(mono[:, None], num_ch, axis=1), dtype=np.float32)
+
+    # 効果音を再生する (再生し終わるのを待たない)
+    def play(self, name: str) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._source.write(self._gain.process(self._cues[name], global_vol.vol_value))
+
+    # delay (ms) 経っても stop_loop() が呼ばれなければ、止めるまで効果音を繰り返し再生する
+    def start_loop(self, name: str, delay: float) -> None:
+        if not self.enabled:
+            return
+        self.stop_loop()
+        self._loop_stop.clear()
+        self._loop_thread = threading.Thread(target=self._loop, args=[name, delay / 1000], daemon=True)
+        self._loop_thread.start()
+
+    # 繰り返し再生を止める (再生中の 1 回分は最後まで鳴らす。続けて音声を再生すると音量が下がる)
+    def stop_loop(self) -> None:
+        if self._loop_thread is not None:
+            self._loop_stop.set()
+            self._loop_thread.join()
+            self._loop_thread = None
+
+    def _loop(self, name: str, delay: float) -> None:
+        if self._loop_stop.wait(delay):
+            return
+
+        self.log("_loop", "応答待ちの効果音を開始")
+        period = len(self._cues[name]) / self._source.rate
+        while True:
+            self.play(name)
+            # 再生キューが空になる少し前に次の 1 回を書き込む (周期が途切れないよう余裕を持たせる)
+            if self._loop_stop.wait(max(0.0, period - 0.2)):
+                break
+
+
+# ==================================
+#       本クラスのテスト用処理
+# ==================================
+
+
+def module_test() -> None:
+    import time
+    from clova.io.local.audio.null import NullAudioBackend
+
+    mixer = AudioMixer(NullAudioBackend(), 1, 0, 16000, 256)
+    mixer.start = lambda: None  # type: ignore[method-assign]
+    earcon = EarconPlayer(mixer, True, 0.3, {})
+
+    # 再生は書き込むだけで、すぐに戻る
+    started = time.perf_counter()
+    earcon.play(EARCON_LISTEN_END)
+    print("play(): {:.2f}ms, queued {} bytes".format((time.perf_counter() - started) * 1000, earcon._source.queued_bytes))
+    assert earcon._source.queued_bytes == len(earcon._cues[EARCON_LISTEN_END]) * 2
+    peak = np.abs(np.frombuffer(mixer.mix(4800), dtype=np.int16)).max()
+    assert 0.25 * 32767 < peak <= 0.3 * 32767 + 1, peak
+    earcon._source.flush()
+
+    # 遅延より早く止めれば鳴らない
+    earcon.start_loop(EARCON_THINKING, 200)
+    time.sleep(0.05)
+    earcon.stop_loop()
+    assert earcon._source.queued_bytes == 0
+
+    # 遅延後は止めるまで繰り返す
+    earcon.start_loop(EARCON_THINKING, 50)
+    time.sleep(0.15)
+    assert earcon._source.queued_bytes > 0
+    earcon.stop_loop()
+    print("EarconPlayer OK")
+
+
+# ==================================
+# 本モジュールを直接呼出した時の処理
+# ==================================
+if __name__ == "__main__":
+    module_test()
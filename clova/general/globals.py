@@ -3,10 +3,21 @@ from clova.config.character import CHARACTER_CONFIG_PROMPT as GLOBAL_CHARACTER_C
 from clova.config.character import CharacterProvider
 from clova.config.config import ConfigurationProvider
 from clova.general.queue import SpeechQueue
+from clova.general.speed import PlaybackSpeedController
 from clova.io.local.db import Database
 from clova.io.local.led import IllminationLed
+from clova.io.local.audio.backends import create_audio_backend
+from clova.io.local.audio.discovery import AudioDeviceResolver
+from clova.io.local.speaker import AudioMixer
 from clova.io.local.volume import VolumeController
 from clova.io.network.debug_interface import RemoteInteractionInterface
+from clova.processor.vad.calibration import MicLevelMeter
+from clova.processor.tts.chunker import SynthesisRate
+
+# 再生設定 (すべての音声はこの形式で常時再生ストリームに書き込む)
+GLOBAL_PLAY_RATE = 44100
+GLOBAL_PLAY_SIZEOF_CHUNK = 1024  # 再生コールバック 1 回あたりのフレーム数
+GLOBAL_PLAY_MAX_QUEUED_SECONDS = 1.0  # 再生キューに先行して溜めておく最大の長さ
 
 global_config_prov = ConfigurationProvider()
 global_speech_queue = SpeechQueue()
@@ -14,6 +25,23 @@ global_led_ill = IllminationLed()
 global_db = Database()
 global_debug_interface = RemoteInteractionInterface()
 global_character_prov = CharacterProvider(global_config_prov, global_speech_queue)
-global_vol = VolumeController(global_speech_queue)
+global_vol = VolumeController(global_speech_queue, global_config_prov.get_user_config()["hardware"]["audio"]["speaker"].get("mixer"))
+global_playback_speed = PlaybackSpeedController(global_character_prov, global_config_prov.get_user_config()["hardware"]["audio"]["speaker"].get("speed"))
+# マイク・スピーカーの入出力 (PyAudio / ALSA / WAV ファイル / 無音)
+global_audio_backend = create_audio_backend(global_config_prov.get_user_config()["hardware"]["audio"].get("backend"))
+# デバイス名からインデックスを決める (デバイス一覧はディスクにキャッシュする)
+global_audio_devices = AudioDeviceResolver(global_audio_backend)
+global_audio_mixer = AudioMixer(global_audio_backend,
+                                global_config_prov.get_user_config()["hardware"]["audio"]["speaker"]["num_ch"],
+                                global_audio_devices.resolve(global_config_prov.get_user_config()["hardware"]["audio"]["speaker"].get("device_name"), False,
+                                                             global_config_prov.get_user_config()["hardware"]["audio"]["speaker"]["num_ch"],
+                                                             global_config_prov.get_user_config()["hardware"]["audio"]["speaker"]["index"]),
+                                GLOBAL_PLAY_RATE, GLOBAL_PLAY_SIZEOF_CHUNK)
+# マイクの直近のレベル (設定画面に表示する)
+global_mic_level = MicLevelMeter()
+# 音声 (応答・読み上げ) の音源。再生中は他の音源の音量を下げる
+global_audio_player = global_audio_mixer.open_source("voice", GLOBAL_PLAY_MAX_QUEUED_SECONDS, duck_others=True)
+# 音声合成にかかる時間の推定 (応答を音声合成の単位に区切る目安)
+global_tts_rate = SynthesisRate()
 
-__all__ = ['GLOBAL_CHARACTER_CONFIG_PROMPT', 'global_character_prov', 'global_config_prov', 'global_speech_queue', 'global_db', 'global_led_ill', 'global_vol', 'global_debug_interface']
+__all__ = ['GLOBAL_CHARACTER_CONFIG_PROMPT', 'global_character_prov', 'global_config_prov', 'global_speech_queue', 'global_db', 'global_led_ill', 'global_vol', 'global_playback_speed', 'global_debug_interface', 'global_audio_backend', 'global_audio_devices', 'global_audio_mixer', 'global_audio_player', 'global_mic_level', 'global_tts_rate', 'GLOBAL_PLAY_RATE']
@@ -0,0 +1,152 @@
+import threading
+
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Deque, List, Optional, Tuple
+
+from clova.general.queue import SpeechQueue
+from clova.general.logger import BaseLogger
+
+# ==================================
+#        音声合成先読みクラス
+# ==================================
+
+
+class SpeechPrefetcher(BaseLogger):
+    # 発話キューの先頭から lookahead 件の文字列を、再生を待たずに並行して音声合成しておく
+    #   - 結果はキューの順に take() で受け取る (1 行目を再生している間に 2 行目以降の合成が終わる)
+    #   - 関数 (キャラクタ切り替えなど) の先は、声が変わる可能性があるので先読みしない
+    #   - キューが消去・入れ替えられて先読みした順と合わなくなった場合は、先読みを捨てて合成し直す
+    #     (合成中のものは止められないが、結果は合成音声キャッシュに残る)
+
+    # コンストラクタ
+    #   synthesize: 文字列を音声合成する関数 (複数のスレッドから同時に呼ばれる)
+    def __init__(self, queue: SpeechQueue, synthesize: Callable[[str], Optional[bytes]], lookahead: int) -> None:
+        super().__init__()
+
+        self.queue = queue
+        self.synthesize = synthesize
+        self.lookahead = lookahead
+
+        self._lock = threading.Lock()
+        self._pending: Deque[Tuple[str, "Future[Optional[bytes]]"]] = deque()  # キューの先頭と同じ順
+        self._executor: Optional[ThreadPoolExecutor] = None
+        if lookahead > 0:
+            self._executor = ThreadPoolExecutor(max_workers=lookahead, thread_name_prefix="SpeechPrefetch")
+
+    # デストラクタ
+    def __del__(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        super().__del__()
+
+    # キューの先頭の文字列の合成を開始する (キューに追加された時と、take() の後に呼ぶ)
+    def prefetch(self) -> None:
+        if self._executor is None:
+            return
+
+        texts: List[str] = []
+        for item in self.queue.peek(self.lookahead):
+            if callable(item):
+                break
+            texts.append(item)
+
+        with self._lock:
+            # 先読み済みのものがキューの先頭と一致しなくなったら、そこから先は捨てる
+            for i, (text, _) in enumerate(self._pending):
+                if i >= len(texts) or texts[i] != text:
+                    self._drop(i)
+                    break
+
+            for text in texts[len(self._pending):]:
+                self.log("prefetch", "先読み: {}".format(text))
+                self._pending.append((text, self._executor.submit(self.synthesize, text)))
+
+    # キューから取り出した文字列の音声を受け取る (先読みしていない文字列は、ここで合成する)
+    def take(self, text: str) -> Optional[bytes]:
+        future: Optional["Future[Optional[bytes]]"] = None
+        with self._lock:
+            if self._pending and self._pending[0][0] == text:
+                future = self._pending.popleft()[1]
+
+        # 続きの合成を始めてから (キューと合わなくなった先読みはここで捨てる)、この文字列の合成が終わるのを待つ
+        self.prefetch()
+        if future is None:
+            return self.synthesize(text)
+        return future.result()
+
+    # 先読みをすべて捨てる (声の設定が変わった時など)
+    def reset(self) -> None:
+        with self._lock:
+            self._drop(0)
+
+    # index 番目以降の先読みを捨てる (ロックを取った状態で呼ぶ)
+    def _drop(self, index: int) -> None:
+        while len(self._pending) > index:
+            text, future = self._pending.pop()
+            if not future.cancel() and not future.done():
+                self.log("_drop", "合成中のため結果を捨てます: {}".format(text))
+
+
+# ==================================
+#       本クラスのテスト用処理
+# ==================================
+
+
+def module_test() -> None:
+    import time
+
+    calls: List[str] = []
+
+    def synthesize(text: str) -> Optional[bytes]:
+        calls.append(text)
+        time.sleep(0.2)
+        return text.encode()
+
+    queue = SpeechQueue()
+    prefetcher = SpeechPrefetcher(queue, synthesize, 2)
+    queue.bind_for_add(prefetcher.prefetch)
+
+    # 3 行の応答: 1 行目を再生している間 (0.2 秒) に 2・3 行目の合成が終わる
+    start = time.perf_counter()
+    for line in ["1行目", "2行目", "3行目"]:
+        queue.add(line)
+    played = []
+    while len(queue) > 0:
+        item = queue.get()
+        assert isinstance(item, str)
+        played.append(prefetcher.take(item))
+        time.sleep(0.2)  # 再生
+    elapsed = time.perf_counter() - start
+    print("elapsed {:.2f}s".format(elapsed))
+    assert played == ["1行目".encode(), "2行目".encode(), "3行目".encode()] and elapsed < 1.0
+    assert sorted(calls) == ["1行目", "2行目", "3行目"]
+
+    # 関数の先は先読みしない
+    calls.clear()
+    queue.add("A")
+    queue.add(lambda: None)
+    queue.add("B")
+    time.sleep(0.3)
+    assert calls == ["A"]
+
+    # キューが消去された後は、先読みを捨てて合成し直す
+    queue.clear()
+    queue.add("C")
+    item = queue.get()
+    assert item == "C" and prefetcher.take(item) == b"C"
+
+    # キューに無い文字列を合成しても、先読みは捨てない
+    calls.clear()
+    queue.add("D")
+    assert prefetcher.take("E") == b"E"
+    item = queue.get()
+    assert item == "D" and prefetcher.take(item) == b"D" and sorted(calls) == ["D", "E"]
+    print("SpeechPrefetcher OK")
+
+
+# ==================================
+# 本モジュールを直接呼出した時の処理
+# ==================================
+if __name__ == "__main__":
+    module_test()
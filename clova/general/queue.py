@@ -1,5 +1,5 @@
 from collections import deque
-from typing import Deque, Union, Callable
+from typing import Deque, List, Union, Callable
 import regex as re
 
 from clova.general.logger import BaseLogger
@@ -17,6 +17,7 @@ class SpeechQueue(BaseLogger):
         super().__init__()
 
         self._queue: Deque[Union[str, Callable[[], None]]] = deque()
+        self.add_callbacks: List[Callable[[], None]] = []
 
     # デストラクタ
     def __del__(self) -> None:
@@ -27,17 +28,31 @@ class SpeechQueue(BaseLogger):
         if callable(str_or_func):
             self.log("add", "SpeechQueue += function()")
             self._queue.append(str_or_func)
+            self._notify_add()
             return
         if str_or_func.strip() == "" or self.REGEX_ASSUME_EMPTY.match(str_or_func) is not None:
             self.log("add", "SpeechQueue却下: \'{}\'".format(str_or_func))
             return
         self.log("add", "SpeechQueue += \'{}\'".format(str_or_func))
         self._queue.append(str_or_func)
+        self._notify_add()
+
+    # キューに追加された時に呼ばれる関数を登録する (録音の待ち受けを中断するため)
+    def bind_for_add(self, cb: Callable[[], None]) -> None:
+        self.add_callbacks.append(cb)
+
+    def _notify_add(self) -> None:
+        for cb in self.add_callbacks:
+            cb()
 
     # キューから文字列・関数を取得する
     def get(self) -> Union[str, Callable[[], None]]:
         return self._queue.popleft()
 
+    # 先頭から num 件を、取り出さずに取得する
+    def peek(self, num: int) -> List[Union[str, Callable[[], None]]]:
+        return list(self._queue)[:num]
+
     def clear(self) -> None:
         self._queue.clear()
 
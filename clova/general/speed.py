@@ -0,0 +1,64 @@
+from typing import Dict, Optional
+
+from clova.config.character import CharacterProvider
+from clova.config.config import ConfigPlaybackSpeed
+
+from clova.general.logger import BaseLogger
+
+# ==================================
+#        再生速度制御クラス
+# ==================================
+
+
+class PlaybackSpeedController(BaseLogger):
+    # 読み上げの再生速度 (音の高さは変えずにタイムストレッチする倍率) を決める
+    #   速度 = ユーザー設定 (音声コマンドで変更) × キャラクタごとの倍率 × 応答したスキルごとの倍率
+    #   - キャラクタの倍率は CLOVA_systems.json のキャラクタの "playback_speed" (無ければ 1.0)
+    #   - スキルの倍率は設定の "skills" (スキルのクラス名 -> 倍率。AI の応答は "Conversation")
+    #   - 音声合成はやり直さないので、速度を変えても合成済みの音声・キャッシュはそのまま使える
+    CONVERSATION_SKILL = "Conversation"
+    DEFAULT_STEP = 0.15
+    MIN_SPEED = 0.7
+    MAX_SPEED = 2.0
+
+    # コンストラクタ
+    def __init__(self, character_prov: CharacterProvider, conf: Optional[ConfigPlaybackSpeed] = None) -> None:
+        super().__init__()
+
+        self._character_prov = character_prov
+        self._base = conf.get("base", 1.0) if conf is not None else 1.0
+        self.step = conf.get("step", self.DEFAULT_STEP) if conf is not None else self.DEFAULT_STEP
+        self.skills: Dict[str, float] = dict(conf.get("skills", {})) if conf is not None else {}
+        self.user_speed = self._base
+        self._skill: Optional[str] = None
+
+    # デストラクタ
+    def __del__(self) -> None:
+        super().__del__()
+
+    # 応答したスキル (None は AI の応答)。次に応答するまで、読み上げにそのスキルの倍率を掛ける
+    def set_skill(self, name: Optional[str]) -> None:
+        self._skill = name if name is not None else self.CONVERSATION_SKILL
+
+    # 現在の再生速度
+    def get_speed(self) -> float:
+        character = self._character_prov.character
+        character_speed = float(character.get("playback_speed", 1.0)) if character is not None else 1.0
+        skill_speed = self.skills.get(self._skill, 1.0) if self._skill is not None else 1.0
+        return max(self.MIN_SPEED, min(self.MAX_SPEED, self.user_speed * character_speed * skill_speed))
+
+    # ユーザー設定を 1 段階速く / 遅くする。変更後のユーザー設定を返す
+    def faster(self) -> float:
+        return self._set_user_speed(self.user_speed + self.step)
+
+    def slower(self) -> float:
+        return self._set_user_speed(self.user_speed - self.step)
+
+    # ユーザー設定を設定ファイルの値に戻す
+    def reset(self) -> float:
+        return self._set_user_speed(self._base)
+
+    def _set_user_speed(self, speed: float) -> float:
+        self.user_speed = round(max(self.MIN_SPEED, min(self.MAX_SPEED, speed)), 2)
+        self.log("_set_user_speed", "user_speed = {}".format(self.user_speed))
+        return self.user_speed
@@ -1,17 +1,18 @@
 import time
-import pyaudio
+import queue
 import threading
 import numpy as np
-import audioop
+import numpy.typing as npt
 import ffmpeg  # type: ignore[import]
 
-from subprocess import Popen
+from typing import Dict, Type, List, Optional, Generator
 
-from typing import Dict, Type, List, Optional, IO, Tuple
+from clova.general.globals import global_led_ill, global_config_prov, global_character_prov, global_vol, global_playback_speed, global_speech_queue, global_debug_interface
+from clova.general.globals import global_audio_backend, global_audio_devices, global_audio_mixer, global_audio_player, global_mic_level, global_tts_rate, GLOBAL_PLAY_RATE
+from clova.general.earcon import EarconPlayer, EARCON_LISTEN_END, EARCON_THINKING
+from clova.general.prefetch import SpeechPrefetcher
 
-from clova.general.globals import global_led_ill, global_config_prov, global_character_prov, global_vol, global_speech_queue, global_debug_interface
-
-from clova.processor.stt.base_stt import BaseSTTProvider
+from clova.processor.stt.base_stt import BaseSTTProvider, StreamingSTTProvider
 from clova.processor.stt.google_cloud_speech import GoogleCloudSpeechSTTProvider
 from clova.processor.stt.speech_recognition_google import SpeechRecognitionGoogleSTTProvider
 
@@ -20,18 +21,62 @@ from clova.processor.tts.google_text_to_speech import GoogleTextToSpeechTTSProvi
 from clova.processor.tts.voice_text import VoiceTextTTSProvider
 from clova.processor.tts.voice_vox import VoiceVoxTTSProvider
 from clova.processor.tts.ai_talk import AITalkTTSProvider
+from clova.processor.tts.cache import TTSCache, TTS_CACHE_DEFAULT_MAX_SIZE_MB
 
-from clova.general.logger import BaseLogger
+from clova.processor.vad.base_vad import BaseVADProvider
+from clova.processor.vad.peak_threshold import PeakThresholdVADProvider
+from clova.processor.vad.adaptive_noise_floor import AdaptiveNoiseFloorVADProvider
+from clova.processor.vad.endpoint import DynamicEndpointer
+from clova.processor.vad.listener import ListenerEvent, SpeechListener
+
+from clova.processor.kws.base_kws import BaseKWSProvider
+from clova.processor.kws.template_dtw import TemplateDTWKWSProvider
+
+from clova.processor.audio.aec import EchoCanceller, EchoReference, LinearResampler
+from clova.processor.audio.encoder import ENCODING_LINEAR16, encode_pcm
+from clova.processor.audio.decoder import WavFormatError, decode_audio, parse_wav
+from clova.processor.audio.dsp import GainStage
+from clova.processor.audio.multichannel import MultiChannelFrontEnd
+from clova.processor.audio.stretch import WsolaTimeStretcher, time_stretch
 
-# 音声ファイル設定
-SPEECH_FORMAT = pyaudio.paInt16
+from clova.io.local.microphone import MicrophoneStream
+
+from clova.general.logger import BaseLogger
 
 # 再生設定
-PCM_PLAY_SIZEOF_CHUNK = 512
+PCM_PLAY_SIZEOF_CHUNK = 2048  # 1 回に変換して再生キューに書き込むフレーム数 (既定値)
+PCM_PLAY_DEFAULT_LIMITER_THRESHOLD = None  # ソフトリミッタが効き始めるレベル (フルスケールに対する割合、None で無効)
 
 # 録音設定
 GOOGLE_SPEECH_RATE = 16000
 GOOGLE_SPEECH_SIZEOF_CHUNK = int(GOOGLE_SPEECH_RATE / 10)
+MIC_RING_BUFFER_SECONDS = 30  # 常時録音リングバッファの長さ
+MIC_READ_TIMEOUT = 0.5  # リングバッファ待ちのタイムアウト (秒)
+MIC_DEFAULT_PRE_ROLL_DURATION = 300  # 発話開始前に遡って録音に含める長さ (ms)
+MIC_DEFAULT_TRAIL_DURATION = 200  # 発話終了後に残す無音の長さ (ms)
+MIC_DEFAULT_VAD_SYSTEM = "AdaptiveNoiseFloor"
+MIC_DEFAULT_CHANNEL_MODE = "DelayAndSum"  # 複数チャンネルのマイクをモノラルにまとめる方法
+MIC_DEFAULT_MIN_TERM_DURATION = 700  # 長い文の後の発話終了判定に必要な無音の長さ (ms)
+MIC_DEFAULT_FOLLOW_UP_TERM_DURATION = 800  # 質問直後の応答の発話終了判定に必要な無音の長さ (ms)
+MIC_DEFAULT_WAKE_ARMED_DURATION = 8000  # ウェイクワード検出後、ウェイクワード無しで聞き取る時間 (ms)
+MIC_WAKE_MIN_REMAINDER = 500  # ウェイクワードに続けて話した内容とみなす最小の長さ (ms)
+WAKE_RESPONSE = "はい。何でしょう。"
+
+# 再生中の割り込み発話 (バージイン) 設定
+BARGE_IN_BLOCK = 320  # エコーキャンセラの処理単位 (サンプル)
+BARGE_IN_PARTITIONS = 8  # エコーキャンセラのフィルタ長 (BARGE_IN_BLOCK 単位)
+BARGE_IN_REF_SECONDS = 5  # エコー参照信号バッファの長さ
+BARGE_IN_REF_MARGIN = 0.032  # 参照信号をレイテンシより早めに置く時間 (秒、フィルタ長の範囲で遅延のずれを吸収)
+BARGE_IN_DEFAULT_MIN_SPEECH_DURATION = 300  # 割り込みと判定するのに必要な発話の長さ (ms)
+BARGE_IN_DEFAULT_WARM_UP = 1000  # 再生開始直後、エコーキャンセラが収束するまで判定しない時間 (ms)
+
+# 効果音設定
+EARCON_DEFAULT_LEVEL = 0.3  # 効果音の音量 (フルスケールに対する割合)
+EARCON_DEFAULT_THINKING_DELAY = 1000  # 応答待ちの効果音を鳴らし始めるまでの時間 (ms)
+
+# 合成音声キャッシュ設定
+TTS_CACHE_DEFAULT_ENABLED = True
+TTS_DEFAULT_LOOKAHEAD = 2  # 再生中に先読みして並行に合成する行数 (0 で先読みしない)
 
 # ==================================
 #        音声取得・再生クラス
@@ -49,6 +94,13 @@ class VoiceController(BaseLogger):
         "VoiceVox": VoiceVoxTTSProvider,
         "AITalk": AITalkTTSProvider
     }
+    VAD_MODULES: Dict[str, Type[BaseVADProvider]] = {
+        "PeakThreshold": PeakThresholdVADProvider,
+        "AdaptiveNoiseFloor": AdaptiveNoiseFloorVADProvider
+    }
+    KWS_MODULES: Dict[str, Type[BaseKWSProvider]] = {
+        "TemplateDTW": TemplateDTWKWSProvider
+    }
 
     # コンストラクタ
     def __init__(self) -> None:
@@ -57,21 +109,113 @@ class VoiceController(BaseLogger):
         # 設定パラメータを読み込み
         conf = global_config_prov.get_user_config()
         self.mic_num_ch = conf["hardware"]["audio"]["microphone"]["num_ch"]
-        self.mic_device_index = conf["hardware"]["audio"]["microphone"]["index"]
+        self.mic_device_index = global_audio_devices.resolve(conf["hardware"]["audio"]["microphone"].get("device_name"), True, self.mic_num_ch,
+                                                             conf["hardware"]["audio"]["microphone"]["index"])
         self.silent_threshold = conf["hardware"]["audio"]["microphone"]["silent_thresh"]
         self.terminate_silent_duration = conf["hardware"]["audio"]["microphone"]["term_duration"]
+        self.pre_roll_duration = conf["hardware"]["audio"]["microphone"].get("pre_roll_duration", MIC_DEFAULT_PRE_ROLL_DURATION)
+        self.trail_duration = conf["hardware"]["audio"]["microphone"].get("trail_duration", MIC_DEFAULT_TRAIL_DURATION)
+        self.min_terminate_silent_duration = conf["hardware"]["audio"]["microphone"].get("min_term_duration", MIC_DEFAULT_MIN_TERM_DURATION)
+        self.follow_up_silent_duration = conf["hardware"]["audio"]["microphone"].get("follow_up_term_duration", MIC_DEFAULT_FOLLOW_UP_TERM_DURATION)
+        self.mic_channel_mode = conf["hardware"]["audio"]["microphone"].get("channel_mode", MIC_DEFAULT_CHANNEL_MODE)
+        vad_conf = conf["hardware"]["audio"]["microphone"].get("vad", {"system": MIC_DEFAULT_VAD_SYSTEM, "params": {}})
+        wake_conf = conf["hardware"]["audio"]["microphone"].get("wake_word", {"system": None, "armed_duration": MIC_DEFAULT_WAKE_ARMED_DURATION, "params": {}})
+        barge_in_conf = conf["hardware"]["audio"].get("barge_in", {"enabled": False, "min_speech_duration": BARGE_IN_DEFAULT_MIN_SPEECH_DURATION,
+                                                                   "warm_up": BARGE_IN_DEFAULT_WARM_UP, "params": {}})
+        earcon_conf = conf["hardware"]["audio"].get("earcon", {"enabled": True, "level": EARCON_DEFAULT_LEVEL, "thinking_delay": EARCON_DEFAULT_THINKING_DELAY, "files": {}})
+        tts_cache_conf = conf["hardware"]["audio"].get("tts_cache", {"enabled": TTS_CACHE_DEFAULT_ENABLED, "max_size_mb": TTS_CACHE_DEFAULT_MAX_SIZE_MB})
+        tts_lookahead = conf["hardware"]["audio"].get("tts_lookahead", TTS_DEFAULT_LOOKAHEAD)
         self.speaker_num_ch = conf["hardware"]["audio"]["speaker"]["num_ch"]
-        self.speaker_device_index = conf["hardware"]["audio"]["speaker"]["index"]
-        self.log("CTOR", "MiC:NumCh={}, Index={}, Threshold={}, Duration={}, SPK:NumCh={}, Index={}".format(self.mic_num_ch, self.mic_device_index,
-                 self.silent_threshold, self.terminate_silent_duration, self.speaker_num_ch, self.speaker_device_index))  # for debug
+        self.speaker_device_index = global_audio_mixer.device_index
+        self.play_block_frames = conf["hardware"]["audio"]["speaker"].get("block_frames", PCM_PLAY_SIZEOF_CHUNK)
+        self.limiter_threshold = conf["hardware"]["audio"]["speaker"].get("limiter_threshold", PCM_PLAY_DEFAULT_LIMITER_THRESHOLD)
+        self.log("CTOR", "MiC:NumCh={}, Index={}, Threshold={}, Duration={}({}～, FollowUp={}), PreRoll={}, Trail={}, SPK:NumCh={}, Index={}".format(
+                 self.mic_num_ch, self.mic_device_index, self.silent_threshold, self.terminate_silent_duration, self.min_terminate_silent_duration,
+                 self.follow_up_silent_duration, self.pre_roll_duration, self.trail_duration, self.speaker_num_ch, self.speaker_device_index))  # for debug
+
+        # 合成音声のキャッシュ (よく使う応答は合成し直さない。再生ストリームの形式で保存する)
+        self._tts_cache: Optional[TTSCache] = None
+        if tts_cache_conf["enabled"]:
+            max_size_mb = tts_cache_conf.get("max_size_mb", TTS_CACHE_DEFAULT_MAX_SIZE_MB)
+            self._tts_cache = TTSCache(GLOBAL_PLAY_RATE, global_audio_player.num_ch, max_size_mb * 1024 * 1024)
+
+        # 発話キューの先の行を、前の行の再生中に並行して音声合成しておく
+        self._prefetcher = SpeechPrefetcher(global_speech_queue, self._synthesize, tts_lookahead)
+        global_speech_queue.bind_for_add(self._prefetcher.prefetch)
+
+        # デバッグインタフェースからのメッセージと発話判定の結果を受け取るキュー (コールバックを登録する前に用意する)
+        self._interface_pending_message: List[str] = []
+        self._events: "queue.Queue[ListenerEvent]" = queue.Queue()
 
         global_character_prov.bind_for_update(self._update_system_conf)
         global_debug_interface.bind_message_callback(self._interface_message)
 
         self._update_system_conf()
 
-        self._wav_conversion_ffmpeg_waiting: Optional[Popen[bytes]] = None
-        self._interface_pending_message: List[str] = []
+        # 再生時の音量処理 (作業バッファを使い回す)
+        self._gain = GainStage(self.play_block_frames, global_audio_player.num_ch, self.limiter_threshold)
+        # 再生速度の変更 (音の高さを変えずに伸縮する。1.0 の時は通さない)
+        self._stretcher = WsolaTimeStretcher(GLOBAL_PLAY_RATE, global_audio_player.num_ch)
+
+        # 効果音 (聞き取り終了の合図と応答待ち)
+        self.earcon_thinking_delay = earcon_conf.get("thinking_delay", EARCON_DEFAULT_THINKING_DELAY)
+        self.earcon = EarconPlayer(global_audio_mixer, earcon_conf["enabled"], earcon_conf.get("level", EARCON_DEFAULT_LEVEL), earcon_conf.get("files", {}))
+
+        # 常時録音ストリーム (最初の録音時に開始する)
+        self._mic = MicrophoneStream(global_audio_backend, self.mic_num_ch, self.mic_device_index, GOOGLE_SPEECH_RATE, GOOGLE_SPEECH_SIZEOF_CHUNK, MIC_RING_BUFFER_SECONDS)
+
+        # 複数チャンネルのマイクは、音声認識に渡す前にモノラルにまとめる
+        self._front_end: Optional[MultiChannelFrontEnd] = None
+        if self.mic_num_ch > 1:
+            self.log("CTOR", "MultiChannel:{}".format(self.mic_channel_mode))
+            self._front_end = MultiChannelFrontEnd(GOOGLE_SPEECH_RATE, self.mic_num_ch, self.mic_channel_mode)
+
+        # 発話区間検出 (VAD)
+        self.log("CTOR", "VAD:{} {}".format(vad_conf["system"], vad_conf["params"]))
+        self.vad = self.VAD_MODULES[vad_conf["system"]](GOOGLE_SPEECH_RATE, self.mic_num_ch, silent_thresh=self.silent_threshold, **vad_conf["params"])
+
+        # 発話終端検出
+        self.endpointer = DynamicEndpointer(int(GOOGLE_SPEECH_SIZEOF_CHUNK * 1000 / GOOGLE_SPEECH_RATE), self.min_terminate_silent_duration,
+                                            self.terminate_silent_duration, self.follow_up_silent_duration)
+        self._follow_up = False
+
+        # 発話検出スレッド。発話判定の結果と、発話キュー・デバッグインタフェースからの割り込みを同じキューで受け取る
+        self._listener = SpeechListener(self._mic.ring, self.vad, self.endpointer, GOOGLE_SPEECH_SIZEOF_CHUNK * self._mic.bytes_per_frame, self._events,
+                                        global_mic_level)
+        self._reported_overruns = (0, 0)
+        global_speech_queue.bind_for_add(lambda: self._events.put(ListenerEvent(SpeechListener.EVENT_INTERRUPT, 0, 0, -1)))
+
+        # ウェイクワード検出 (設定時は、ウェイクワードの後の音声のみを音声認識に送る)
+        self.kws: Optional[BaseKWSProvider] = None
+        if wake_conf["system"]:
+            self.log("CTOR", "KWS:{} {}".format(wake_conf["system"], wake_conf["params"]))
+            self.kws = self.KWS_MODULES[wake_conf["system"]](GOOGLE_SPEECH_RATE, **wake_conf["params"])
+        self.wake_armed_duration = wake_conf.get("armed_duration", MIC_DEFAULT_WAKE_ARMED_DURATION)
+        self._wake_armed = False
+
+        # ストリーミング認識中の音声認識 (していない時は None)
+        self._stt_stream: Optional[StreamingSTTProvider] = None
+
+        # 再生中の割り込み発話 (バージイン) 検出。再生音をエコーキャンセラで取り除いてから発話判定する
+        self.barge_in_enabled = barge_in_conf["enabled"]
+        self.barge_in_min_speech_duration = barge_in_conf.get("min_speech_duration", BARGE_IN_DEFAULT_MIN_SPEECH_DURATION)
+        self.barge_in_warm_up = barge_in_conf.get("warm_up", BARGE_IN_DEFAULT_WARM_UP)
+        if self.barge_in_enabled:
+            self.log("CTOR", "BargeIn: MinSpeech={}, WarmUp={}, {}".format(self.barge_in_min_speech_duration, self.barge_in_warm_up, barge_in_conf["params"]))
+        barge_in_vad_params = dict(vad_conf["params"])
+        barge_in_vad_params.update(barge_in_conf.get("params", {}))
+        self._barge_in_vad = self.VAD_MODULES[vad_conf["system"]](GOOGLE_SPEECH_RATE, 1, silent_thresh=self.silent_threshold, **barge_in_vad_params)
+        self._aec = EchoCanceller(BARGE_IN_BLOCK, BARGE_IN_PARTITIONS)
+        self._echo_ref = EchoReference(GOOGLE_SPEECH_RATE * BARGE_IN_REF_SECONDS)
+        # エコー参照信号は、音声・音楽・効果音を加算した後のミキサー出力から作る
+        self._echo_resampler = LinearResampler(global_audio_mixer.rate, GOOGLE_SPEECH_RATE)
+        self._echo_ref_pos = 0
+        if self.barge_in_enabled:
+            global_audio_mixer.bind_for_output(self._capture_echo_ref)
+        self._playback_stop = threading.Event()  # 割り込み発話で再生を止めた (次の聞き取り開始まで再生しない)
+        self._playback_decoding = False
+        self._barge_in_monitor: Optional[threading.Thread] = None
+        self._barge_in_pos: Optional[int] = None  # 割り込み発話の録音開始位置 (リングバッファ上)
 
     # デストラクタ
     def __del__(self) -> None:
@@ -92,22 +236,115 @@ class VoiceController(BaseLogger):
 
         self.tts = self.TTS_MODULES[self._tts_system]()
         self.stt = self.STT_MODULES[self._stt_system]()
+        self._prefetcher.reset()  # 先読みした音声は前の声なので捨てる
+        global_tts_rate.reset()  # 合成の速さも声ごとに違うので計測し直す
+
+        # 音声認識に送る音声の形式 (対応していない形式が指定された場合は無変換)
+        self._stt_encoding = self._stt_kwargs.get("encoding", ENCODING_LINEAR16)
+        if self._stt_encoding not in self.stt.SUPPORTED_ENCODINGS:
+            self.log("_update_system_conf", "{} は {} に対応していないため {} で送信します".format(self._stt_system, self._stt_encoding, ENCODING_LINEAR16))
+            self._stt_encoding = ENCODING_LINEAR16
 
     def _interface_message(self, message: str) -> None:
         self._interface_pending_message.append(message)
+        self._events.put(ListenerEvent(SpeechListener.EVENT_INTERFACE, 0, 0, -1))
+
+    def _drain_events(self) -> None:
+        while True:
+            try:
+                self._events.get_nowait()
+            except queue.Empty:
+                return
+
+    # 録音中にストリーミング認識を開始する
+    def _start_stt_stream(self) -> None:
+        assert isinstance(self._stt_kwargs, dict)
 
-    # マイクからの録音
+        if not isinstance(self.stt, StreamingSTTProvider):
+            return
+
+        # 対応していない形式が指定されていた場合は、_update_system_conf() で LINEAR16 にしたものを使う
+        stt_kwargs = dict(self._stt_kwargs)
+        stt_kwargs["encoding"] = self._stt_encoding
+        try:
+            self.stt.stream_start(self._stt_interim, **stt_kwargs)
+            self._stt_stream = self.stt
+        except Exception as e:
+            self.log("_start_stt_stream", "ストリーミング認識を開始できませんでした: {}".format(e))
+
+    def _cancel_stt_stream(self) -> None:
+        if self._stt_stream is not None:
+            self._stt_stream.stream_cancel()
+            self._stt_stream = None
+
+    def _stt_interim(self, text: str) -> None:
+        self.log("_stt_interim", "認識中: {}".format(text))
+
+    # 次の録音を質問への応答 (フォローアップ) として待ち受けるか設定する
+    def set_follow_up(self, follow_up: bool) -> None:
+        self._follow_up = follow_up
+
+    # 録音した音声 (インタリーブ) を音声認識用のモノラルにする
+    #   stream: True の場合は直前の estimate() の結果で逐次変換する (ストリーミング認識用)
+    def _to_mono(self, audio: bytes, stream: bool = False) -> bytes:
+        if self._front_end is None:
+            return audio
+        if stream:
+            return self._front_end.apply(audio)
+        return self._front_end.process(audio)
+
+    # ウェイクワードで始まる録音 (モノラル) なら、ウェイクワードより後の音声を返す
+    def _wake_gate(self, audio: bytes) -> Optional[bytes]:
+        assert self.kws is not None
+
+        end = self.kws.detect(np.frombuffer(audio, dtype=np.int16).astype(np.float32) / np.float32(32768.0))
+        if end is None:
+            self.log("_wake_gate", "ウェイクワードが無いため破棄")
+            return None
+
+        remainder = audio[end * MicrophoneStream.SAMPLE_WIDTH:]
+        if len(remainder) >= int(MIC_WAKE_MIN_REMAINDER * GOOGLE_SPEECH_RATE / 1000) * MicrophoneStream.SAMPLE_WIDTH:
+            self.log("_wake_gate", "ウェイクワード検出 (続けて発話あり)")
+            return remainder
+
+        # ウェイクワードのみの場合は応答して、次の発話をウェイクワード無しで聞き取る
+        self.log("_wake_gate", "ウェイクワード検出")
+        self._wake_armed = True
+        global_speech_queue.add(WAKE_RESPONSE)
+        return None
+
+    # マイクからの録音 (16kHz モノラルの S16_LE PCM を返す)
+    # 音声の取得・発話判定は SpeechListener のスレッドで行い、ここではそのイベントと割り込みを待つ
     def microphone_record(self) -> Optional[bytes]:
         # 底面 LED を赤に
         global_led_ill.set_all(global_led_ill.RGB_RED)
 
+        # 前回のストリーミング認識が使われずに残っていたら破棄
+        self._cancel_stt_stream()
+
+        # 再生中の音声があれば再生し終わるまで待つ (割り込み発話があれば再生は止まっている)
+        self.wait_playback()
+        self._playback_stop.clear()
+
+        # 再生中に割り込み発話があった場合は、その位置から録音する
+        barge_in_pos = self._barge_in_pos
+        self._barge_in_pos = None
+
+        # 前回の待ち受けのイベントを破棄してから、待ち受け開始前に届いた割り込みを確認する
+        self._drain_events()
+
         # デバッグインタフェースにメッセージがある時は即座に返す
         if self._interface_pending_message:
             self._interface_pending_message.pop(0)
             return None
 
-        # PyAudioのオブジェクトを作成
-        pyaud = pyaudio.PyAudio()
+        # 割り込み音声がある時は即座に返す
+        if (len(global_speech_queue) != 0):
+            return None
+
+        # 常時録音ストリームを開始 (起動済みなら何もしない)
+        self._mic.start()
+        ring = self._mic.ring
 
         # 録音開始
         self.log("microphone_record", "聞き取り中：")
@@ -115,76 +352,82 @@ class VoiceController(BaseLogger):
         # 底面 LED を暗緑に
         global_led_ill.set_all(global_led_ill.RGB_DARKGREEN)
 
-        # 録音準備
-        rec_stream = pyaud.open(format=SPEECH_FORMAT,
-                                channels=self.mic_num_ch,
-                                rate=GOOGLE_SPEECH_RATE,
-                                input=True,
-                                input_device_index=self.mic_device_index,
-                                frames_per_buffer=GOOGLE_SPEECH_SIZEOF_CHUNK)
-
-        # 無音検出用パラメータ
-        silent_frames = 0  # 無音期間 フレームカウンタ
-        max_silent_frames = int(self.terminate_silent_duration * GOOGLE_SPEECH_RATE / 1000 / GOOGLE_SPEECH_SIZEOF_CHUNK)  # 最大無音フレームカウンタ
+        if self._follow_up:
+            self.log("microphone_record", "フォローアップ待ち受け")
 
-        # 最大最小の初期化
-        maxpp_data_max = 0
-        maxpp_data_min = 32767
-
-        # 初回のボツッ音を発話開始と認識してしまうので、ダミーで最初１フレーム分読んでおく（応急処置）
-        rec_stream.read(GOOGLE_SPEECH_SIZEOF_CHUNK)
+        # ウェイクワード検出の要否 (フォローアップ中・ウェイクワード検出直後は不要)
+        wake_gated = self.kws is not None and not self._follow_up and not self._wake_armed
+        wake_armed_deadline = time.time() + self.wake_armed_duration / 1000
 
         # 録音停止から始める
         recording = False
 
-        # バッファ初期化
-        rec_frames = []
-
-        # 録音ループ
-        while True:
-            # デバッグインタフェースにメッセージがある時は即座に返す
-            if self._interface_pending_message:
-                self._interface_pending_message.pop(0)
-
-                # 録音停止
-                rec_stream.stop_stream()
-                rec_stream.close()
-
-                # PyAudioオブジェクトを終了
-                pyaud.terminate()
-
-                return None
-
-            # データ取得
-            data = rec_stream.read(GOOGLE_SPEECH_SIZEOF_CHUNK)
-
-            # ピーク平均の算出
-            maxpp_data = audioop.maxpp(data, 2)
-
-            # 最大値、最小値の格納
-            if maxpp_data < maxpp_data_min:
-                maxpp_data_min = maxpp_data
-            if maxpp_data > maxpp_data_max:
-                maxpp_data_max = maxpp_data
+        # 読み出し位置は現在の書き込み位置から (再生中などの過去の音声は使わない)
+        # ただし割り込み発話があった場合は、発話開始位置まで遡る
+        read_pos = ring.write_pos
+        if barge_in_pos is not None:
+            self.log("microphone_record", "割り込み発話を録音")
+            read_pos = max(barge_in_pos, ring.oldest_pos)
+        listen_start_pos = read_pos
+        rec_start_pos = read_pos
+
+        # プリロール・末尾無音の長さ (バイト、フレーム境界に揃える)
+        pre_roll_bytes = int(self.pre_roll_duration * GOOGLE_SPEECH_RATE / 1000) * self._mic.bytes_per_frame
+        trail_bytes = int(self.trail_duration * GOOGLE_SPEECH_RATE / 1000) * self._mic.bytes_per_frame
+
+        # 発話検出を開始
+        generation = self._listener.start(read_pos, self._follow_up)
+
+        try:
+            # 録音ループ (イベント待ち)
+            while True:
+                # ウェイクワード検出後の待ち受けは時間制限あり
+                timeout = max(0.0, wake_armed_deadline - time.time()) if (self._wake_armed and not recording) else None
+                try:
+                    event = self._events.get(timeout=timeout)
+                except queue.Empty:
+                    # ウェイクワード検出後、一定時間発話が無ければウェイクワード待ちに戻す
+                    self.log("microphone_record", "ウェイクワード待ちに戻ります")
+                    self._wake_armed = False
+                    wake_gated = self.kws is not None and not self._follow_up
+                    continue
+
+                # デバッグインタフェースにメッセージがある時は即座に返す
+                if event.kind == SpeechListener.EVENT_INTERFACE:
+                    if self._interface_pending_message:
+                        self._interface_pending_message.pop(0)
+                        self._cancel_stt_stream()
+                        return None
+                    continue
+
+                # 割り込み音声がある時はキャンセルして抜ける
+                if event.kind == SpeechListener.EVENT_INTERRUPT:
+                    if (len(global_speech_queue) == 0):
+                        continue
+                    self.log("microphone_record", "割り込み音声により録音キャンセル")
+                    if not recording:
+                        return None
+                    break
 
-            # 無音しきい値未満
-            if maxpp_data < self.silent_threshold:
-                # 無音期間 フレームカウンタをインクリメント
-                silent_frames += 1
+                # 以前の待ち受けのイベントは無視
+                if event.generation != generation:
+                    continue
 
-                # 開始済みの場合で、フレームカウンタが最大に達したら、会話の切れ目と認識して終了する処理
-                if (recording) and (silent_frames >= max_silent_frames):
-                    self.log("microphone_record", "録音終了 / Rec level: {0}～{1}".format(maxpp_data_min, maxpp_data_max))
-                    # 録音停止
+                # 発話終了 (末尾の無音は trail_duration だけ残して切り捨てる)
+                if event.kind == SpeechListener.EVENT_END:
+                    self._follow_up = False
+                    self._wake_armed = False
+                    read_pos = min(event.end, event.start + trail_bytes)
                     break
 
-            # 無音しきい値以上
-            else:
-                # 音の入力があったので、無音期間フレームカウンタをクリア
-                silent_frames = 0
+                read_pos = event.end
+
+                # ストリーミング認識中は録音と並行して送信する
+                if self._stt_stream is not None:
+                    self._stt_stream.stream_write(self._to_mono(ring.read(event.start, event.end), stream=True))
 
                 # まだ開始できていなかったら、ここから録音開始
-                if not recording:
+                if (event.kind == SpeechListener.EVENT_SPEECH) and (not recording):
                     # 底面 LED を緑に
                     global_led_ill.set_all(global_led_ill.RGB_GREEN)
 
@@ -192,24 +435,45 @@ class VoiceController(BaseLogger):
                     self.log("microphone_record", "録音開始")
                     recording = True
 
-                # 録音中のフレームを取得
-                rec_frames.append(data)
+                    # 語頭が欠けないよう、発話開始前の音声 (プリロール) も含める
+                    rec_start_pos = max(listen_start_pos, ring.oldest_pos, event.start - pre_roll_bytes)
+
+                    # ストリーミング認識を開始し、ここまでの音声を送信 (ウェイクワード検出が必要な場合は録音後に一括認識)
+                    if not wake_gated:
+                        self._start_stt_stream()
+                    if self._stt_stream is not None:
+                        # 複数チャンネルの場合は、ここまでの音声でチャンネル選択・到達時間差を決めて以降も同じ設定で変換する
+                        pre_roll = ring.read(rec_start_pos, read_pos)
+                        if self._front_end is not None:
+                            self._front_end.estimate(pre_roll)
+                        self._stt_stream.stream_write(self._to_mono(pre_roll, stream=True))
+
+                # バッファに収まらない長さになったら打ち切る
+                if (recording) and (read_pos - rec_start_pos >= ring.capacity - self._listener.chunk_bytes):
+                    self.log("microphone_record", "録音バッファ上限により録音終了")
+                    break
+        finally:
+            self._listener.stop()
 
-            # 割り込み音声がある時はキャンセルして抜ける
-            if (len(global_speech_queue) != 0):
-                self.log("microphone_record", "割り込み音声により録音キャンセル")
-                # rec_frames = []
-                rec_frames.append(data)
-                break
+        overruns = (self._mic.overruns, self._listener.overruns)
+        if overruns != self._reported_overruns:
+            self.log("microphone_record", "オーバーラン: 入力 {} 回 / 発話検出 {} 回".format(*overruns))
+            self._reported_overruns = overruns
 
-        # 録音停止
-        rec_stream.stop_stream()
-        rec_stream.close()
+        recorded = self._to_mono(ring.read(max(rec_start_pos, ring.oldest_pos), read_pos))
+        audio = self._wake_gate(recorded) if wake_gated else recorded
 
-        # PyAudioオブジェクトを終了
-        pyaud.terminate()
+        # 聞き取ったことをすぐに知らせる (音声認識・応答の生成を待たない)
+        if audio:
+            self.earcon.play(EARCON_LISTEN_END)
+        return audio
 
-        return b"".join(rec_frames)
+    # 応答の生成中の効果音 (thinking_delay 経っても応答が無い場合に鳴らし始める)
+    def start_thinking(self) -> None:
+        self.earcon.start_loop(EARCON_THINKING, self.earcon_thinking_delay)
+
+    def stop_thinking(self) -> None:
+        self.earcon.stop_loop()
 
     # 音声からテキストに変換
     def speech_to_text(self, audio: bytes) -> Optional[str]:
@@ -217,11 +481,31 @@ class VoiceController(BaseLogger):
         global_led_ill.set_all(global_led_ill.RGB_ORANGE)
 
         if len(audio) == 0:
+            self._cancel_stt_stream()
             return None
 
         assert isinstance(self._stt_kwargs, dict)
 
-        return self.stt.stt(audio, **self._stt_kwargs)
+        # 録音中に送信済みであれば最終結果を待つだけ
+        if self._stt_stream is not None:
+            stt_stream, self._stt_stream = self._stt_stream, None
+            try:
+                return stt_stream.stream_finish()
+            except Exception as e:
+                self.log("speech_to_text", "ストリーミング認識に失敗したため一括認識で再試行します: {}".format(e))
+
+        # アップロード量を減らすため圧縮する
+        stt_kwargs = dict(self._stt_kwargs)
+        stt_kwargs["encoding"] = self._stt_encoding
+        try:
+            encoded = encode_pcm(audio, self._stt_encoding, GOOGLE_SPEECH_RATE)
+        except Exception as e:
+            self.log("speech_to_text", "{} への変換に失敗したため {} で送信します: {}".format(self._stt_encoding, ENCODING_LINEAR16, e))
+            encoded = audio
+            stt_kwargs["encoding"] = ENCODING_LINEAR16
+        self.log("speech_to_text", "{}: {}bytes -> {}bytes".format(stt_kwargs["encoding"], len(audio), len(encoded)))
+
+        return self.stt.stt(encoded, **stt_kwargs)
 
     # テキストから音声に変換
 
@@ -229,99 +513,160 @@ class VoiceController(BaseLogger):
         # 底面 LED を青に
         global_led_ill.set_all(global_led_ill.RGB_BLUE)
 
-        assert isinstance(self._tts_kwargs, dict)
-
-        return self.tts.tts(text, **self._tts_kwargs)
-
-    def _get_wav_info(self, wav_bytes: bytes) -> Tuple[int, int, int]:
-        # Read the required fields from the header
-        channels = int.from_bytes(wav_bytes[22:24], 'little')
-        sample_rate = int.from_bytes(wav_bytes[24:28], 'little')
-        width = int.from_bytes(wav_bytes[34:36], 'little')
-
-        return channels, sample_rate, width
-
-    def _launch_ffmpeg_cache(self) -> Popen[bytes]:
-        input_stream = ffmpeg.input("pipe:", format="wav")
-        output_stream = ffmpeg.output(
-            input_stream.audio,
-            "pipe:",
-            format="s16le",
-            ar=44100,
-            ac=1,
-            # loglevel='error'
-        )
-
-        self._wav_conversion_ffmpeg_waiting = output_stream.run_async(pipe_stdin=True, pipe_stdout=True)
-        return self._wav_conversion_ffmpeg_waiting  # type: ignore[return-value]
-
-    def _handle_ffmpeg_output(self, pyaud: pyaudio.PyAudio, channels: int, stdout: IO[bytes]) -> None:
-        # 再生開始
-        play_stream = None
-
-        # 再生処理
-        while True:
-            data = stdout.read(PCM_PLAY_SIZEOF_CHUNK)
-            if not data:
+        return self._prefetcher.take(text)
+
+    # 音声合成 (先読みのスレッドからも呼ばれる)
+    def _synthesize(self, text: str) -> Optional[bytes]:
+        tts = self.tts
+        tts_system = self._tts_system
+        tts_kwargs = self._tts_kwargs
+        assert isinstance(tts_system, str)
+        assert isinstance(tts_kwargs, dict)
+
+        # 実際に合成した時間を記録する (応答を区切る長さの目安にする。キャッシュから読んだ場合は記録しない)
+        def synthesize() -> Optional[bytes]:
+            start = time.perf_counter()
+            audio = tts.tts(text, **tts_kwargs)
+            if audio is not None:
+                global_tts_rate.record(len(text), time.perf_counter() - start)
+            return audio
+
+        if self._tts_cache is None:
+            return synthesize()
+        return self._tts_cache.get(tts_system, tts_kwargs, text, synthesize)
+
+    # ミキサーの出力 ((フレーム, チャンネル) の int16) をエコー参照信号に書き込む (出力バックエンドのスレッドから呼ばれる)
+    # 録音側のサンプリングレートに変換し、スピーカーから出た音がマイクに届くサンプル位置に置く
+    def _capture_echo_ref(self, out: npt.NDArray[np.int16]) -> None:
+        ref = self._echo_resampler.process(out.mean(axis=1).astype(np.float32) / np.float32(32768.0))
+        # 出力した音がマイクに届くのは、出力・入力のレイテンシ分だけ後
+        latency = global_audio_mixer.output_latency + self._mic.input_latency - BARGE_IN_REF_MARGIN
+        earliest_pos = self._mic.ring.write_pos // self._mic.bytes_per_frame + int(max(0.0, latency) * GOOGLE_SPEECH_RATE)
+        self._echo_ref_pos = max(self._echo_ref_pos, earliest_pos)  # 初回・無音を挟んだ場合はここから
+        self._echo_ref.write(self._echo_ref_pos, ref)
+        self._echo_ref_pos += len(ref)
+
+    # 変換済みの PCM ブロック ((フレーム, チャンネル) の float32) を再生キューに書き込む
+    def _write_playback(self, blocks: Generator[npt.NDArray[np.float32], None, None]) -> None:
+        # 再生処理 (再生キューが一杯の間は write() が待つ)
+        frames = self._gain.block_frames
+        try:
+            for block in blocks:
+                for i in range(0, len(block), frames):
+                    # 割り込み発話で停止した後は、残りを変換しない (デコード・伸縮も打ち切る)
+                    if self._playback_stop.is_set():
+                        self.log("_write_playback", "割り込み発話により再生を打ち切り")
+                        return
+
+                    pcm = self._gain.process(block[i:i + frames], global_vol.vol_value)  # ボリューム倍率を更新
+                    global_audio_player.write(pcm)
+        finally:
+            blocks.close()
+
+        self.log("_write_playback", "Play done!")
+
+    # 再生中の録音からエコーを除去し、利用者の発話を検出したら再生を止める
+    # 再生キューが空になり、次の音声の変換も無ければ終了する
+    def _monitor_barge_in(self, start_pos: int) -> None:
+        ring = self._mic.ring
+        bytes_per_frame = self._mic.bytes_per_frame
+        block_bytes = BARGE_IN_BLOCK * bytes_per_frame
+        block_view = memoryview(bytearray(block_bytes))
+        block_duration = BARGE_IN_BLOCK * 1000 / GOOGLE_SPEECH_RATE
+        warm_up_pos = start_pos + int(self.barge_in_warm_up * GOOGLE_SPEECH_RATE / 1000) * bytes_per_frame
+        pre_roll_bytes = int(self.pre_roll_duration * GOOGLE_SPEECH_RATE / 1000) * bytes_per_frame
+
+        self._barge_in_vad.reset()
+        read_pos = start_pos
+        speech_duration = 0.0
+
+        while self._playback_decoding or global_audio_player.queued_bytes > 0:
+            if not ring.wait_for(read_pos + block_bytes, timeout=MIC_READ_TIMEOUT):
+                continue
+            if read_pos < ring.oldest_pos:
+                read_pos = ring.write_pos - block_bytes
+            ring.read_into(read_pos, block_view)
+
+            # 再生音のエコーを除去 (参照信号はマイク側のサンプル位置で対応付け)
+            mic = self.vad.to_mono(block_view)
+            ref = self._echo_ref.read(read_pos // bytes_per_frame, BARGE_IN_BLOCK)
+            residual = self._aec.process(mic, ref)
+            read_pos += block_bytes
+
+            # 残差で発話判定 (エコーキャンセラが収束するまでは判定しない)
+            is_speech = self._barge_in_vad.process((np.clip(residual, -1.0, 1.0) * 32767).astype(np.int16).tobytes())
+            if read_pos < warm_up_pos:
+                continue
+            speech_duration = speech_duration + block_duration if is_speech else 0.0
+
+            if speech_duration >= self.barge_in_min_speech_duration:
+                self.log("_monitor_barge_in", "割り込み発話を検出したため再生を停止")
+                onset_pos = read_pos - int(speech_duration * GOOGLE_SPEECH_RATE / 1000) * bytes_per_frame
+                self._barge_in_pos = max(start_pos, onset_pos - pre_roll_bytes)
+                self._playback_stop.set()
+                global_speech_queue.clear()
+                global_audio_player.flush()
                 break
 
-            if play_stream is None:  # openしたときからwriteするまで結構大きめのノイズがするためデータが取得できてからopenする
-                play_stream = pyaud.open(format=SPEECH_FORMAT, channels=channels, rate=44100, output=True, output_device_index=self.speaker_device_index)
-                play_stream.start_stream()
-
-            nd = (np.frombuffer(data, dtype=np.int16) * global_vol.vol_value).astype(np.int16)  # ボリューム倍率を更新
-            play_stream.write(nd.tobytes())
-
-        # 再生終了処理
-        if play_stream is not None:
-            play_stream.stop_stream()
-            while play_stream.is_active():
-                time.sleep(0.1)
-            play_stream.close()
-        self.log("_handle_ffmpeg_output", "Play done!")
-
     # 音声ファイルの再生
+    #   常時再生ストリームの再生キューに書き込む。続けて再生する音声が発話キューにある場合は、再生し終わるのを待たずに戻る
+    #   (次の音声の準備と再生が並行し、途切れずに続けて再生される)
     def play_audio(self, audio: bytes) -> None:
+        # 割り込み発話で停止した後は、次の聞き取りまで再生しない
+        if self._playback_stop.is_set():
+            self.log("play_audio", "割り込み発話により再生をスキップ")
+            return
+
         # 底面 LED を水に
         global_led_ill.set_all(global_led_ill.RGB_CYAN)
 
         # with open("./test.wav", "wb") as f:
         #     f.write(audio)
 
-        channels, _, _ = self._get_wav_info(audio)
-
-        self.log("play_audio", "オーディオ再生 ({}チャンネル)".format(channels))
-
-        if channels != 1:
-            # 変換
-            input_stream = ffmpeg.input("pipe:", format="wav")
-            output_stream = ffmpeg.output(
-                input_stream.audio,
-                "pipe:",
-                format="s16le",
-                ar=44100,
-                ac=channels,
-                # loglevel='error'
-            )
-
-            ffmpeg_proc = output_stream.run_async(pipe_stdin=True, pipe_stdout=True)
-        else:
-            ffmpeg_proc = self._wav_conversion_ffmpeg_waiting or self._launch_ffmpeg_cache()
-            self._wav_conversion_ffmpeg_waiting = None
-
-        # PyAudioのオブジェクトを作成
-        pyaud = pyaudio.PyAudio()
-
-        ffmpeg_handler = threading.Thread(target=self._handle_ffmpeg_output, args=[pyaud, channels, ffmpeg_proc.stdout])
-        ffmpeg_handler.start()
-
-        ffmpeg_proc.stdin.write(audio)
-        ffmpeg_proc.stdin.close()
-
-        ffmpeg_handler.join()
-        pyaud.terminate()
-
-        threading.Thread(target=self._launch_ffmpeg_cache).start()  # 次回から待機状態のffmpegを使用する
+        try:
+            info = parse_wav(audio)
+            self.log("play_audio", "オーディオ再生 ({}チャンネル, {}Hz, {}bit)".format(info.channels, info.sample_rate, info.sample_width * 8))
+        except WavFormatError:
+            self.log("play_audio", "オーディオ再生 (WAV 以外の形式は ffmpeg で変換)")
+
+        # 再生中も録音を続け、割り込み発話を監視する (前の音声の再生から監視を続けている場合はそのまま)
+        self._playback_decoding = True
+        if self.barge_in_enabled and (self._barge_in_monitor is None or not self._barge_in_monitor.is_alive()):
+            self._mic.start()
+            self._barge_in_monitor = threading.Thread(target=self._monitor_barge_in, args=[self._mic.ring.write_pos], daemon=True)
+            self._barge_in_monitor.start()
+
+        # 常時再生ストリームの形式に変換しながら書き込む (非圧縮の WAV はプロセス内で変換する)
+        # 再生速度を変える場合は、合成し直さずに変換後の音声を伸縮する
+        blocks = decode_audio(audio, GLOBAL_PLAY_RATE, global_audio_player.num_ch, self.play_block_frames)
+        speed = global_playback_speed.get_speed()
+        if speed != 1.0:
+            self.log("play_audio", "再生速度 {:.2f} 倍".format(speed))
+            self._stretcher.reset()  # 前回の再生を途中で止めた場合の残りを捨てる
+            self._stretcher.speed = speed
+            blocks = time_stretch(blocks, self._stretcher)
+        try:
+            self._write_playback(blocks)
+        except ffmpeg.Error as e:
+            self.log("play_audio", "音声の変換エラー:{}".format(e.stderr.decode(errors="replace") if e.stderr else e))
+        finally:
+            self._playback_decoding = False
+
+        # 続けて再生する音声が無ければ、再生し終わるまで待つ
+        if len(global_speech_queue) == 0:
+            self.wait_playback()
+
+    # 割り込み発話で再生を止めたか (次の聞き取りを始めるまで)
+    @property
+    def playback_stopped(self) -> bool:
+        return self._playback_stop.is_set()
+
+    # 再生キューの音声を再生し終わるまで待つ
+    def wait_playback(self) -> None:
+        global_audio_player.drain()
+        if self._barge_in_monitor is not None:
+            self._barge_in_monitor.join()
+            self._barge_in_monitor = None
 
 # ==================================
 #       本クラスのテスト用処理
@@ -0,0 +1,73 @@
+from typing import Any, Optional
+
+try:
+    import alsaaudio  # type: ignore[import]
+except ImportError:
+    alsaaudio = None
+
+from clova.io.local.audio.base_audio import AudioStream, BaseAudioBackend, InputCallback, OutputCallback, ThreadedAudioStream
+
+# ==================================
+#      ALSA バックエンドクラス
+# ==================================
+
+
+class AlsaAudioBackend(BaseAudioBackend):
+    # pyalsaaudio で ALSA の PCM を直接開き、ブロッキングの read / write を専用スレッドで行う
+    # (PortAudio を経由しないため、ピリオドサイズ・ピリオド数を小さくしてレイテンシを詰められる)
+    #   input_device / output_device: ALSA の PCM 名 ("default", "plughw:1,0", "dmic_hw" など)
+    #   period_size: 1 ピリオドのフレーム数 (None ならストリームごとの frames_per_buffer)
+    #   periods: デバイスのバッファのピリオド数 (レイテンシ = period_size * periods / rate)
+    DEFAULT_DEVICE = "default"
+    DEFAULT_PERIODS = 4
+
+    # コンストラクタ
+    def __init__(self, input_device: str = DEFAULT_DEVICE, output_device: str = DEFAULT_DEVICE, period_size: Any = None,
+                 periods: int = DEFAULT_PERIODS, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        if alsaaudio is None:
+            raise RuntimeError("pyalsaaudio is not installed (pip install pyalsaaudio), or select another audio backend")
+
+        self.input_device = input_device
+        self.output_device = output_device
+        self.period_size = int(period_size) if period_size is not None else None
+        self.periods = int(periods)
+        self.log("CTOR", "input={}, output={}, period_size={}, periods={}".format(input_device, output_device, period_size, periods))
+
+    # デストラクタ
+    def __del__(self) -> None:
+        super().__del__()
+
+    def _open_pcm(self, pcm_type: int, device: str, num_ch: int, rate: int, period_size: int) -> Any:
+        return alsaaudio.PCM(type=pcm_type, mode=alsaaudio.PCM_NORMAL, device=device, channels=num_ch, rate=rate,
+                             format=alsaaudio.PCM_FORMAT_S16_LE, periodsize=period_size, periods=self.periods)
+
+    def open_input(self, num_ch: int, device_index: Optional[int], rate: int, frames_per_buffer: int, callback: InputCallback) -> AudioStream:
+        period_size = self.period_size or frames_per_buffer
+        pcm = self._open_pcm(alsaaudio.PCM_CAPTURE, self.input_device, num_ch, rate, period_size)
+        overflowed = False
+
+        def step() -> int:
+            nonlocal overflowed
+            length, data = pcm.read()
+            if length < 0:
+                # オーバーラン (-EPIPE)。pyalsaaudio が復帰させるので、次の読み込みに取りこぼしを伝える
+                overflowed = True
+                return 0
+            if length > 0:
+                callback(data, overflowed)
+                overflowed = False
+            return int(length)
+
+        return ThreadedAudioStream("AlsaInput", step, rate, period_size * self.periods / rate, False, on_close=pcm.close)
+
+    def open_output(self, num_ch: int, device_index: Optional[int], rate: int, frames_per_buffer: int, callback: OutputCallback) -> AudioStream:
+        period_size = self.period_size or frames_per_buffer
+        pcm = self._open_pcm(alsaaudio.PCM_PLAYBACK, self.output_device, num_ch, rate, period_size)
+
+        def step() -> int:
+            # デバイスのバッファに空きができるまで write() が待つので、それがそのまま周期になる
+            pcm.write(callback(period_size))
+            return period_size
+
+        return ThreadedAudioStream("AlsaOutput", step, rate, period_size * self.periods / rate, False, on_close=pcm.close)
@@ -0,0 +1,109 @@
+from typing import Any, Dict, Optional, Type
+
+from clova.config.config import ConfigAudioBackend
+from clova.io.local.audio.base_audio import BaseAudioBackend
+from clova.io.local.audio.portaudio import PyAudioBackend
+from clova.io.local.audio.alsa import AlsaAudioBackend
+from clova.io.local.audio.wav_file import WavFileBackend
+from clova.io.local.audio.null import NullAudioBackend
+
+DEFAULT_AUDIO_BACKEND = "PyAudio"
+
+AUDIO_BACKEND_MODULES: Dict[str, Type[BaseAudioBackend]] = {
+    "PyAudio": PyAudioBackend,
+    "ALSA": AlsaAudioBackend,
+    "WavFile": WavFileBackend,
+    "Null": NullAudioBackend,
+}
+
+
+# 設定 ("system" / "params") から入出力バックエンドを作る。設定が無ければ PyAudio
+def create_audio_backend(conf: Optional[ConfigAudioBackend]) -> BaseAudioBackend:
+    system = conf["system"] if conf is not None else DEFAULT_AUDIO_BACKEND
+    params: Dict[str, Any] = (conf.get("params") or {}) if conf is not None else {}
+    if system not in AUDIO_BACKEND_MODULES:
+        raise ValueError("Unknown audio backend: {} (choose from {})".format(system, ", ".join(AUDIO_BACKEND_MODULES)))
+    return AUDIO_BACKEND_MODULES[system](**params)
+
+
+# ==================================
+#       本モジュールのテスト用処理
+# ==================================
+
+
+def module_test() -> None:
+    import io
+    import os
+    import sys
+    import time
+    import wave
+    import tempfile
+    import numpy as np
+
+    # WAV ファイルを入力にして、出力をファイルに書き出す (サウンドカード無しで動く)
+    rate = 16000
+    tone = (np.sin(2 * np.pi * 440 * np.arange(rate // 5) / rate) * 10000).astype(np.int16)
+    with tempfile.TemporaryDirectory() as tmp:
+        src = os.path.join(tmp, "in.wav")
+        dst = os.path.join(tmp, "out.wav")
+        with wave.open(src, "wb") as w:
+            w.setnchannels(1)
+            w.setsampwidth(2)
+            w.setframerate(rate)
+            w.writeframes(tone.tobytes())
+
+        backend = create_audio_backend({"system": "WavFile", "params": {"input_file": src, "output_file": dst}})
+        captured = io.BytesIO()
+
+        def capture(data: bytes, overflowed: bool) -> None:
+            captured.write(data)
+
+        started = time.monotonic()
+        stream = backend.open_input(1, 0, rate, 800, capture)
+        time.sleep(0.3)
+        stream.close()
+        elapsed = time.monotonic() - started
+        pcm = np.frombuffer(captured.getvalue(), dtype=np.int16)
+        print("WavFile input: {} frames in {:.2f}s".format(len(pcm), elapsed))
+        assert np.array_equal(pcm[:len(tone)], tone) and not pcm[len(tone):].any()
+        assert len(pcm) <= (elapsed + 0.1) * rate  # 実時間より速く進まない
+
+        stream = backend.open_output(2, 0, rate, 160, lambda frames: bytes(frames * 4))
+        time.sleep(0.1)
+        stream.close()
+        with wave.open(dst, "rb") as out:
+            assert (out.getnchannels(), out.getframerate()) == (2, rate) and out.getnframes() > 0
+            print("WavFile output: {} frames".format(out.getnframes()))
+
+    # 無音・破棄
+    requested = []
+
+    def render(frames: int) -> bytes:
+        requested.append(frames)
+        return bytes(frames * 2)
+
+    backend = create_audio_backend({"system": "Null", "params": {}})
+    stream = backend.open_output(1, 0, rate, 160, render)
+    time.sleep(0.1)
+    stream.close()
+    assert 0 < len(requested) <= 0.2 * rate / 160
+    print("Null output: {} callbacks".format(len(requested)))
+
+    try:
+        create_audio_backend({"system": "Unknown", "params": {}})
+        assert False
+    except ValueError:
+        pass
+
+    # 引数で指定したバックエンドのデバイス一覧
+    if len(sys.argv) >= 2:
+        for device in create_audio_backend({"system": sys.argv[1], "params": {}}).list_devices():
+            print(device)
+    print("AudioBackend OK")
+
+
+# ==================================
+# 本モジュールを直接呼出した時の処理
+# ==================================
+if __name__ == "__main__":
+    module_test()
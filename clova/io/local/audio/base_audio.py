@@ -0,0 +1,121 @@
+import time
+import threading
+
+from abc import ABC, abstractmethod
+from typing import Any, Callable, List, NamedTuple, Optional
+
+from clova.general.logger import BaseLogger
+
+# 入力コールバック: (S16_LE PCM, 前回から入力を取りこぼしたか)
+InputCallback = Callable[[bytes, bool], None]
+# 出力コールバック: 要求フレーム数 -> S16_LE PCM (ちょうどその長さ)
+OutputCallback = Callable[[int], bytes]
+
+
+class AudioDeviceInfo(NamedTuple):
+    device_index: int
+    name: str
+    max_input_channels: int
+    max_output_channels: int
+    default_sample_rate: float
+
+
+# ==================================
+#         音声ストリームクラス
+# ==================================
+
+
+class AudioStream(ABC):
+    # 開いている入力 / 出力ストリーム。close() するまでコールバックが呼ばれ続ける
+
+    # 入出力のレイテンシ (秒)
+    @property
+    @abstractmethod
+    def latency(self) -> float:
+        pass
+
+    @abstractmethod
+    def close(self) -> None:
+        pass
+
+
+class ThreadedAudioStream(AudioStream):
+    # 1 周期分の入出力を行う step() を専用スレッドで繰り返し呼ぶストリーム (PortAudio 以外のバックエンド用)
+    #   - step() は処理したフレーム数を返す
+    #   - realtime: デバイスが無い (ブロッキングしない) 場合、処理したフレーム数に合わせて実時間で待つ
+    MAX_LAG_SECONDS = 0.5  # これ以上遅れたら追いつこうとせず、現在時刻から数え直す
+
+    # コンストラクタ
+    def __init__(self, name: str, step: Callable[[], int], rate: int, latency: float, realtime: bool,
+                 on_close: Optional[Callable[[], None]] = None) -> None:
+        self._step = step
+        self._rate = rate
+        self._latency = latency
+        self._realtime = realtime
+        self._on_close = on_close
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    @property
+    def latency(self) -> float:
+        return self._latency
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._thread is not threading.current_thread():
+            self._thread.join()
+        if self._on_close is not None:
+            self._on_close()
+            self._on_close = None
+
+    def _run(self) -> None:
+        next_time = time.monotonic()
+        while not self._stop.is_set():
+            frames = self._step()
+            if not self._realtime:
+                continue
+
+            next_time += frames / self._rate
+            delay = next_time - time.monotonic()
+            if delay < -self.MAX_LAG_SECONDS:
+                next_time = time.monotonic()
+            elif delay > 0:
+                self._stop.wait(delay)
+
+
+# ==================================
+#      音声入出力バックエンドクラス
+# ==================================
+
+
+class BaseAudioBackend(BaseLogger, ABC):
+    # マイク・スピーカーのストリームを開く。形式は S16_LE (インタリーブ) 固定
+    #   device_index: PortAudio のデバイスインデックス。None なら既定のデバイス (使わないバックエンドもある)
+    #   frames_per_buffer: コールバック 1 回あたりのフレーム数の目安 (バックエンドの設定で変わることがある)
+    SAMPLE_WIDTH = 2
+
+    # コンストラクタ (params は CLOVA_RasPi.json の "backend" の "params")
+    def __init__(self, **kwargs: Any) -> None:
+        super().__init__()
+
+    # デストラクタ
+    def __del__(self) -> None:
+        super().__del__()
+
+    @abstractmethod
+    def open_input(self, num_ch: int, device_index: Optional[int], rate: int, frames_per_buffer: int, callback: InputCallback) -> AudioStream:
+        pass
+
+    @abstractmethod
+    def open_output(self, num_ch: int, device_index: Optional[int], rate: int, frames_per_buffer: int, callback: OutputCallback) -> AudioStream:
+        pass
+
+    # 使えるデバイスの一覧 (一覧を持たないバックエンドは空)
+    def list_devices(self) -> List[AudioDeviceInfo]:
+        return []
+
+    # デバイス構成が変わった時に呼ばれる。バックエンドが保持しているデバイス一覧を読み直す
+    # 読み直せなかった場合 (使用中のストリームがあるなど) は False
+    def refresh(self) -> bool:
+        return True
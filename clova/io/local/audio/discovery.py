@@ -0,0 +1,192 @@
+import os
+import json
+import hashlib
+
+from typing import List, Optional
+
+from clova.io.local.audio.base_audio import AudioDeviceInfo, BaseAudioBackend
+from clova.general.logger import BaseLogger
+
+AUDIO_DEVICE_CACHE_PATH = os.path.join(os.path.expanduser("~/.config"), "clova", "audio_devices.json")
+ASOUND_CARDS_PATH = "/proc/asound/cards"
+ASOUND_CONFIG_PATHS = ("/etc/asound.conf", "~/.asoundrc")  # dmic_hw などの PCM 定義
+
+# ==================================
+#      デバイス自動検出クラス
+# ==================================
+
+
+class AudioDeviceResolver(BaseLogger):
+    # デバイス名と必要なチャンネル数から、バックエンドのデバイスインデックスを決める
+    #   - デバイス一覧はディスクにキャッシュし、起動のたびに列挙しない
+    #   - キャッシュは、サウンドカードの一覧 (/proc/asound/cards) と ALSA の設定ファイルが変わったら作り直す
+    #     (/proc/asound/cards が無い環境では変更を検出できないため、キャッシュしない)
+    #   - 列挙し直す時は、バックエンドが保持しているデバイス一覧も読み直させる (PortAudio は初期化時の一覧のままのため)
+
+    # コンストラクタ
+    def __init__(self, backend: BaseAudioBackend, cache_path: str = AUDIO_DEVICE_CACHE_PATH) -> None:
+        super().__init__()
+
+        self.backend = backend
+        self.cache_path = cache_path
+        self._devices: Optional[List[AudioDeviceInfo]] = None
+        self._fingerprint: Optional[str] = None  # _devices を列挙した時のデバイス構成
+
+    # デストラクタ
+    def __del__(self) -> None:
+        super().__del__()
+
+    # デバイス構成の指紋。構成を検出できない場合は None
+    def fingerprint(self) -> Optional[str]:
+        try:
+            with open(ASOUND_CARDS_PATH, "rb") as f:
+                cards = f.read()
+        except OSError:
+            return None
+
+        digest = hashlib.sha1(type(self.backend).__name__.encode())
+        digest.update(cards)
+        for path in ASOUND_CONFIG_PATHS:
+            try:
+                stat = os.stat(os.path.expanduser(path))
+                digest.update("{}:{}:{}".format(path, stat.st_mtime_ns, stat.st_size).encode())
+            except OSError:
+                pass
+        return digest.hexdigest()
+
+    # デバイス一覧 (use_cache=False で必ず列挙し直す)
+    def get_devices(self, use_cache: bool = True) -> List[AudioDeviceInfo]:
+        fingerprint = self.fingerprint()
+        if use_cache and self._devices is not None and fingerprint == self._fingerprint:
+            return self._devices
+
+        if use_cache and self._devices is None and fingerprint is not None:
+            cached = self._load_cache(fingerprint)
+            if cached is not None:
+                self._devices = cached
+                self._fingerprint = fingerprint
+                return cached
+
+        # 構成が変わった (または列挙し直す) 場合は、バックエンドのデバイス一覧から読み直す
+        if not self.backend.refresh():
+            self.log("get_devices", "使用中のストリームがあるため、バックエンドのデバイス一覧は読み直せません")
+        self._devices = self.backend.list_devices()
+        self._fingerprint = fingerprint
+        self.log("get_devices", "{} 個のデバイスを列挙しました".format(len(self._devices)))
+        if fingerprint is not None:
+            self._save_cache(fingerprint, self._devices)
+        return self._devices
+
+    def _load_cache(self, fingerprint: str) -> Optional[List[AudioDeviceInfo]]:
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                cache = json.load(f)
+            if cache.get("fingerprint") != fingerprint:
+                self.log("_load_cache", "デバイス構成が変わったため、デバイス一覧を作り直します")
+                return None
+            return [AudioDeviceInfo(*device) for device in cache["devices"]]
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def _save_cache(self, fingerprint: str, devices: List[AudioDeviceInfo]) -> None:
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            tmp_path = self.cache_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"fingerprint": fingerprint, "devices": [list(device) for device in devices]}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            self.log("_save_cache", "デバイス一覧を保存できません:{}".format(e))
+
+    # 名前が一致し、必要なチャンネル数を入力 (出力) できるデバイスを探す
+    # (完全一致を優先し、無ければ大文字小文字を区別せず名前を含むもの)
+    def find(self, name: str, is_input: bool, num_ch: int) -> Optional[AudioDeviceInfo]:
+        candidates = [d for d in self.get_devices() if (d.max_input_channels if is_input else d.max_output_channels) >= num_ch]
+        for device in candidates:
+            if device.name == name:
+                return device
+        for device in candidates:
+            if name.lower() in device.name.lower():
+                return device
+        return None
+
+    # 設定のデバイス名からインデックスを決める。名前が無い・見つからない場合は fallback (設定のインデックス)
+    def resolve(self, name: Optional[str], is_input: bool, num_ch: int, fallback: Optional[int]) -> Optional[int]:
+        kind = "入力" if is_input else "出力"
+        if not name:
+            return fallback
+
+        device = self.find(name, is_input, num_ch)
+        if device is None:
+            self.log("resolve", "{} ({}{}ch) が見つからないため、インデックス {} を使います".format(name, kind, num_ch, fallback))
+            return fallback
+
+        self.log("resolve", "{} ({}{}ch) -> Index={} ({})".format(name, kind, num_ch, device.device_index, device.name))
+        return device.device_index
+
+
+# ==================================
+#       本クラスのテスト用処理
+# ==================================
+
+
+def module_test() -> None:
+    import tempfile
+    from typing import Any
+
+    class FakeBackend(BaseAudioBackend):
+        enumerated = 0
+        refreshed = 0
+
+        def open_input(self, *args: Any) -> Any:
+            raise NotImplementedError
+
+        def open_output(self, *args: Any) -> Any:
+            raise NotImplementedError
+
+        def refresh(self) -> bool:
+            FakeBackend.refreshed += 1
+            return True
+
+        def list_devices(self) -> List[AudioDeviceInfo]:
+            FakeBackend.enumerated += 1
+            return [AudioDeviceInfo(0, "bcm2835 Headphones: - (hw:0,0)", 0, 8, 44100.0),
+                    AudioDeviceInfo(3, "dmic_hw", 2, 2, 44100.0),
+                    AudioDeviceInfo(4, "DMIC_HW (plug)", 0, 2, 48000.0),
+                    AudioDeviceInfo(11, "default", 32, 32, 44100.0)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_path = os.path.join(tmp, "devices.json")
+        resolver = AudioDeviceResolver(FakeBackend(), cache_path)
+        resolver.fingerprint = lambda: "cards-A"  # type: ignore[method-assign]
+
+        # 名前とチャンネル数で探す (入力できないものは対象外、部分一致も可)
+        assert resolver.resolve("dmic_hw", True, 2, 11) == 3
+        assert resolver.resolve("dmic", False, 2, 11) == 3
+        assert resolver.resolve("dmic_hw", True, 4, 11) == 11
+        assert resolver.resolve("Headphones", False, 2, None) == 0
+        assert resolver.resolve(None, True, 1, 11) == 11
+        assert FakeBackend.enumerated == 1
+
+        # 2 回目の起動はキャッシュから読み、構成が変わったら列挙し直す
+        resolver = AudioDeviceResolver(FakeBackend(), cache_path)
+        resolver.fingerprint = lambda: "cards-A"  # type: ignore[method-assign]
+        assert resolver.resolve("dmic_hw", True, 2, 11) == 3 and FakeBackend.enumerated == 1
+        resolver = AudioDeviceResolver(FakeBackend(), cache_path)
+        resolver.fingerprint = lambda: "cards-B"  # type: ignore[method-assign]
+        assert resolver.resolve("dmic_hw", True, 2, 11) == 3 and FakeBackend.enumerated == 2
+
+        # 起動中に構成が変わった場合も、バックエンドのデバイス一覧から読み直す
+        refreshed = FakeBackend.refreshed
+        assert resolver.resolve("dmic_hw", True, 2, 11) == 3 and FakeBackend.enumerated == 2
+        resolver.fingerprint = lambda: "cards-C"  # type: ignore[method-assign]
+        assert resolver.resolve("dmic_hw", True, 2, 11) == 3 and FakeBackend.enumerated == 3 and FakeBackend.refreshed == refreshed + 1
+    print("fingerprint: {}".format(AudioDeviceResolver(FakeBackend()).fingerprint()))
+    print("AudioDeviceResolver OK")
+
+
+# ==================================
+# 本モジュールを直接呼出した時の処理
+# ==================================
+if __name__ == "__main__":
+    module_test()
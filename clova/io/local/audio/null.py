@@ -0,0 +1,35 @@
+from typing import Any, Optional
+
+from clova.io.local.audio.base_audio import AudioStream, BaseAudioBackend, InputCallback, OutputCallback, ThreadedAudioStream
+
+# ==================================
+#     無音・破棄バックエンドクラス
+# ==================================
+
+
+class NullAudioBackend(BaseAudioBackend):
+    # サウンドカードの無い環境用。入力は無音、出力は捨てる (どちらも実時間の速さで進む)
+
+    # コンストラクタ
+    def __init__(self, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+
+    # デストラクタ
+    def __del__(self) -> None:
+        super().__del__()
+
+    def open_input(self, num_ch: int, device_index: Optional[int], rate: int, frames_per_buffer: int, callback: InputCallback) -> AudioStream:
+        silence = bytes(frames_per_buffer * num_ch * self.SAMPLE_WIDTH)
+
+        def step() -> int:
+            callback(silence, False)
+            return frames_per_buffer
+
+        return ThreadedAudioStream("NullInput", step, rate, frames_per_buffer / rate, True)
+
+    def open_output(self, num_ch: int, device_index: Optional[int], rate: int, frames_per_buffer: int, callback: OutputCallback) -> AudioStream:
+        def step() -> int:
+            callback(frames_per_buffer)
+            return frames_per_buffer
+
+        return ThreadedAudioStream("NullOutput", step, rate, frames_per_buffer / rate, True)
@@ -0,0 +1,134 @@
+import threading
+
+from typing import Any, List, Mapping, Optional, Tuple
+
+try:
+    import pyaudio
+except ImportError:
+    pyaudio = None  # type: ignore[assignment]
+
+from clova.io.local.audio.base_audio import AudioDeviceInfo, AudioStream, BaseAudioBackend, InputCallback, OutputCallback
+
+# ==================================
+#     PyAudio ストリームクラス
+# ==================================
+
+
+class PyAudioStream(AudioStream):
+    # コールバック方式の PortAudio ストリーム (PyAudio はバックエンドが共有しているものを使う)
+
+    # コンストラクタ
+    def __init__(self, backend: "PyAudioBackend", is_input: bool, num_ch: int, device_index: Optional[int], rate: int, frames_per_buffer: int,
+                 input_callback: Optional[InputCallback] = None, output_callback: Optional[OutputCallback] = None) -> None:
+        self._backend = backend
+        self._is_input = is_input
+        self._input_callback = input_callback
+        self._output_callback = output_callback
+
+        device_args = {"input_device_index": device_index} if is_input else {"output_device_index": device_index}
+        pyaud = backend.acquire()
+        try:
+            self._stream = pyaud.open(format=pyaudio.paInt16,
+                                      channels=num_ch,
+                                      rate=rate,
+                                      input=is_input,
+                                      output=not is_input,
+                                      frames_per_buffer=frames_per_buffer,
+                                      stream_callback=self._callback,
+                                      **device_args)  # type: ignore[arg-type]
+        except Exception:
+            backend.release()
+            raise
+        self._stream.start_stream()
+
+    @property
+    def latency(self) -> float:
+        return float(self._stream.get_input_latency() if self._is_input else self._stream.get_output_latency())
+
+    def close(self) -> None:
+        self._stream.stop_stream()
+        self._stream.close()
+        self._backend.release()
+
+    # PortAudio のスレッドから呼ばれる
+    def _callback(self, in_data: Optional[bytes], frame_count: int, time_info: Mapping[str, float], status: int) -> Tuple[Optional[bytes], int]:
+        if self._input_callback is not None:
+            if in_data is not None:
+                self._input_callback(in_data, bool(status & pyaudio.paInputOverflow))
+            return (None, pyaudio.paContinue)
+
+        assert self._output_callback is not None
+        return (self._output_callback(frame_count), pyaudio.paContinue)
+
+
+# ==================================
+#    PyAudio バックエンドクラス
+# ==================================
+
+
+class PyAudioBackend(BaseAudioBackend):
+    # PyAudio (PortAudio) で入出力する (既定)
+    #   - PyAudio の初期化 (ALSA のデバイスを列挙するため重い) はプロセスで 1 回だけ行い、全ストリームで共有する
+    #   - PortAudio のデバイス一覧は初期化した時点のものなので、デバイス構成が変わったら refresh() で開き直す
+    #     (AudioDeviceResolver が /proc/asound/cards などの変化を検出して呼ぶ。ストリームが無い時のみ)
+
+    # コンストラクタ
+    def __init__(self, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        # 例外で抜けてもデストラクタが参照できるよう、先に初期化しておく
+        self._lock = threading.Lock()
+        self._pyaud: Optional[pyaudio.PyAudio] = None
+        self._open_streams = 0
+
+        if pyaudio is None:
+            raise RuntimeError("PyAudio is not installed (pip install pyaudio), or select another audio backend")
+
+    # デストラクタ
+    def __del__(self) -> None:
+        if self._pyaud is not None and self._open_streams == 0:
+            self._pyaud.terminate()
+        super().__del__()
+
+    # 共有の PyAudio を返す (初回に初期化する)
+    def _context(self) -> "pyaudio.PyAudio":
+        with self._lock:
+            if self._pyaud is None:
+                self.log("_context", "PyAudio を初期化します")
+                self._pyaud = pyaudio.PyAudio()
+            return self._pyaud
+
+    # ストリームを開く時・閉じた時に呼ばれる
+    def acquire(self) -> "pyaudio.PyAudio":
+        pyaud = self._context()
+        with self._lock:
+            self._open_streams += 1
+        return pyaud
+
+    def release(self) -> None:
+        with self._lock:
+            self._open_streams -= 1
+
+    # デバイス一覧を読み直す (開いているストリームがある場合は何もせず False)
+    def refresh(self) -> bool:
+        with self._lock:
+            if self._open_streams > 0:
+                return False
+            if self._pyaud is not None:
+                self._pyaud.terminate()
+                self._pyaud = None
+        return True
+
+    def open_input(self, num_ch: int, device_index: Optional[int], rate: int, frames_per_buffer: int, callback: InputCallback) -> AudioStream:
+        return PyAudioStream(self, True, num_ch, device_index, rate, frames_per_buffer, input_callback=callback)
+
+    def open_output(self, num_ch: int, device_index: Optional[int], rate: int, frames_per_buffer: int, callback: OutputCallback) -> AudioStream:
+        return PyAudioStream(self, False, num_ch, device_index, rate, frames_per_buffer, output_callback=callback)
+
+    def list_devices(self) -> List[AudioDeviceInfo]:
+        pyaud = self._context()
+        devices = []
+        for i in range(pyaud.get_device_count()):
+            info = pyaud.get_device_info_by_index(i)
+            devices.append(AudioDeviceInfo(int(info["index"]), str(info["name"]), int(info["maxInputChannels"]),
+                                           int(info["maxOutputChannels"]), float(info["defaultSampleRate"])))
+        return devices
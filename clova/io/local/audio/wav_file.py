@@ -0,0 +1,72 @@
+import wave
+import numpy as np
+
+from typing import Any, Optional
+
+from clova.io.local.audio.base_audio import AudioStream, BaseAudioBackend, InputCallback, OutputCallback, ThreadedAudioStream
+from clova.processor.audio.decoder import decode_audio
+
+# ==================================
+#    WAV ファイル バックエンドクラス
+# ==================================
+
+
+class WavFileBackend(BaseAudioBackend):
+    # マイク入力を音声ファイルから読み、スピーカー出力を WAV ファイルに書き出す (実時間の速さで進む)
+    #   input_file: 入力にする音声ファイル (ストリームの形式に変換する)。None なら無音
+    #   output_file: 出力を書き出す WAV ファイル (ストリームを開くたびに上書き)。None なら捨てる
+    #   loop: 入力ファイルを繰り返す (False なら最後まで読んだ後は無音)
+
+    # コンストラクタ
+    def __init__(self, input_file: Optional[str] = None, output_file: Optional[str] = None, loop: bool = False, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+
+        self.input_file = input_file
+        self.output_file = output_file
+        self.loop = loop
+        self.log("CTOR", "input_file={}, output_file={}, loop={}".format(input_file, output_file, loop))
+
+    # デストラクタ
+    def __del__(self) -> None:
+        super().__del__()
+
+    def open_input(self, num_ch: int, device_index: Optional[int], rate: int, frames_per_buffer: int, callback: InputCallback) -> AudioStream:
+        chunk_bytes = frames_per_buffer * num_ch * self.SAMPLE_WIDTH
+        pcm = b""
+        if self.input_file is not None:
+            with open(self.input_file, "rb") as f:
+                frames = np.concatenate(list(decode_audio(f.read(), rate, num_ch, rate)))
+            pcm = np.clip(np.rint(frames), -32768, 32767).astype("<i2").tobytes()
+            self.log("open_input", "{} ({:.2f}秒)".format(self.input_file, len(frames) / rate))
+        pos = 0
+
+        def step() -> int:
+            nonlocal pos
+            if self.loop and len(pcm) > 0 and pos >= len(pcm):
+                pos = 0
+            chunk = pcm[pos:pos + chunk_bytes]
+            pos += len(chunk)
+            callback(chunk + bytes(chunk_bytes - len(chunk)), False)
+            return frames_per_buffer
+
+        return ThreadedAudioStream("WavFileInput", step, rate, frames_per_buffer / rate, True)
+
+    def open_output(self, num_ch: int, device_index: Optional[int], rate: int, frames_per_buffer: int, callback: OutputCallback) -> AudioStream:
+        if self.output_file is None:
+            def discard() -> int:
+                callback(frames_per_buffer)
+                return frames_per_buffer
+
+            return ThreadedAudioStream("WavFileOutput", discard, rate, frames_per_buffer / rate, True)
+
+        wav = wave.open(self.output_file, "wb")
+        wav.setnchannels(num_ch)
+        wav.setsampwidth(self.SAMPLE_WIDTH)
+        wav.setframerate(rate)
+        self.log("open_output", "{} に書き出します".format(self.output_file))
+
+        def step() -> int:
+            wav.writeframes(callback(frames_per_buffer))
+            return frames_per_buffer
+
+        return ThreadedAudioStream("WavFileOutput", step, rate, frames_per_buffer / rate, True, on_close=wav.close)
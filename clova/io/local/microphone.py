@@ -0,0 +1,188 @@
+import threading
+
+from typing import Optional
+
+from clova.io.local.audio.base_audio import AudioStream, BaseAudioBackend
+from clova.general.logger import BaseLogger
+
+# ==================================
+#      録音用リングバッファクラス
+# ==================================
+
+
+class AudioRingBuffer:
+    # コンストラクタ
+    #   capacity: バッファサイズ (バイト)
+    def __init__(self, capacity: int) -> None:
+        self._capacity = capacity
+        self._buf = bytearray(capacity)
+        self._view = memoryview(self._buf)
+        self._write_pos = 0  # 書き込み済みの総バイト数 (単調増加)
+        self._cond = threading.Condition()
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+    # 書き込み済みの総バイト数 (読み出し位置の基準)
+    @property
+    def write_pos(self) -> int:
+        with self._cond:
+            return self._write_pos
+
+    # 最も古い読み出し可能位置
+    @property
+    def oldest_pos(self) -> int:
+        with self._cond:
+            return max(0, self._write_pos - self._capacity)
+
+    # データを書き込む。古いデータは上書きされる
+    def write(self, data: bytes) -> None:
+        src = memoryview(data)
+        if len(src) > self._capacity:
+            src = src[-self._capacity:]
+
+        with self._cond:
+            offset = (self._write_pos + (len(data) - len(src))) % self._capacity
+            first = min(len(src), self._capacity - offset)
+            self._view[offset:offset + first] = src[:first]
+            if first < len(src):
+                self._view[:len(src) - first] = src[first:]
+            self._write_pos += len(data)
+            self._cond.notify_all()
+
+    # 指定位置までデータが書き込まれるのを待つ
+    def wait_for(self, pos: int, timeout: Optional[float] = None) -> bool:
+        with self._cond:
+            return self._cond.wait_for(lambda: self._write_pos >= pos, timeout)
+
+    # 指定位置からデータを out にコピーする。上書き済みの位置を指定した場合は ValueError
+    def read_into(self, pos: int, out: memoryview) -> None:
+        with self._cond:
+            end = pos + len(out)
+            if pos < self._write_pos - self._capacity:
+                raise ValueError("Data at position {} was already overwritten".format(pos))
+            if end > self._write_pos:
+                raise ValueError("Data at position {} is not written yet".format(end))
+
+            offset = pos % self._capacity
+            first = min(len(out), self._capacity - offset)
+            out[:first] = self._view[offset:offset + first]
+            if first < len(out):
+                out[first:] = self._view[:len(out) - first]
+
+    # 指定範囲のデータを取得する
+    def read(self, start: int, end: int) -> bytes:
+        out = bytearray(end - start)
+        self.read_into(start, memoryview(out))
+        return bytes(out)
+
+
+# ==================================
+#       常時録音ストリームクラス
+# ==================================
+
+
+class MicrophoneStream(BaseLogger):
+    SAMPLE_WIDTH = BaseAudioBackend.SAMPLE_WIDTH
+
+    # コンストラクタ
+    def __init__(self, backend: BaseAudioBackend, num_ch: int, device_index: Optional[int], rate: int, frames_per_buffer: int, buffer_seconds: int) -> None:
+        super().__init__()
+
+        self.backend = backend
+        self.num_ch = num_ch
+        self.device_index = device_index
+        self.rate = rate
+        self.frames_per_buffer = frames_per_buffer
+        self.bytes_per_frame = self.SAMPLE_WIDTH * num_ch
+        self.ring = AudioRingBuffer(rate * buffer_seconds * self.bytes_per_frame)
+
+        self._stream: Optional[AudioStream] = None
+        self._lock = threading.Lock()
+        self._skip_first_chunk = True
+        self._input_overflows = 0
+
+    # デストラクタ
+    def __del__(self) -> None:
+        self.stop()
+        super().__del__()
+
+    @property
+    def is_active(self) -> bool:
+        return self._stream is not None
+
+    # 取りこぼした入力の回数 (デバイスの入力バッファあふれ)
+    @property
+    def overruns(self) -> int:
+        return self._input_overflows
+
+    # 入力レイテンシ (秒)。録音していない時は 0
+    @property
+    def input_latency(self) -> float:
+        stream = self._stream
+        return stream.latency if stream is not None else 0.0
+
+    # 録音開始 (起動済みなら何もしない)
+    def start(self) -> None:
+        with self._lock:
+            if self._stream is not None:
+                return
+
+            self.log("start", "MIC: NumCh={}, Index={}, Rate={}, Buffer={}bytes".format(self.num_ch, self.device_index, self.rate, self.ring.capacity))
+
+            self._skip_first_chunk = True
+            self._stream = self.backend.open_input(self.num_ch, self.device_index, self.rate, self.frames_per_buffer, self._callback)
+
+    # 録音停止
+    def stop(self) -> None:
+        with self._lock:
+            if self._stream is not None:
+                self._stream.close()
+                self._stream = None
+
+    # 入力バックエンドのスレッドから呼ばれる
+    def _callback(self, in_data: bytes, overflowed: bool) -> None:
+        if overflowed:
+            self._input_overflows += 1
+
+        # 初回のボツッ音を発話開始と認識してしまうので、最初の１フレーム分は捨てる
+        if self._skip_first_chunk:
+            self._skip_first_chunk = False
+        else:
+            self.ring.write(in_data)
+
+
+# ==================================
+#       本クラスのテスト用処理
+# ==================================
+
+
+def module_test() -> None:
+    ring = AudioRingBuffer(8)
+    ring.write(b"0123456")
+    ring.write(b"789")
+    assert ring.write_pos == 10
+    assert ring.oldest_pos == 2
+    assert ring.read(2, 10) == b"23456789"
+    print("AudioRingBuffer OK")
+
+    # サウンドカード無しでも録音できる (最初の 1 チャンクは捨てる)
+    import time
+    from clova.io.local.audio.null import NullAudioBackend
+
+    mic = MicrophoneStream(NullAudioBackend(), 2, 0, 16000, 160, 1)
+    mic.start()
+    assert mic.ring.wait_for(160 * mic.bytes_per_frame * 3, 1.0)
+    mic.stop()
+    written = mic.ring.write_pos
+    time.sleep(0.05)
+    assert mic.ring.write_pos == written and written % mic.bytes_per_frame == 0
+    print("MicrophoneStream OK")
+
+
+# ==================================
+# 本モジュールを直接呼出した時の処理
+# ==================================
+if __name__ == "__main__":
+    module_test()
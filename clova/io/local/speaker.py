@@ -0,0 +1,336 @@
+import time
+import threading
+import numpy as np
+import numpy.typing as npt
+
+from typing import Callable, List, Optional, Tuple, Union
+
+from clova.io.local.audio.base_audio import AudioStream, BaseAudioBackend
+from clova.general.logger import BaseLogger
+
+# ==================================
+#       ミキサー入力 (音源) クラス
+# ==================================
+
+
+class MixerSource(BaseLogger):
+    # ミキサーへの 1 つの入力。音声・音楽などのサブシステムごとに 1 つ持ち、他の音源を待たずに書き込める
+    #   - 書き込まれた PCM (S16_LE、ミキサーと同じチャンネル数のインタリーブ) は固定長のリングバッファにコピーする
+    #     (呼び出し側はバッファを使い回せる)
+    #   - duck_others: この音源の再生中は、他の音源の音量を下げる (音楽の上に音声を重ねる場合など)
+    #   - duck_gain: 他の音源によって音量を下げられた時の倍率
+
+    # コンストラクタ
+    #   max_queued_seconds: write() で溜めておける最大の長さ (これを超えると write() が待つ)
+    def __init__(self, mixer: "AudioMixer", name: str, max_queued_seconds: float, duck_others: bool, duck_gain: float) -> None:
+        super().__init__()
+
+        self.mixer = mixer
+        self.name = name
+        self.num_ch = mixer.num_ch
+        self.rate = mixer.rate
+        self.bytes_per_frame = mixer.bytes_per_frame
+        self.max_queued_bytes = max(int(self.rate * max_queued_seconds), mixer.frames_per_buffer) * self.bytes_per_frame
+        self.duck_others = duck_others
+        self.duck_gain = duck_gain
+
+        self._cond = threading.Condition()
+        self._ring = bytearray(self.max_queued_bytes)
+        self._ring_view = memoryview(self._ring)
+        self._read_pos = 0  # 再生済みのバイト数 (累計)
+        self._write_pos = 0  # 書き込まれたバイト数 (累計)
+        self._gain = 1.0  # 現在の倍率 (ミキサーのスレッドでのみ変更する)
+
+    # デストラクタ
+    def __del__(self) -> None:
+        super().__del__()
+
+    # 再生待ちのバイト数
+    @property
+    def queued_bytes(self) -> int:
+        with self._cond:
+            return self._write_pos - self._read_pos
+
+    # 出力レイテンシ (秒)。再生していない時は 0
+    @property
+    def output_latency(self) -> float:
+        return self.mixer.output_latency
+
+    # PCM を再生キューに追加する (ミキサーの出力ストリームが開いていなければ開く)
+    def write(self, pcm: Union[bytes, bytearray, memoryview]) -> None:
+        if len(pcm) == 0:
+            return
+        self.mixer.start()
+        self._enqueue(memoryview(pcm).cast("B"))
+
+    # 空きができるのを待ちながらリングバッファにコピーする
+    def _enqueue(self, pcm: memoryview) -> None:
+        capacity = self.max_queued_bytes
+        written = 0
+        while written < len(pcm):
+            with self._cond:
+                self._cond.wait_for(lambda: self._write_pos - self._read_pos < capacity)
+                n = min(len(pcm) - written, capacity - (self._write_pos - self._read_pos))
+                offset = self._write_pos % capacity
+                first = min(n, capacity - offset)
+                self._ring_view[offset:offset + first] = pcm[written:written + first]
+                self._ring_view[:n - first] = pcm[written + first:written + n]
+                self._write_pos += n
+            written += n
+
+    # 再生キューが空になり、出力し終わるまで待つ
+    def drain(self, timeout: Optional[float] = None) -> bool:
+        with self._cond:
+            done = self._cond.wait_for(lambda: self._write_pos == self._read_pos, timeout)
+
+        # デバイス側のバッファに残っている分
+        if done and self.mixer.is_active():
+            time.sleep(self.output_latency)
+        return done
+
+    # 再生キューを破棄する (再生中の音声を止める)
+    def flush(self) -> None:
+        with self._cond:
+            self._read_pos = self._write_pos
+            self._cond.notify_all()
+
+    # ミキサーから外す
+    def close(self) -> None:
+        self.flush()
+        self.mixer.close_source(self)
+
+    # ミキサーのスレッドから呼ばれる。最大 len(dst) バイトを dst にコピーし、コピーしたバイト数を返す
+    def _read_into(self, dst: memoryview) -> int:
+        with self._cond:
+            n = min(len(dst), self._write_pos - self._read_pos)
+            if n == 0:
+                return 0
+            offset = self._read_pos % self.max_queued_bytes
+            first = min(n, self.max_queued_bytes - offset)
+            dst[:first] = self._ring_view[offset:offset + first]
+            dst[first:n] = self._ring_view[:n - first]
+            self._read_pos += n
+            self._cond.notify_all()
+        return n
+
+
+# ==================================
+#       常時再生ミキサークラス
+# ==================================
+
+
+class AudioMixer(BaseLogger):
+    # 出力ストリームを開いたままにして、各音源 (MixerSource) の PCM を NumPy でブロックごとに加算して再生する
+    #   - 再生するデータが無い間は無音を出力する (発話ごとの open/close によるノイズ・遅延・途切れが無い)
+    #   - duck_others の音源が鳴っている間 (と、その後 DUCK_HOLD_SECONDS の間) は、他の音源を duck_gain まで下げる
+    #     倍率はブロック内で直線的に変化させ、DUCK_RAMP_SECONDS で切り替わる (急な音量変化によるノイズを防ぐ)
+    #   - 加算用のバッファはあらかじめ確保し、コールバックごとに配列を作らない
+    #   - bind_for_output() で登録した関数に、加算後の出力を渡す (エコーキャンセラの参照信号など。無音の間は呼ばない)
+    SAMPLE_WIDTH = BaseAudioBackend.SAMPLE_WIDTH
+    DUCK_RAMP_SECONDS = 0.15
+    DUCK_HOLD_SECONDS = 0.5  # 文と文の間で音量が上下しないよう、下げた状態を保つ時間
+    DEFAULT_DUCK_GAIN = 0.25
+
+    # コンストラクタ
+    def __init__(self, backend: BaseAudioBackend, num_ch: int, device_index: Optional[int], rate: int, frames_per_buffer: int) -> None:
+        super().__init__()
+
+        self.backend = backend
+        self.num_ch = num_ch
+        self.device_index = device_index
+        self.rate = rate
+        self.frames_per_buffer = frames_per_buffer
+        self.bytes_per_frame = self.SAMPLE_WIDTH * num_ch
+
+        self._stream: Optional[AudioStream] = None
+        self._lock = threading.Lock()
+        self._sources: Tuple[MixerSource, ...] = ()
+        self._silence = bytes(frames_per_buffer * self.bytes_per_frame)
+        self._duck_remaining = 0  # 音量を下げた状態を保つ残りフレーム数
+        self.output_callbacks: List[Callable[[npt.NDArray[np.int16]], None]] = []
+        self._allocate(frames_per_buffer)
+
+    # デストラクタ
+    def __del__(self) -> None:
+        self.stop()
+        super().__del__()
+
+    def _allocate(self, frames: int) -> None:
+        self._frames = frames
+        self._scratch = np.zeros((frames, self.num_ch), dtype=np.int16)
+        self._scratch_bytes = self._scratch.data.cast("B")
+        self._weighted = np.zeros((frames, self.num_ch), dtype=np.float32)
+        self._mix = np.zeros((frames, self.num_ch), dtype=np.float32)
+        self._out = np.zeros((frames, self.num_ch), dtype=np.int16)
+        self._out_bytes = self._out.data.cast("B")
+        self._ramp = np.arange(1, frames + 1, dtype=np.float32) / np.float32(frames)
+        self._gains = np.zeros(frames, dtype=np.float32)
+
+    # 音源を追加する
+    def open_source(self, name: str, max_queued_seconds: float = 1.0, duck_others: bool = False, duck_gain: float = DEFAULT_DUCK_GAIN) -> MixerSource:
+        source = MixerSource(self, name, max_queued_seconds, duck_others, duck_gain)
+        with self._lock:
+            self._sources = self._sources + (source, )
+        self.log("open_source", "{} (duck_others={}, duck_gain={})".format(name, duck_others, duck_gain))
+        return source
+
+    # 音源を外す
+    def close_source(self, source: MixerSource) -> None:
+        with self._lock:
+            self._sources = tuple(s for s in self._sources if s is not source)
+
+    # 加算後の出力 ((フレーム, チャンネル) の int16) を受け取る関数を登録する
+    # 出力バックエンドのスレッドから呼ばれるので、時間のかかる処理はしないこと (配列は次の呼び出しで書き換わる)
+    def bind_for_output(self, cb: Callable[[npt.NDArray[np.int16]], None]) -> None:
+        self.output_callbacks.append(cb)
+
+    def _notify_output(self, out: npt.NDArray[np.int16]) -> None:
+        for cb in self.output_callbacks:
+            try:
+                cb(out)
+            except Exception as e:
+                self.log("_notify_output", "出力の通知に失敗しました: {}".format(e))
+
+    # 出力レイテンシ (秒)。再生していない時は 0
+    @property
+    def output_latency(self) -> float:
+        stream = self._stream
+        return stream.latency if stream is not None else 0.0
+
+    def is_active(self) -> bool:
+        return self._stream is not None
+
+    # 再生開始 (起動済みなら何もしない)
+    # ストリームは最初のデータが来てから開く (open してから書き込むまでの間に大きめのノイズがするため)
+    def start(self) -> None:
+        with self._lock:
+            if self._stream is not None:
+                return
+
+            self.log("start", "SPK: NumCh={}, Index={}, Rate={}".format(self.num_ch, self.device_index, self.rate))
+
+            self._stream = self.backend.open_output(self.num_ch, self.device_index, self.rate, self.frames_per_buffer, self.mix)
+
+    # 再生停止 (各音源の再生キューも破棄する)
+    def stop(self) -> None:
+        with self._lock:
+            if self._stream is not None:
+                self._stream.close()
+                self._stream = None
+            sources = self._sources
+        for source in sources:
+            source.flush()
+
+    # 各音源から frame_count フレームずつ取り出して加算する (出力バックエンドのスレッドから呼ばれる)
+    def mix(self, frame_count: int) -> bytes:
+        if frame_count > self._frames:
+            self._allocate(frame_count)
+        size = frame_count * self.bytes_per_frame
+        sources = self._sources
+
+        # 音量を下げるかどうか (duck_others の音源にデータがあれば、しばらく下げた状態を保つ)
+        if any(s.duck_others and s.queued_bytes > 0 for s in sources):
+            self._duck_remaining = int(self.rate * self.DUCK_HOLD_SECONDS)
+        else:
+            self._duck_remaining = max(0, self._duck_remaining - frame_count)
+        ducking = self._duck_remaining > 0
+        max_step = frame_count / (self.rate * self.DUCK_RAMP_SECONDS)
+
+        mix = self._mix[:frame_count]
+        mix[:] = 0
+        mixed = False
+        for source in sources:
+            target = source.duck_gain if (ducking and not source.duck_others) else 1.0
+            start_gain = source._gain
+            source._gain = start_gain + max(-max_step, min(max_step, target - start_gain))
+
+            n = source._read_into(self._scratch_bytes[:size])
+            if n == 0:
+                continue
+            frames = n // self.bytes_per_frame
+            scratch = self._scratch[:frames]
+            weighted = self._weighted[:frames]
+
+            if start_gain == source._gain == 1.0:
+                np.copyto(weighted, scratch)
+            else:
+                # ブロック内で倍率を直線的に変化させる
+                gains = self._gains[:frames]
+                np.multiply(self._ramp[:frames], np.float32(source._gain - start_gain), out=gains)
+                gains += np.float32(start_gain)
+                np.multiply(scratch, gains[:, None], out=weighted)
+            mix[:frames] += weighted
+            mixed = True
+
+        if not mixed:
+            return self._silence if size == len(self._silence) else bytes(size)
+
+        np.rint(mix, out=mix)
+        np.clip(mix, -32768, 32767, out=mix)
+        np.copyto(self._out[:frame_count], mix, casting="unsafe")
+        self._notify_output(self._out[:frame_count])
+        return bytes(self._out_bytes[:size])  # バックエンドには bytes で渡す (内部バッファは次の呼び出しで書き換わるため)
+
+
+# ==================================
+#       本クラスのテスト用処理
+# ==================================
+
+
+def module_test() -> None:
+    from clova.io.local.audio.null import NullAudioBackend
+
+    rate = 1000
+    mixer = AudioMixer(NullAudioBackend(), 1, 0, rate, 4)
+
+    # 書き込み後に呼び出し側のバッファを書き換えても影響せず、足りない分は無音になる
+    voice = mixer.open_source("voice", 0.01, duck_others=True)  # リングバッファ 10 フレーム
+    src = bytearray(np.array([1, 2, 3], dtype=np.int16).tobytes())
+    voice._enqueue(memoryview(src))
+    src[:] = b"\xff" * 6
+    voice._enqueue(memoryview(np.array([4, 5], dtype=np.int16).tobytes()))
+    out = [np.frombuffer(mixer.mix(4), dtype=np.int16).tolist() for _ in range(2)]
+    assert out == [[1, 2, 3, 4], [5, 0, 0, 0]], out
+    assert voice.queued_bytes == 0 and voice.drain(0)
+
+    # リングバッファの末尾で折り返す
+    voice._enqueue(memoryview(np.arange(6, 14, dtype=np.int16).tobytes()))
+    out = [np.frombuffer(mixer.mix(4), dtype=np.int16).tolist() for _ in range(2)]
+    assert out == [[6, 7, 8, 9], [10, 11, 12, 13]], out
+
+    # 音楽だけの間はそのまま、音声が重なると音楽の音量が下がり、両方が加算される
+    mixer = AudioMixer(NullAudioBackend(), 1, 0, rate, 50)
+    music = mixer.open_source("music", 1.0)
+    voice = mixer.open_source("voice", 1.0, duck_others=True)
+    music._enqueue(memoryview(np.full(1000, 10000, dtype=np.int16).tobytes()))
+    assert np.frombuffer(mixer.mix(50), dtype=np.int16).tolist() == [10000] * 50
+    voice._enqueue(memoryview(np.full(300, 1000, dtype=np.int16).tobytes()))
+    levels = [int(np.frombuffer(mixer.mix(50), dtype=np.int16)[-1]) for _ in range(18)]
+    print("ducking: {}".format(levels))
+    assert levels[0] < 10000 + 1000 and levels[5] == 2500 + 1000 and levels[6] == 2500
+    assert levels[-1] == 10000  # DUCK_HOLD_SECONDS 後に元に戻る
+
+    # 加算しても折り返さずに飽和する
+    voice._enqueue(memoryview(np.full(50, 30000, dtype=np.int16).tobytes()))
+    music._enqueue(memoryview(np.full(50, 30000, dtype=np.int16).tobytes()))
+    assert np.frombuffer(mixer.mix(50), dtype=np.int16).max() == 32767
+
+    # 加算後の出力 (全音源の合計) が通知される。無音の間は通知しない
+    mixer = AudioMixer(NullAudioBackend(), 1, 0, rate, 50)
+    music = mixer.open_source("music", 1.0)
+    earcon = mixer.open_source("earcon", 1.0)
+    outputs: List[List[int]] = []
+    mixer.bind_for_output(lambda out: outputs.append(out[:, 0].tolist()))
+    music._enqueue(memoryview(np.full(50, 100, dtype=np.int16).tobytes()))
+    earcon._enqueue(memoryview(np.full(50, 200, dtype=np.int16).tobytes()))
+    mixed = np.frombuffer(mixer.mix(50), dtype=np.int16).tolist()
+    mixer.mix(50)
+    assert outputs == [mixed] and mixed[-1] == 100 + 200, outputs
+    print("AudioMixer OK")
+
+
+# ==================================
+# 本モジュールを直接呼出した時の処理
+# ==================================
+if __name__ == "__main__":
+    module_test()
@@ -1,12 +1,85 @@
+import math
+import subprocess
+
+from typing import Optional, Tuple
+
+try:
+    import alsaaudio  # type: ignore[import]
+except ImportError:
+    alsaaudio = None
+
+from clova.config.config import ConfigMixer
 from clova.general.logger import BaseLogger
 from clova.general.queue import SpeechQueue
 
+# ==================================
+#     ALSA ミキサー音量制御クラス
+# ==================================
+
+
+class AlsaMixerVolume(BaseLogger):
+    # 音量倍率を ALSA ミキサー (ハードウェア / softvol) のコントロールに dB で設定する
+    #   - 最大の倍率 (max_gain) をコントロールの最大値に合わせ、それより小さい倍率は dB 差で下げる
+    #   - pyalsaaudio があればそれを使い、無ければ amixer コマンドを使う (amixer の場合は最大値を 0dB とみなす)
+    AMIXER_TIMEOUT = 2.0
+
+    # コンストラクタ
+    def __init__(self, control: str, card: int, max_gain: float) -> None:
+        super().__init__()
+
+        self.control = control
+        self.card = card
+        self.max_gain = max_gain
+        self._mixer = None
+        self._range_db: Tuple[float, float] = (-100.0, 0.0)
+
+        if alsaaudio is not None:
+            try:
+                self._mixer = alsaaudio.Mixer(control, cardindex=card)
+                low, high = self._mixer.getrange(units=alsaaudio.VOLUME_UNITS_DB)
+                self._range_db = (low / 100, high / 100)
+            except (alsaaudio.ALSAAudioError, TypeError) as e:
+                self.log("CTOR", "pyalsaaudio で {} を開けないため amixer を使います ({})".format(control, e))
+                self._mixer = None
+
+        self.log("CTOR", "ALSA Mixer: card={}, control={}, range={}～{}dB ({})".format(
+                 card, control, self._range_db[0], self._range_db[1], "pyalsaaudio" if self._mixer is not None else "amixer"))
+
+    # デストラクタ
+    def __del__(self) -> None:
+        super().__del__()
+
+    # 倍率に対応する dB 値 (コントロールの範囲内)
+    def gain_to_db(self, gain: float) -> float:
+        low, high = self._range_db
+        if gain <= 0:
+            return low
+        return max(low, min(high, high + 20 * math.log10(gain / self.max_gain)))
+
+    # 倍率を設定する。設定できなかった場合は False
+    def set_gain(self, gain: float) -> bool:
+        db = self.gain_to_db(gain)
+        try:
+            if self._mixer is not None:
+                self._mixer.setvolume(int(round(db * 100)), units=alsaaudio.VOLUME_UNITS_DB)
+            else:
+                subprocess.run(["amixer", "-q", "-c", str(self.card), "sset", self.control, "--", "{:.2f}dB".format(db)],
+                               check=True, timeout=self.AMIXER_TIMEOUT, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        except Exception as e:
+            self.log("set_gain", "ミキサーの設定エラー:{}".format(e))
+            return False
+
+        self.log("set_gain", "{} = {:.2f}dB".format(self.control, db))
+        return True
+
+
 # ==================================
 #       ボリューム制御クラス
 # ==================================
 
 
 class VolumeController(BaseLogger):
+    # vol_value: 再生時にサンプルに掛ける倍率 (ALSA ミキサーで音量を変えている場合は 1.0)
     vol_value = 1.0
     _vol_step = 7
     VOL_MIN_STEP = 0
@@ -16,13 +89,19 @@ class VolumeController(BaseLogger):
     VOL_TABLE = [0.001, 0.01, 0.1, 0.15, 0.2, 0.3, 0.5, 0.8, 1.0, 1.2, 1.5, 1.8, 2.0]
 
     # コンストラクタ
-    def __init__(self, global_speech_queue: SpeechQueue) -> None:
+    #   mixer_conf: 指定した場合は ALSA ミキサーのコントロールで音量を変える (設定できない場合はサンプルに倍率を掛ける)
+    def __init__(self, global_speech_queue: SpeechQueue, mixer_conf: Optional[ConfigMixer] = None) -> None:
         super().__init__()
 
         self._vol_step = 7
         self._cb_waiting = False
         self._global_speech_queue = global_speech_queue
 
+        self._mixer: Optional[AlsaMixerVolume] = None
+        if mixer_conf is not None:
+            self._mixer = AlsaMixerVolume(mixer_conf["control"], mixer_conf.get("card", 0), max(self.VOL_TABLE))
+            self._apply()
+
     # デストラクタ
     def __del__(self) -> None:
         super().__del__()
@@ -31,12 +110,20 @@ class VolumeController(BaseLogger):
         self._cb_waiting = False
         self._global_speech_queue.add("ボリュームを {} に設定しました。".format(str(self._vol_step)))
 
+    # 現在のステップの音量を反映する (ミキサーはすぐに反映され、再生キューに溜まっている分にも効く)
+    def _apply(self) -> None:
+        gain = self.VOL_TABLE[self._vol_step]
+        if self._mixer is not None and self._mixer.set_gain(gain):
+            self.vol_value = 1.0
+        else:
+            self.vol_value = gain
+
     # ボリューム [+] 押下時処理
     def vol_up_cb(self) -> None:
         if (self._vol_step < self.VOL_MAX_STEP):
             self._vol_step += 1
-            self.vol_value = self.VOL_TABLE[self._vol_step]
-            self.log("vol_up_cb", "Vol + [={}({})]".format(self._vol_step, self.vol_value))
+            self._apply()
+            self.log("vol_up_cb", "Vol + [={}({})]".format(self._vol_step, self.VOL_TABLE[self._vol_step]))
 
             if not self._cb_waiting:
                 self._cb_waiting = True
@@ -46,8 +133,8 @@ class VolumeController(BaseLogger):
     def vol_down_cb(self) -> None:
         if (self._vol_step > self.VOL_MIN_STEP):
             self._vol_step -= 1
-            self.vol_value = self.VOL_TABLE[self._vol_step]
-            self.log("vol_down_cb", "Vol - [={}({})]".format(self._vol_step, self.vol_value))
+            self._apply()
+            self.log("vol_down_cb", "Vol - [={}({})]".format(self._vol_step, self.VOL_TABLE[self._vol_step]))
             if not self._cb_waiting:
                 self._cb_waiting = True
                 self._global_speech_queue.add(self._speech_queue_cb)
@@ -59,8 +146,16 @@ class VolumeController(BaseLogger):
 
 
 def module_test() -> None:
-    # 現状何もしない
-    pass
+    mixer = AlsaMixerVolume("PCM", 0, max(VolumeController.VOL_TABLE))
+    mixer._range_db = (-102.4, 4.0)
+    print("VOL_TABLE -> dB: {}".format([round(mixer.gain_to_db(g), 1) for g in VolumeController.VOL_TABLE]))
+    assert mixer.gain_to_db(2.0) == 4.0 and abs(mixer.gain_to_db(1.0) - (4.0 - 6.02)) < 0.01
+    assert abs(mixer.gain_to_db(0.001) - (4.0 - 66.02)) < 0.01 and mixer.gain_to_db(0.0) == -102.4
+
+    # ミキサーを設定できない場合は、サンプルに倍率を掛ける
+    vol = VolumeController(SpeechQueue(), {"control": "NoSuchControl", "card": 99})
+    print("vol_value: {}".format(vol.vol_value))
+    assert vol.vol_value in (1.0, VolumeController.VOL_TABLE[7])
 
 
 # ==================================
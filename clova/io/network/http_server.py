@@ -15,9 +15,13 @@ from clova.general.logger import BaseLogger
 
 class HttpServer(BaseLogger):
     # コンストラクタ
-    def __init__(self, port: int, handler: Type[http.server.BaseHTTPRequestHandler]) -> None:
+    #   threaded: リクエストごとにスレッドで処理する (応答し続けるリクエストがあるハンドラ用)
+    def __init__(self, port: int, handler: Type[http.server.BaseHTTPRequestHandler], threaded: bool = False) -> None:
+        super().__init__()
+
         self._port = port
         self._handler = handler
+        self._threaded = threaded
         th.Thread(target=self.serve, args=(), name="HttpServerProcess", daemon=True).start()
 
     # デストラクタ
@@ -29,7 +33,12 @@ class HttpServer(BaseLogger):
     # HTTPサーバーのメイン処理：起動したあとは、MyHandler で待ち受けているだけ
     def serve(self) -> None:
         # 8080 番ポートで受け付ける
-        self.httpd = socketserver.TCPServer(("", self._port), self._handler)
+        if self._threaded:
+            server = socketserver.ThreadingTCPServer(("", self._port), self._handler)
+            server.daemon_threads = True
+            self.httpd: socketserver.TCPServer = server
+        else:
+            self.httpd = socketserver.TCPServer(("", self._port), self._handler)
         self.httpd.serve_forever()
         self.log("serve", "End server")
 
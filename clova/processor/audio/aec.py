@@ -0,0 +1,157 @@
+import threading
+import numpy as np
+import numpy.typing as npt
+
+# ==================================
+#        エコーキャンセラクラス
+# ==================================
+
+
+class EchoCanceller:
+    # 分割ブロック周波数領域 NLMS (PBFDAF) による音響エコーキャンセラ
+    #   block: 1 回の処理サンプル数、partitions: フィルタ長 = block * partitions
+    def __init__(self, block: int = 256, partitions: int = 8, step: float = 0.5, smoothing: float = 0.9) -> None:
+        self.block = block
+        self.partitions = partitions
+        self.step = step
+        self.smoothing = smoothing
+
+        bins = block + 1
+        self._weights = np.zeros((partitions, bins), dtype=np.complex64)
+        self._ref_spectra = np.zeros((partitions, bins), dtype=np.complex64)
+        self._ref_power = np.full(bins, 1e-6, dtype=np.float32)
+        self._prev_ref = np.zeros(block, dtype=np.float32)
+        self._ref_frame = np.zeros(block * 2, dtype=np.float32)
+        self._err_frame = np.zeros(block * 2, dtype=np.float32)
+
+    def reset(self) -> None:
+        self._weights[:] = 0
+        self._ref_spectra[:] = 0
+        self._ref_power[:] = 1e-6
+        self._prev_ref[:] = 0
+
+    # mic, ref: 長さ block の float32。エコー除去後の信号を返す
+    def process(self, mic: npt.NDArray[np.float32], ref: npt.NDArray[np.float32]) -> npt.NDArray[np.float32]:
+        b = self.block
+
+        # 参照信号の周波数表現 (overlap-save)
+        self._ref_frame[:b] = self._prev_ref
+        self._ref_frame[b:] = ref
+        self._prev_ref[:] = ref
+        self._ref_spectra = np.roll(self._ref_spectra, 1, axis=0)
+        self._ref_spectra[0] = np.fft.rfft(self._ref_frame)
+
+        # エコーの推定と除去
+        echo = np.fft.irfft((self._weights * self._ref_spectra).sum(axis=0))[b:]
+        err = (mic - echo).astype(np.float32)
+
+        # 正規化ステップで係数を更新 (勾配は線形畳み込み分に制約)
+        self._ref_power = self.smoothing * self._ref_power + (1 - self.smoothing) * np.abs(self._ref_spectra[0]) ** 2
+        self._err_frame[b:] = err
+        err_spectrum = np.fft.rfft(self._err_frame)
+        grad = np.conj(self._ref_spectra) * err_spectrum / (self._ref_power * self.partitions + 1e-6)
+        grad_time = np.fft.irfft(grad, axis=1)
+        grad_time[:, b:] = 0
+        self._weights += (self.step * np.fft.rfft(grad_time, axis=1)).astype(np.complex64)
+
+        return err
+
+
+# ==================================
+#     エコー参照信号バッファクラス
+# ==================================
+
+
+class EchoReference:
+    # 再生した音声を、マイク側のサンプル位置に合わせて保持する
+    def __init__(self, capacity: int) -> None:
+        self._capacity = capacity
+        self._buf = np.zeros(capacity, dtype=np.float32)
+        self._written_until = 0
+        self._lock = threading.Lock()
+
+    # pos (マイク側の絶対サンプル位置) から samples を書き込む
+    def write(self, pos: int, samples: npt.NDArray[np.float32]) -> None:
+        with self._lock:
+            if pos > self._written_until:
+                self._fill(self._written_until, np.zeros(min(pos - self._written_until, self._capacity), dtype=np.float32))
+            self._fill(pos, samples)
+            self._written_until = max(self._written_until, pos + len(samples))
+
+    def _fill(self, pos: int, samples: npt.NDArray[np.float32]) -> None:
+        samples = samples[-self._capacity:]
+        offset = pos % self._capacity
+        first = min(len(samples), self._capacity - offset)
+        self._buf[offset:offset + first] = samples[:first]
+        self._buf[:len(samples) - first] = samples[first:]
+
+    # pos から n サンプルを読み出す。書き込まれていない範囲は 0
+    def read(self, pos: int, n: int) -> npt.NDArray[np.float32]:
+        out = np.zeros(n, dtype=np.float32)
+        with self._lock:
+            lo = max(pos, self._written_until - self._capacity)
+            hi = min(pos + n, self._written_until)
+            if lo < hi:
+                out[lo - pos:hi - pos] = self._buf[np.arange(lo, hi) % self._capacity]
+        return out
+
+
+# ==================================
+#       線形補間リサンプラクラス
+# ==================================
+
+
+class LinearResampler:
+    # ブロック境界をまたいで連続するようにリサンプリングする (エコー参照信号用の簡易版)
+    def __init__(self, in_rate: int, out_rate: int) -> None:
+        self._ratio = in_rate / out_rate
+        self._phase = 0.0  # 次の出力サンプルの入力側位置 (前ブロック末尾サンプルを -1 とする)
+        self._last = np.float32(0.0)
+
+    def process(self, block: npt.NDArray[np.float32]) -> npt.NDArray[np.float32]:
+        src = np.concatenate(([self._last], block))
+        positions = np.arange(self._phase + 1, len(src) - 1, self._ratio)
+        out = np.asarray(np.interp(positions, np.arange(len(src)), src), dtype=np.float32)
+        self._phase = (positions[-1] + self._ratio - len(block)) - 1 if len(positions) else self._phase - len(block)
+        self._last = src[-1]
+        return out
+
+
+# ==================================
+#       本クラスのテスト用処理
+# ==================================
+
+
+def module_test() -> None:
+    rng = np.random.default_rng(0)
+    block = 256
+
+    # 遅延 + 減衰したエコー経路
+    ref = rng.normal(size=block * 400).astype(np.float32) * 0.1
+    delayed = [np.concatenate((np.zeros(d, dtype=np.float32), ref[:-d])) for d in (300, 700)]
+    echo = np.asarray(delayed[0] * 0.6 + delayed[1] * 0.2, dtype=np.float32)
+
+    aec = EchoCanceller(block)
+    residual = np.concatenate([aec.process(echo[i:i + block], ref[i:i + block]) for i in range(0, len(ref), block)])
+    erle = 10 * np.log10(np.mean(echo[-block * 50:] ** 2) / np.mean(residual[-block * 50:] ** 2))
+    print("ERLE: {:.1f}dB".format(erle))
+    assert erle > 20
+
+    refbuf = EchoReference(1000)
+    refbuf.write(900, np.arange(200, dtype=np.float32))
+    assert refbuf.read(1000, 100).tolist() == list(range(100, 200))
+    assert refbuf.read(1090, 20)[:10].tolist() == list(range(190, 200)) and not refbuf.read(1090, 20)[10:].any()
+
+    resampler = LinearResampler(44100, 16000)
+    t = np.arange(44100) / 44100
+    out = np.concatenate([resampler.process(np.sin(2 * np.pi * 440 * t[i:i + 256]).astype(np.float32)) for i in range(0, 44100, 256)])
+    expect = np.sin(2 * np.pi * 440 * np.arange(len(out)) / 16000)
+    print("resample: {} samples, max err {:.4f}".format(len(out), np.abs(out - expect).max()))
+    assert abs(len(out) - 16000) <= 1 and np.abs(out - expect).max() < 0.02
+
+
+# ==================================
+# 本モジュールを直接呼出した時の処理
+# ==================================
+if __name__ == "__main__":
+    module_test()
@@ -0,0 +1,234 @@
+import io
+import sys
+import time
+import wave
+import struct
+import numpy as np
+import numpy.typing as npt
+import ffmpeg  # type: ignore[import]
+
+from typing import Generator, Iterator, NamedTuple, Optional
+
+from clova.processor.audio.resample import PolyphaseResampler
+
+# ==================================
+#          WAV ヘッダ情報
+# ==================================
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+class WavFormatError(ValueError):
+    pass
+
+
+class WavInfo(NamedTuple):
+    format_tag: int  # WAVE_FORMAT_PCM / WAVE_FORMAT_IEEE_FLOAT (EXTENSIBLE はサブフォーマットに置き換え済み)
+    channels: int
+    sample_rate: int
+    sample_width: int  # バイト数
+    data_offset: int  # data チャンクの中身の開始位置
+    data_size: int  # data チャンクの中身のバイト数 (フレーム単位に切り捨て済み)
+
+
+# RIFF のチャンクを順にたどって fmt / data チャンクを探す
+# (LIST・fact などのチャンクが間に入っていてもよい。ストリーミング出力でサイズが未確定 (0 / 0xFFFFFFFF) の data は末尾までとみなす)
+def parse_wav(data: bytes) -> WavInfo:
+    if len(data) < 12 or data[0:4] != b"RIFF" or data[8:12] != b"WAVE":
+        raise WavFormatError("Not a RIFF/WAVE file")
+
+    fmt: Optional[bytes] = None
+    pos = 12
+    while pos + 8 <= len(data):
+        chunk_id = data[pos:pos + 4]
+        chunk_size, = struct.unpack_from("<I", data, pos + 4)
+        body = pos + 8
+
+        if chunk_id == b"fmt ":
+            fmt = data[body:body + chunk_size]
+        elif chunk_id == b"data":
+            if fmt is None:
+                raise WavFormatError("data chunk before fmt chunk")
+            if chunk_size in (0, 0xFFFFFFFF) or body + chunk_size > len(data):
+                chunk_size = len(data) - body
+            return _make_info(fmt, body, chunk_size)
+
+        pos = body + chunk_size + (chunk_size & 1)  # チャンクは 2 バイト境界に揃えられている
+
+    raise WavFormatError("data chunk not found")
+
+
+def _make_info(fmt: bytes, data_offset: int, data_size: int) -> WavInfo:
+    if len(fmt) < 16:
+        raise WavFormatError("fmt chunk too short")
+    format_tag, channels, sample_rate, _, block_align, bits = struct.unpack_from("<HHIIHH", fmt)
+
+    if format_tag == WAVE_FORMAT_EXTENSIBLE:
+        if len(fmt) < 40:
+            raise WavFormatError("WAVE_FORMAT_EXTENSIBLE fmt chunk too short")
+        format_tag, = struct.unpack_from("<H", fmt, 24)  # サブフォーマット GUID の先頭 2 バイト
+
+    sample_width = bits // 8
+    if channels == 0 or block_align != channels * sample_width:
+        raise WavFormatError("Invalid fmt chunk: channels={} bits={} block_align={}".format(channels, bits, block_align))
+
+    return WavInfo(format_tag, channels, sample_rate, sample_width, data_offset, data_size - data_size % block_align)
+
+
+# 非圧縮 (NumPy で変換できる) 形式か
+def is_linear_wav(info: WavInfo) -> bool:
+    if info.format_tag == WAVE_FORMAT_PCM:
+        return info.sample_width in (1, 2, 3, 4)
+    if info.format_tag == WAVE_FORMAT_IEEE_FLOAT:
+        return info.sample_width in (4, 8)
+    return False
+
+
+# ==================================
+#        WAV サンプル変換処理
+# ==================================
+
+
+# data チャンクを (フレーム, チャンネル) の float32 (S16 相当のスケール) に変換する
+def wav_frames(data: bytes, info: WavInfo) -> npt.NDArray[np.float32]:
+    raw = memoryview(data)[info.data_offset:info.data_offset + info.data_size]
+    width = info.sample_width
+
+    if info.format_tag == WAVE_FORMAT_IEEE_FLOAT:
+        samples = np.frombuffer(raw, dtype="<f4" if width == 4 else "<f8").astype(np.float32) * np.float32(32768.0)
+    elif width == 1:
+        samples = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128) * np.float32(256.0)  # 8bit は符号なし
+    elif width == 2:
+        samples = np.frombuffer(raw, dtype="<i2").astype(np.float32)
+    elif width == 3:
+        # 24bit は上位 2 バイトを符号付き、下位 1 バイトを小数部として読む
+        b = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3)
+        samples = b[:, 2].view(np.int8).astype(np.float32) * 256 + b[:, 1] + b[:, 0] / np.float32(256.0)
+    else:
+        samples = np.frombuffer(raw, dtype="<i4").astype(np.float32) / np.float32(65536.0)
+
+    return np.asarray(samples.reshape(-1, info.channels), dtype=np.float32)
+
+
+# チャンネル数を変換する (一致しない場合はモノラルにまとめてから複製する)
+def convert_channels(frames: npt.NDArray[np.float32], num_ch: int) -> npt.NDArray[np.float32]:
+    if frames.shape[1] == num_ch:
+        return frames
+    mono = frames if frames.shape[1] == 1 else frames.mean(axis=1, keepdims=True)
+    return np.asarray(np.repeat(mono, num_ch, axis=1), dtype=np.float32)
+
+
+# ==================================
+#          音声デコード処理
+# ==================================
+
+
+# 音声データを、指定のサンプリングレート・チャンネル数の (フレーム, チャンネル) float32 のブロックに順に変換する
+#   - 非圧縮の WAV はプロセス内で変換する (ffmpeg の起動・パイプの待ち時間とメモリが不要)
+#   - それ以外 (圧縮形式) は ffmpeg で変換する。変換に失敗した場合は ffmpeg.Error などの例外を送出する
+def decode_audio(audio: bytes, rate: int, num_ch: int, block_frames: int) -> Generator[npt.NDArray[np.float32], None, None]:
+    try:
+        info: Optional[WavInfo] = parse_wav(audio)
+    except WavFormatError:
+        info = None
+
+    if info is not None and is_linear_wav(info):
+        # チャンネル数の少ない側でリサンプリングする (モノラルの音声はリサンプリングしてから複製)
+        frames = wav_frames(audio, info)
+        if info.sample_rate == rate:
+            # 同じサンプリングレート (変換済みの音声のキャッシュなど) はリサンプリングしない
+            for i in range(0, len(frames), block_frames):
+                yield convert_channels(frames[i:i + block_frames], num_ch)
+            return
+        if info.channels > num_ch:
+            frames = convert_channels(frames, num_ch)
+        resampler = PolyphaseResampler(info.sample_rate, rate, frames.shape[1])
+
+        # 変換後のブロックの長さが block_frames 程度になるよう入力を区切る
+        in_block = max(1, block_frames * info.sample_rate // rate)
+        for i in range(0, len(frames), in_block):
+            yield convert_channels(resampler.process(frames[i:i + in_block]), num_ch)
+        yield convert_channels(resampler.flush(), num_ch)
+    else:
+        yield from decode_with_ffmpeg(audio, rate, num_ch, block_frames)
+
+
+def decode_with_ffmpeg(audio: bytes, rate: int, num_ch: int, block_frames: int) -> Iterator[npt.NDArray[np.float32]]:
+    input_stream = ffmpeg.input("pipe:")
+    output_stream = ffmpeg.output(input_stream.audio, "pipe:", format="s16le", ar=rate, ac=num_ch, loglevel="error")
+    pcm, _ = output_stream.run(input=audio, capture_stdout=True, capture_stderr=True)
+    frames = np.frombuffer(pcm, dtype=np.int16).astype(np.float32).reshape(-1, num_ch)
+    for i in range(0, len(frames), block_frames):
+        yield frames[i:i + block_frames]
+
+
+# ==================================
+#       本モジュールのテスト用処理
+# ==================================
+
+
+def module_test() -> None:
+    rate = 16000
+    t = np.arange(rate) / rate
+    tone = (np.sin(2 * np.pi * 440 * t) * 16000).astype(np.int16)
+
+    # wave モジュールで書いた WAV に、LIST チャンクを fmt と data の間に挟む
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(tone.tobytes())
+    plain = buf.getvalue()
+    listed = plain[:36] + b"LIST" + struct.pack("<I", 5) + b"INFO\x00\x00" + plain[36:]
+    listed = listed[:4] + struct.pack("<I", len(listed) - 8) + listed[8:]
+
+    for data in (plain, listed):
+        info = parse_wav(data)
+        assert (info.channels, info.sample_rate, info.sample_width, info.data_size) == (1, rate, 2, rate * 2), info
+        assert np.array_equal(wav_frames(data, info)[:, 0], tone.astype(np.float32))
+
+    # サイズ未確定の data チャンク (ストリーミング出力)
+    streaming = plain[:40] + struct.pack("<I", 0xFFFFFFFF) + plain[44:]
+    assert parse_wav(streaming).data_size == rate * 2
+
+    # 24bit・float の WAV も同じ値になる
+    i24 = (tone.astype(np.int32) << 8).astype("<i4").view(np.uint8).reshape(-1, 4)[:, :3].tobytes()
+    f32 = (tone / 32768.0).astype("<f4").tobytes()
+    for tag, width, body in ((WAVE_FORMAT_PCM, 3, i24), (WAVE_FORMAT_IEEE_FLOAT, 4, f32)):
+        fmt = struct.pack("<HHIIHH", tag, 1, rate, rate * width, width, width * 8)
+        data = b"RIFF" + struct.pack("<I", 4 + 8 + 16 + 8 + len(body)) + b"WAVE" + b"fmt " + struct.pack("<I", 16) + fmt + b"data" + struct.pack("<I", len(body)) + body
+        assert np.allclose(wav_frames(data, parse_wav(data))[:, 0], tone, atol=0.01)
+
+    try:
+        parse_wav(b"ID3\x04" + bytes(100))
+        assert False
+    except WavFormatError:
+        pass
+
+    # 16kHz モノラル -> 44.1kHz ステレオの処理時間 (プロセス内 / ffmpeg)
+    started = time.perf_counter()
+    out = np.concatenate(list(decode_audio(plain, 44100, 2, 1024)))
+    print("in-process {} frames {:6.1f}ms".format(len(out), (time.perf_counter() - started) * 1000))
+    assert out.shape == (44100, 2)
+
+    try:
+        started = time.perf_counter()
+        ref = np.concatenate(list(decode_with_ffmpeg(plain, 44100, 2, 1024)))
+        print("ffmpeg     {} frames {:6.1f}ms".format(len(ref), (time.perf_counter() - started) * 1000))
+    except FileNotFoundError:
+        print("ffmpeg not found")
+
+    if len(sys.argv) >= 2:
+        with open(sys.argv[1], "rb") as f:
+            data = f.read()
+        print(parse_wav(data))
+
+
+# ==================================
+# 本モジュールを直接呼出した時の処理
+# ==================================
+if __name__ == "__main__":
+    module_test()
@@ -0,0 +1,151 @@
+import io
+import sys
+import time
+import numpy as np
+import numpy.typing as npt
+
+from typing import IO, Any, Optional
+
+# ==================================
+#        再生ゲイン処理クラス
+# ==================================
+
+
+class GainStage:
+    # 再生する PCM に音量倍率を掛けて S16 に戻す (倍率 -> ソフトリミッタ (任意) -> 飽和)
+    #   - 作業バッファはコンストラクタで確保し、ブロックごとに配列を作らない (すべて out= 指定の演算)
+    #   - 倍率が 1.0 を超えても int16 で折り返さず、最大値で飽和する
+    #   - process() の戻り値は内部バッファのビューのため、次の呼び出しまでに使い終える (AudioPlayer.write() はコピーする)
+    #   limiter_threshold: ソフトリミッタが効き始めるレベル (フルスケールに対する割合)。None で無効
+    FULL_SCALE = 32767.0
+
+    # コンストラクタ
+    def __init__(self, block_frames: int, num_ch: int, limiter_threshold: Optional[float] = None) -> None:
+        self.block_frames = block_frames
+        self.num_ch = num_ch
+        self.block_bytes = block_frames * num_ch * 2
+        self.limiter_threshold = limiter_threshold
+
+        size = block_frames * num_ch
+        self._in = np.zeros(size, dtype=np.int16)
+        self._in_bytes = self._in.data.cast("B")
+        self._work = np.zeros(size, dtype=np.float32)
+        self._excess = np.zeros(size, dtype=np.float32)
+        self._shaped = np.zeros(size, dtype=np.float32)
+        self._out = np.zeros(size, dtype=np.int16)
+        self._out_bytes = self._out.data.cast("B")
+
+    # readinto() 用の入力バッファ (S16_LE、block_bytes バイト)
+    @property
+    def input_view(self) -> memoryview:
+        return self._in_bytes
+
+    # input_view に読み込んだ先頭 nbytes を処理する
+    def process_input(self, nbytes: int, gain: float) -> memoryview:
+        return self.process(self._in[:nbytes // 2], gain)
+
+    # samples (int16 / float32 の S16 相当スケール、最大 block_frames * num_ch 要素) を処理し、S16_LE のビューを返す
+    def process(self, samples: npt.NDArray[Any], gain: float) -> memoryview:
+        # 倍率 1.0 の int16 はそのまま (ALSA ミキサーで音量を変えている場合。飽和しないためリミッタも不要)
+        if gain == 1.0 and samples.dtype == np.int16:
+            return np.ascontiguousarray(samples).reshape(-1).data.cast("B")
+
+        n = samples.size
+        work = self._work[:n]
+        np.multiply(samples.reshape(-1), np.float32(gain), out=work)
+
+        if self.limiter_threshold is not None:
+            self._soft_limit(work, self._excess[:n], self._shaped[:n])
+
+        np.rint(work, out=work)
+        np.clip(work, -32768, 32767, out=work)
+        np.copyto(self._out[:n], work, casting="unsafe")
+        return self._out_bytes[:n * 2]
+
+    # しきい値を超えた分を tanh で滑らかに圧縮する (フルスケールに漸近し、クリップによる歪みを抑える)
+    #   y = sign(x) * (T + (F - T) * tanh((|x| - T) / (F - T)))  (|x| > T)
+    def _soft_limit(self, work: npt.NDArray[np.float32], excess: npt.NDArray[np.float32], shaped: npt.NDArray[np.float32]) -> None:
+        assert self.limiter_threshold is not None
+        threshold = np.float32(self.FULL_SCALE * self.limiter_threshold)
+        headroom = np.float32(self.FULL_SCALE) - threshold
+
+        np.abs(work, out=excess)
+        excess -= threshold
+        np.maximum(excess, 0, out=excess)
+        excess /= headroom  # しきい値を超えた量 (headroom 単位)
+        np.tanh(excess, out=shaped)
+        excess -= shaped
+        excess *= headroom  # 減らす量
+        np.copysign(excess, work, out=excess)
+        work -= excess
+
+
+# ストリームから view が一杯になるか終端まで読み込み、読み込んだバイト数を返す
+# (パイプは 1 回の読み込みで要求より少なく返ることがある)
+def readinto_full(stream: IO[bytes], view: memoryview) -> int:
+    filled = 0
+    while filled < len(view):
+        n = stream.readinto(view[filled:])  # type: ignore[attr-defined]
+        if not n:
+            break
+        filled += n
+    return filled
+
+
+# ==================================
+#       本クラスのテスト用処理
+# ==================================
+
+
+def module_test() -> None:
+    # 倍率 1.0 超でも折り返さずに飽和する
+    stage = GainStage(4, 1)
+    out = np.frombuffer(stage.process(np.array([30000, -30000, 1000, -1], dtype=np.int16), 2.0), dtype=np.int16)
+    assert out.tolist() == [32767, -32768, 2000, -2], out
+    old = (np.array([30000], dtype=np.int16) * 2.0).astype(np.int16)
+    print("gain 2.0: 30000 -> {} (saturated), was {} (wrapped)".format(out[0], old[0]))
+
+    # ソフトリミッタ: しきい値以下はそのまま、超えた分は単調に圧縮されフルスケールを超えない
+    limited = GainStage(5, 1, 0.5)
+    x = np.array([10000, 16383, 20000, 40000, -80000], dtype=np.float32)
+    y = np.frombuffer(limited.process(x, 1.0), dtype=np.int16)
+    print("limiter: {} -> {}".format(x.astype(int).tolist(), y.tolist()))
+    assert y[0] == 10000 and y[1] == 16383 and 16383 < y[2] < 20000 < y[3] <= 32767 and y[4] >= -32768
+
+    # readinto() と組み合わせた処理
+    src = io.BytesIO(np.arange(10, dtype=np.int16).tobytes())
+    stage = GainStage(4, 1)
+    chunks = []
+    while True:
+        n = readinto_full(src, stage.input_view)
+        if n == 0:
+            break
+        chunks.append(bytes(stage.process_input(n, 3.0)))
+    assert np.frombuffer(b"".join(chunks), dtype=np.int16).tolist() == [v * 3 for v in range(10)]
+
+    # 処理時間 (44.1kHz ステレオ 10 秒あたり)
+    rate, num_ch = 44100, 2
+    seconds = float(sys.argv[1]) if len(sys.argv) >= 2 else 10.0
+    pcm = (np.sin(np.arange(int(rate * seconds) * num_ch) * 0.01) * 20000).astype(np.int16).tobytes()
+
+    def bench(label: str, block_bytes: int, fn: Any) -> None:
+        started = time.process_time()
+        for i in range(0, len(pcm), block_bytes):
+            fn(memoryview(pcm)[i:i + block_bytes])
+        print("{:32s} {:6.2f}ms CPU per second of audio".format(label, (time.process_time() - started) * 1000 / seconds))
+
+    stage = GainStage(1024, num_ch)
+    bench("GainStage 1024 frames (gain 1.0)", stage.block_bytes, lambda data: stage.process(np.frombuffer(data, dtype=np.int16), 1.0))
+    bench("old (512B, frombuffer*vol)", 512, lambda data: (np.frombuffer(data, dtype=np.int16) * 0.25 * 1.5).astype(np.int16).tobytes())
+    for block_frames in (128, 1024, 4096):
+        for threshold in (None, 0.8):
+            stage = GainStage(block_frames, num_ch, threshold)
+            bench("GainStage {} frames{}".format(block_frames, " +limiter" if threshold else ""), stage.block_bytes,
+                  lambda data: stage.process(np.frombuffer(data, dtype=np.int16), 1.5))
+
+
+# ==================================
+# 本モジュールを直接呼出した時の処理
+# ==================================
+if __name__ == "__main__":
+    module_test()
@@ -0,0 +1,161 @@
+import sys
+import time
+import threading
+import subprocess
+import numpy as np
+import ffmpeg  # type: ignore[import]
+
+from typing import Callable, Dict, List, Optional, Tuple
+
+# ==================================
+#     音声認識アップロード用エンコーダ
+# ==================================
+
+# 音声認識 API の encoding 名と ffmpeg の出力設定の対応
+#   LINEAR16: 無変換 (32KB/s @16kHz)
+#   FLAC: 可逆圧縮 (認識精度は変わらず、音声で 60～70% 程度)
+#   OGG_OPUS: 非可逆圧縮 (音声向け設定で 1/10 以下)
+# 圧縮する場合は発話ごとに ffmpeg を起動するので、既定は LINEAR16 (アップロードが遅い回線でだけ圧縮する)
+ENCODER_OUTPUT_ARGS: Dict[str, Dict[str, str]] = {
+    "FLAC": {"format": "flac", "compression_level": "5"},
+    "OGG_OPUS": {"format": "ogg", "acodec": "libopus", "audio_bitrate": "24k", "application": "voip"},
+}
+
+# ストリーミング認識で逐次圧縮できる形式 (Ogg のページを短くして、録音中に少しずつ出力させる)
+STREAM_ENCODER_OUTPUT_ARGS: Dict[str, Dict[str, str]] = {
+    "OGG_OPUS": dict(ENCODER_OUTPUT_ARGS["OGG_OPUS"], page_duration="100000", flush_packets="1"),
+}
+
+ENCODING_LINEAR16 = "LINEAR16"
+ENCODINGS: Tuple[str, ...] = (ENCODING_LINEAR16, ) + tuple(ENCODER_OUTPUT_ARGS.keys())
+STREAM_ENCODINGS: Tuple[str, ...] = (ENCODING_LINEAR16, ) + tuple(STREAM_ENCODER_OUTPUT_ARGS.keys())
+
+
+# S16_LE PCM を指定の形式に変換する。変換に失敗した場合は ffmpeg.Error などの例外を送出する
+def encode_pcm(audio: bytes, encoding: str, rate: int, num_ch: int = 1) -> bytes:
+    if encoding == ENCODING_LINEAR16:
+        return audio
+
+    if encoding not in ENCODER_OUTPUT_ARGS:
+        raise ValueError("Unsupported encoding: {}".format(encoding))
+
+    input_stream = ffmpeg.input("pipe:", format="s16le", ar=rate, ac=num_ch)
+    output_stream = ffmpeg.output(input_stream.audio, "pipe:", loglevel="error", **ENCODER_OUTPUT_ARGS[encoding])
+    encoded, _ = output_stream.run(input=audio, capture_stdout=True, capture_stderr=True)
+    return encoded  # type: ignore[no-any-return]
+
+
+# ==================================
+#   ストリーミング認識用の逐次エンコーダ
+# ==================================
+
+
+class StreamEncoder:
+    # 録音中の S16_LE PCM を逐次圧縮し、出力ができた分から on_data に渡す
+    #   - ffmpeg は認識 1 回につき 1 つ起動し、録音と並行して変換する (起動・変換の時間は発話中に隠れる)
+    #   - on_data は出力を読み出すスレッドから呼ばれる
+
+    READ_SIZE = 4096
+
+    # コンストラクタ
+    def __init__(self, encoding: str, rate: int, on_data: Callable[[bytes], None], num_ch: int = 1) -> None:
+        if encoding not in STREAM_ENCODER_OUTPUT_ARGS:
+            raise ValueError("Unsupported streaming encoding: {}".format(encoding))
+
+        self.on_data = on_data
+        self.error: Optional[Exception] = None
+
+        input_stream = ffmpeg.input("pipe:", format="s16le", ar=rate, ac=num_ch)
+        output_stream = ffmpeg.output(input_stream.audio, "pipe:", loglevel="error", **STREAM_ENCODER_OUTPUT_ARGS[encoding])
+        self._process: subprocess.Popen = output_stream.run_async(pipe_stdin=True, pipe_stdout=True)  # type: ignore[type-arg]
+        self._reader = threading.Thread(target=self._read, daemon=True)
+        self._reader.start()
+
+    def _read(self) -> None:
+        assert self._process.stdout is not None
+        while True:
+            data = self._process.stdout.read1(self.READ_SIZE)  # type: ignore[attr-defined]
+            if not data:
+                return
+            self.on_data(data)
+
+    # PCM を追加する。ffmpeg が終了していた場合は、finish() で例外を送出する
+    def write(self, pcm: bytes) -> None:
+        if self.error is not None:
+            return
+        assert self._process.stdin is not None
+        try:
+            self._process.stdin.write(pcm)
+            self._process.stdin.flush()
+        except OSError as e:
+            self.error = e
+
+    # 入力を閉じ、残りの出力をすべて渡し終わるまで待つ。変換に失敗した場合は例外を送出する
+    def finish(self, timeout: Optional[float] = None) -> None:
+        assert self._process.stdin is not None
+        try:
+            self._process.stdin.close()
+        except OSError as e:
+            self.error = self.error or e
+        self._reader.join(timeout)
+        if self._reader.is_alive():
+            self.cancel()
+            raise TimeoutError("ffmpeg did not finish in time")
+        if self._process.wait() != 0:
+            self.error = self.error or RuntimeError("ffmpeg exited with {}".format(self._process.returncode))
+        if self.error is not None:
+            raise self.error
+
+    # 変換を打ち切る
+    def cancel(self) -> None:
+        if self._process.poll() is None:
+            self._process.kill()
+
+
+# ==================================
+#       本モジュールのテスト用処理
+# ==================================
+
+
+def module_test() -> None:
+    # 話し声を模した 5 秒の信号 (基本周波数が揺らぐ倍音 + 音節ごとの振幅変化 + 雑音)
+    rate = 16000
+    t = np.arange(rate * 5) / rate
+    f0 = 140 + 30 * np.sin(2 * np.pi * 0.7 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / rate
+    voice = sum(np.sin(k * phase) / k for k in range(1, 12)) * np.clip(np.sin(2 * np.pi * 4 * t), 0, None)
+    noise = np.random.default_rng(0).normal(size=len(t)) * 0.003
+    audio = (np.clip(voice * 0.2 + noise, -1, 1) * 32767).astype(np.int16).tobytes()
+
+    # 想定アップロード速度 (Pi Zero の弱い Wi-Fi 程度)
+    uplink = float(sys.argv[1]) * 1000 / 8 if len(sys.argv) >= 2 else 256 * 1000 / 8
+
+    for encoding in ENCODINGS:
+        started = time.perf_counter()
+        encoded = encode_pcm(audio, encoding, rate)
+        elapsed = time.perf_counter() - started
+        print("{:9s} {:7d} bytes ({:5.1%})  encode {:5.1f}ms  upload {:6.1f}ms".format(
+            encoding, len(encoded), len(encoded) / len(audio), elapsed * 1000, len(encoded) / uplink * 1000))
+
+    # 逐次圧縮: 録音と同じ間隔 (100ms) で書き込み、録音中から出力が届くこと
+    chunk = rate // 10 * 2
+    received: List[Tuple[float, int]] = []
+    started = time.perf_counter()
+    encoder = StreamEncoder("OGG_OPUS", rate, lambda data: received.append((time.perf_counter() - started, len(data))))
+    for i in range(0, len(audio), chunk):
+        encoder.write(audio[i:i + chunk])
+        time.sleep(0.1)
+    recorded = time.perf_counter() - started
+    encoder.finish(5.0)
+    total = sum(n for _, n in received)
+    during = sum(n for t, n in received if t < recorded)
+    print("OGG_OPUS (stream) {:7d} bytes ({:5.1%})  録音中に出力 {:5.1%}  録音終了後 {:5.1f}ms".format(
+        total, total / len(audio), during / total, (received[-1][0] - recorded) * 1000))
+    assert total < len(audio) / 5 and during > total / 2
+
+
+# ==================================
+# 本モジュールを直接呼出した時の処理
+# ==================================
+if __name__ == "__main__":
+    module_test()
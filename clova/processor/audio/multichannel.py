@@ -0,0 +1,168 @@
+import numpy as np
+import numpy.typing as npt
+
+from typing import Dict, List, Union
+
+from clova.general.logger import BaseLogger
+
+# ==================================
+#     マルチチャンネル マイク処理クラス
+# ==================================
+
+
+class MultiChannelFrontEnd(BaseLogger):
+    # 複数チャンネルのマイク入力 (S16_LE インタリーブ) を、音声認識用のモノラルにまとめる
+    #   BestChannel: 発話ごとに SN 比が最も高いチャンネルを選ぶ
+    #   DelayAndSum: SN 比が最も高いチャンネルを基準に、各チャンネルの到達時間差を GCC-PHAT で求め、揃えて加算する
+    MODES = ("BestChannel", "DelayAndSum")
+    SNR_FRAME_DURATION = 20  # SN 比推定のフレーム長 (ms)
+    SNR_NOISE_PERCENTILE = 10  # このパーセンタイルのフレームエネルギーを雑音とみなす
+    SNR_SPEECH_PERCENTILE = 90  # このパーセンタイルのフレームエネルギーを音声とみなす
+    MIN_RELATIVE_SNR_DB = -6.0  # 最良チャンネルよりこれ以上 SN 比が低いチャンネルは加算しない (無効チャンネル・再生音ループバック対策)
+    MAX_DELAY_MS = 1.0  # 想定するチャンネル間の最大到達時間差 (マイク間隔 34cm 相当)
+
+    # コンストラクタ
+    def __init__(self, rate: int, num_ch: int, mode: str = "DelayAndSum") -> None:
+        super().__init__()
+
+        if mode not in self.MODES:
+            raise ValueError("Unknown channel mode: {}".format(mode))
+
+        self.rate = rate
+        self.num_ch = num_ch
+        self.mode = mode
+        self.max_delay = max(1, int(rate * self.MAX_DELAY_MS / 1000))
+
+        # 推定結果 (estimate() で更新)
+        self.snr_db = np.zeros(num_ch, dtype=np.float32)
+        self.best_channel = 0
+        self.channels: List[int] = list(range(num_ch))  # 加算するチャンネル
+        self.lags: Dict[int, int] = {ch: 0 for ch in range(num_ch)}  # 基準チャンネルに対する各チャンネルの遅れ (サンプル)
+
+        self._history = np.zeros((num_ch, self.max_delay * 2), dtype=np.float32)
+
+    # デストラクタ
+    def __del__(self) -> None:
+        super().__del__()
+
+    # インタリーブされた PCM を (チャンネル, サンプル) の float32 に分ける
+    def deinterleave(self, pcm: Union[bytes, bytearray, memoryview]) -> npt.NDArray[np.float32]:
+        samples = np.frombuffer(pcm, dtype=np.int16)
+        samples = samples[:len(samples) // self.num_ch * self.num_ch]
+        return np.asarray(samples.reshape(-1, self.num_ch).T, dtype=np.float32)
+
+    # チャンネルごとの SN 比 (dB)
+    def channel_snr(self, frames: npt.NDArray[np.float32]) -> npt.NDArray[np.float32]:
+        frame_len = int(self.rate * self.SNR_FRAME_DURATION / 1000)
+        num_frames = frames.shape[1] // frame_len
+        if num_frames < 2:
+            return np.zeros(self.num_ch, dtype=np.float32)
+
+        blocks = frames[:, :num_frames * frame_len].reshape(self.num_ch, num_frames, frame_len)
+        energy = np.mean(blocks * blocks, axis=2) + 1e-3
+        noise = np.percentile(energy, self.SNR_NOISE_PERCENTILE, axis=1)
+        speech = np.percentile(energy, self.SNR_SPEECH_PERCENTILE, axis=1)
+        return np.asarray(10.0 * np.log10(speech / noise), dtype=np.float32)
+
+    # 基準チャンネルに対する各チャンネルの遅れを GCC-PHAT で推定する (全チャンネル一括)
+    def channel_lags(self, frames: npt.NDArray[np.float32], ref: int) -> npt.NDArray[np.int64]:
+        n = frames.shape[1]
+        nfft = 1 << int(np.ceil(np.log2(n * 2)))
+        spectra = np.fft.rfft(frames, nfft, axis=1)
+        cross = spectra * np.conj(spectra[ref])
+        cc = np.fft.irfft(cross / (np.abs(cross) + 1e-9), nfft, axis=1)
+
+        d = self.max_delay
+        window = np.concatenate((cc[:, -d:], cc[:, :d + 1]), axis=1)  # 遅れ -d ～ +d
+        return np.asarray(np.argmax(window, axis=1) - d, dtype=np.int64)
+
+    # 発話の音声からチャンネル選択・到達時間差を推定し、以降の apply() に使う
+    def estimate(self, pcm: Union[bytes, bytearray, memoryview]) -> None:
+        frames = self.deinterleave(pcm)
+        if frames.shape[1] == 0:
+            return
+
+        self.snr_db = self.channel_snr(frames)
+        self.best_channel = int(np.argmax(self.snr_db))
+
+        if self.mode == "BestChannel":
+            self.channels = [self.best_channel]
+            self.lags = {self.best_channel: 0}
+        else:
+            self.channels = [ch for ch in range(self.num_ch) if self.snr_db[ch] - self.snr_db[self.best_channel] >= self.MIN_RELATIVE_SNR_DB]
+            lags = self.channel_lags(frames, self.best_channel)
+            self.lags = {ch: int(lags[ch]) for ch in self.channels}
+
+        self._history[:] = 0
+        self.log("estimate", "SNR={} -> {} lags={}".format(np.round(self.snr_db.astype(np.float64), 1).tolist(), self.mode, self.lags))
+
+    # estimate() の結果でモノラルにまとめる。チャンク単位で続けて呼んでも境界で途切れないよう直前のサンプルを保持する
+    # (DelayAndSum の場合、出力は max_delay サンプル遅れる)
+    def apply(self, pcm: Union[bytes, bytearray, memoryview]) -> bytes:
+        frames = self.deinterleave(pcm)
+        n = frames.shape[1]
+        d = self.max_delay
+
+        ext = np.concatenate((self._history, frames), axis=1)
+        self._history = ext[:, -d * 2:]
+
+        # ch の遅れが lag の場合、出力位置 t には ch の t + lag のサンプルを使う
+        mixed = np.zeros(n, dtype=np.float32)
+        for ch in self.channels:
+            start = d + self.lags[ch]
+            mixed += ext[ch, start:start + n]
+        mixed /= len(self.channels)
+
+        return np.clip(mixed, -32768, 32767).astype(np.int16).tobytes()
+
+    # 発話全体から推定してモノラルにまとめる
+    def process(self, pcm: Union[bytes, bytearray, memoryview]) -> bytes:
+        self.estimate(pcm)
+        return self.apply(pcm)
+
+
+# ==================================
+#       本クラスのテスト用処理
+# ==================================
+
+
+def module_test() -> None:
+    rate = 16000
+    rng = np.random.default_rng(0)
+    n = rate * 2
+
+    # 4ch: ch2 が最も近く、他は 3～5 サンプル遅れ、ch3 は雑音のみ (無効チャンネル)
+    speech = rng.normal(size=n + 16) * 3000 * (np.arange(n + 16) > rate // 2)
+    delays = [3, 5, 0]
+    chans = [speech[8 - delay:8 - delay + n] * gain + rng.normal(size=n) * noise for delay, gain, noise in zip(delays, [0.8, 0.7, 1.0], [800, 800, 600])]
+    chans.append(rng.normal(size=n) * 800)
+    pcm = np.stack(chans, axis=1).astype(np.int16).tobytes()
+
+    fe = MultiChannelFrontEnd(rate, 4, "BestChannel")
+    fe.process(pcm)
+    print("BestChannel: SNR={} -> ch{}".format(np.round(fe.snr_db.astype(np.float64), 1).tolist(), fe.best_channel))
+    assert fe.best_channel == 2
+
+    fe = MultiChannelFrontEnd(rate, 4, "DelayAndSum")
+    mono = np.frombuffer(fe.process(pcm), dtype=np.int16).astype(np.float32)
+    print("DelayAndSum: channels={} lags={}".format(fe.channels, fe.lags))
+    assert fe.channels == [0, 1, 2] and fe.lags == {0: 3, 1: 5, 2: 0}
+
+    # 出力は max_delay サンプル遅れる
+    clean = speech[8:8 + n][:len(mono) - fe.max_delay]
+    residual = mono[fe.max_delay:] - clean * np.mean([0.8, 0.7, 1.0])
+    snr = 10 * np.log10(np.mean(clean[rate:] ** 2) / np.mean(residual[rate:] ** 2))
+    print("DelayAndSum output SNR: {:.1f}dB".format(snr))
+
+    # チャンク単位で処理しても一括処理と同じ結果になる
+    fe.estimate(pcm)
+    chunked = b"".join(fe.apply(pcm[i:i + 3200 * 4]) for i in range(0, len(pcm), 3200 * 4))
+    fe.estimate(pcm)
+    assert chunked == fe.apply(pcm)
+
+
+# ==================================
+# 本モジュールを直接呼出した時の処理
+# ==================================
+if __name__ == "__main__":
+    module_test()
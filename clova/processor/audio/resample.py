@@ -0,0 +1,136 @@
+import sys
+import time
+import numpy as np
+import numpy.typing as npt
+
+from math import gcd
+
+# ==================================
+#     ポリフェーズ リサンプラクラス
+# ==================================
+
+
+class PolyphaseResampler:
+    # 有理数比 (L/M) のポリフェーズ FIR フィルタによるリサンプリング
+    #   - 入力を L 倍に補間してから 1/M に間引く処理を、0 を挿入せずに必要な位相の係数だけで計算する
+    #   - 入力 M サンプルから出力 L サンプルを作る処理は毎回同じ係数になるため、(L, 幅) の行列 1 つにまとめ、
+    #     入力をずらして並べたビュー (コピー無し) との行列積 1 回で計算する
+    #   - ブロック単位で続けて呼んでも境界で途切れない。最後に flush() で残りを出力する
+    #   - 入出力は (サンプル, チャンネル) の float32
+    #   taps: 位相あたりのタップ数 (大きいほど折り返し雑音が少ないが重い)
+    KAISER_BETA = 8.0
+    CUTOFF = 0.9  # 阻止域の手前で減衰させるため、ナイキスト周波数に対する通過域の割合
+
+    # コンストラクタ
+    def __init__(self, in_rate: int, out_rate: int, num_ch: int = 1, taps: int = 16) -> None:
+        g = gcd(in_rate, out_rate)
+        self.in_rate = in_rate
+        self.out_rate = out_rate
+        self.num_ch = num_ch
+        self.up = out_rate // g
+        self.down = in_rate // g
+        self.taps = taps
+
+        # 補間後のサンプリングレートで設計したローパスフィルタ
+        length = self.up * taps
+        n = np.arange(length) - (length - 1) / 2
+        cutoff = self.CUTOFF / max(self.up, self.down) / 2
+        h = 2 * cutoff * np.sinc(2 * cutoff * n) * np.kaiser(length, self.KAISER_BETA) * self.up
+
+        # 1 周期 (入力 M サンプル) 分の出力 r は、補間後の位置 t_r = delay + r * M に対応する
+        # (フィルタの遅れ分だけ進めて、入力と時刻を合わせる)
+        # 出力 r = sum_j h[t_r % L + j * L] * x[t_r // L - j] を、入力 x[first - taps + 1 + c] に対する行列にする
+        t = (length - 1) // 2 + np.arange(self.up) * self.down
+        pos = t // self.up
+        self._first = int(pos[0])
+        self._width = int(pos[-1] - pos[0]) + taps
+        self._matrix = np.zeros((self.up, self._width), dtype=np.float32)
+        j = np.arange(taps)[None, :]
+        rows = np.arange(self.up)[:, None]
+        self._matrix[rows, (pos - self._first + taps - 1)[:, None] - j] = h[(t % self.up)[:, None] + j * self.up]
+
+        self.reset()
+
+    # 状態をリセットする
+    def reset(self) -> None:
+        # 未処理の入力 (先頭に直前の taps - 1 サンプルを含む)
+        self._pending = np.zeros((self.taps - 1, self.num_ch), dtype=np.float32)
+        self._in_count = 0
+        self._out_count = 0
+
+    # 入力 block に対応する出力を返す (フィルタの遅れと周期の端数の分、末尾の出力は次のブロックか flush() で出る)
+    def process(self, block: npt.NDArray[np.float32]) -> npt.NDArray[np.float32]:
+        block = block.reshape(len(block), self.num_ch)
+        self._in_count += len(block)
+
+        if self.up == self.down:
+            self._out_count += len(block)
+            return np.asarray(block, dtype=np.float32)
+
+        pending = np.ascontiguousarray(np.concatenate((self._pending, block)), dtype=np.float32)
+        # 周期 q の入力は pending[q * M + first : q * M + first + width]
+        periods = max(0, (len(pending) - self._first - self._width) // self.down + 1)
+        if periods == 0:
+            self._pending = pending
+            return np.zeros((0, self.num_ch), dtype=np.float32)
+
+        s0, s1 = pending.strides
+        spans = np.lib.stride_tricks.as_strided(pending[self._first:], shape=(periods, self._width, self.num_ch),
+                                                strides=(s0 * self.down, s0, s1), writeable=False)
+        out = np.matmul(self._matrix, spans).reshape(periods * self.up, self.num_ch)
+
+        self._pending = pending[periods * self.down:]
+        self._out_count += len(out)
+        return np.asarray(out, dtype=np.float32)
+
+    # 残りの出力を返す (入力全体に対応する長さになるよう調整する)
+    def flush(self) -> npt.NDArray[np.float32]:
+        total = -(-self._in_count * self.up // self.down)
+        before = self._out_count
+        tail = self.process(np.zeros((self.down + self._first + self._width, self.num_ch), dtype=np.float32))
+        out = tail[:max(0, total - before)]
+        self.reset()
+        return out
+
+
+# ==================================
+#       本クラスのテスト用処理
+# ==================================
+
+
+def module_test() -> None:
+    in_rate = int(sys.argv[1]) if len(sys.argv) >= 2 else 16000
+    out_rate = int(sys.argv[2]) if len(sys.argv) >= 3 else 44100
+
+    # ブロック単位で処理しても、長さ・位相が入力と一致する
+    t = np.arange(in_rate) / in_rate
+    src = (np.sin(2 * np.pi * 440 * t) * 0.5).astype(np.float32)
+    resampler = PolyphaseResampler(in_rate, out_rate)
+    out = np.concatenate([resampler.process(src[i:i + 1000]) for i in range(0, len(src), 1000)] + [resampler.flush()])[:, 0]
+    expect = np.sin(2 * np.pi * 440 * np.arange(len(out)) / out_rate) * 0.5
+    err = np.abs(out - expect)[out_rate // 100:-out_rate // 100].max()
+    print("{} -> {}: {} samples, max err {:.5f}".format(in_rate, out_rate, len(out), err))
+    assert len(out) == -(-in_rate * out_rate // in_rate) and err < 0.01
+
+    # 出力のナイキスト周波数を超える成分は折り返さずに減衰する (ダウンサンプリング時)
+    down = PolyphaseResampler(44100, 16000)
+    tone = np.sin(2 * np.pi * 12000 * np.arange(44100) / 44100).astype(np.float32)
+    alias = np.concatenate((down.process(tone), down.flush()))
+    residual_db = 20 * np.log10(np.sqrt(np.mean(alias[1000:-1000] ** 2)) / np.sqrt(0.5))
+    print("44100 -> 16000: 12kHz residual {:.1f}dB".format(residual_db))
+    assert residual_db < -30
+
+    # 処理時間 (音声 1 秒あたり、ステレオ)
+    stereo = PolyphaseResampler(in_rate, out_rate, 2)
+    audio = np.repeat(src[:, None], 2, axis=1)
+    started = time.perf_counter()
+    for i in range(0, len(audio), 4096):
+        stereo.process(audio[i:i + 4096])
+    print("CPU: {:.1f}ms per second of audio".format((time.perf_counter() - started) * 1000))
+
+
+# ==================================
+# 本モジュールを直接呼出した時の処理
+# ==================================
+if __name__ == "__main__":
+    module_test()
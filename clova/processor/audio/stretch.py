@@ -0,0 +1,177 @@
+import sys
+import time
+import numpy as np
+import numpy.typing as npt
+
+from typing import Generator, Iterator, List, Optional
+
+# ==================================
+#      WSOLA タイムストレッチクラス
+# ==================================
+
+
+class WsolaTimeStretcher:
+    # 音の高さを変えずに再生速度を変える (WSOLA: Waveform Similarity Overlap-Add)
+    #   - 入力から窓長 N のフレームを speed * Hs 間隔で切り出し、出力には Hs (= N / 2) 間隔で重ねて足す
+    #   - 切り出し位置は名目位置の前後 SEARCH_MS の範囲で、直前のフレームの自然な続きと最も波形が似る位置を選ぶ
+    #     (位相がずれたまま重ねることによるうなり・こもりを防ぐ)
+    #   - 相関は全チャンネルの平均を CORRELATION_RATE 程度に間引いて計算し、行列積 1 回で全候補を比べる
+    #   - ブロック単位で続けて呼べる。speed は途中で変えてもよい (次のフレームから反映)。最後に flush() で残りを出力する
+    #   - 入出力は (サンプル, チャンネル) の float32
+    FRAME_MS = 40.0
+    SEARCH_MS = 12.0
+    CORRELATION_RATE = 11025
+    MIN_SPEED = 0.5
+    MAX_SPEED = 2.5
+
+    # コンストラクタ
+    def __init__(self, rate: int, num_ch: int, speed: float = 1.0) -> None:
+        self.rate = rate
+        self.num_ch = num_ch
+        self.speed = speed
+
+        self.hop = int(rate * self.FRAME_MS / 1000) // 2  # 出力側の間隔 Hs
+        self.frame = self.hop * 2
+        self.delta = int(rate * self.SEARCH_MS / 1000)
+        self.decimation = max(1, rate // self.CORRELATION_RATE)
+        # 50% 重ねて足すと 1 になる窓 (周期的ハン窓)
+        self._window = np.asarray(0.5 - 0.5 * np.cos(2 * np.pi * np.arange(self.frame) / self.frame), dtype=np.float32)[:, None]
+
+        self.reset()
+
+    @property
+    def speed(self) -> float:
+        return self._speed
+
+    @speed.setter
+    def speed(self, speed: float) -> None:
+        self._speed = max(self.MIN_SPEED, min(self.MAX_SPEED, speed))
+
+    # 状態をリセットする
+    def reset(self) -> None:
+        # 先頭に (delta + hop) サンプルの無音を置き、最初のフレームの後半から入力が始まるようにする
+        # (窓の立ち上がりで音が小さくならないよう、最初の hop サンプルの出力は捨てる)
+        self._buf = np.zeros((self.delta + self.hop, self.num_ch), dtype=np.float32)
+        self._buf_start = 0  # _buf[0] の (無音を含めた) 入力上の位置
+        self._ana_pos = float(self.delta)  # 次のフレームの名目位置
+        self._prev: Optional[int] = None  # 直前に選んだフレームの位置
+        self._ola = np.zeros((self.frame, self.num_ch), dtype=np.float32)
+        self._skip = self.hop
+        self._expected = 0.0  # 入力全体に対応する出力の長さ
+        self._emitted = 0
+
+    # 入力 block に対応する出力を返す (窓長と探索範囲の分、末尾の出力は次のブロックか flush() で出る)
+    def process(self, block: npt.NDArray[np.float32]) -> npt.NDArray[np.float32]:
+        block = np.asarray(block, dtype=np.float32).reshape(len(block), self.num_ch)
+        self._expected += len(block) / self._speed
+        self._buf = np.concatenate((self._buf, block))
+        return self._run()
+
+    # 残りの出力を返す (入力全体を speed で割った長さになるよう調整する)
+    def flush(self) -> npt.NDArray[np.float32]:
+        total = int(round(self._expected))
+        outs = []
+        while self._emitted < total:
+            self._buf = np.concatenate((self._buf, np.zeros((self.frame + self.delta * 2, self.num_ch), dtype=np.float32)))
+            outs.append(self._run())
+        out = np.concatenate(outs) if outs else np.zeros((0, self.num_ch), dtype=np.float32)
+        out = out[:len(out) - (self._emitted - total)] if self._emitted > total else out
+        self.reset()
+        return out
+
+    def _run(self) -> npt.NDArray[np.float32]:
+        outs: List[npt.NDArray[np.float32]] = []
+        buf_end = self._buf_start + len(self._buf)
+        while True:
+            nominal = int(round(self._ana_pos))
+            need = nominal + self.delta + self.frame
+            if self._prev is not None:
+                need = max(need, self._prev + self.hop + self.frame)
+            if need > buf_end:
+                break
+
+            start = nominal if self._prev is None else self._search(nominal, self._prev + self.hop)
+            offset = start - self._buf_start
+            self._ola += self._window * self._buf[offset:offset + self.frame]
+            outs.append(self._ola[:self.hop].copy())
+            self._ola[:self.hop] = self._ola[self.hop:]
+            self._ola[self.hop:] = 0
+
+            self._prev = start
+            self._ana_pos += self.hop * self._speed
+
+        # 次のフレームの探索に必要な範囲より前は捨てる
+        keep_from = min(int(round(self._ana_pos)) - self.delta, (self._prev + self.hop) if self._prev is not None else self._buf_start)
+        drop = max(0, keep_from - self._buf_start)
+        self._buf = self._buf[drop:]
+        self._buf_start += drop
+
+        if not outs:
+            return np.zeros((0, self.num_ch), dtype=np.float32)
+        out = np.concatenate(outs)
+        self._emitted += len(out) - min(self._skip, len(out))
+        if self._skip:
+            out, self._skip = out[self._skip:], max(0, self._skip - len(out))
+        return out
+
+    # 名目位置の前後 delta の範囲で、natural (直前のフレームの続き) と最も相関の高い位置を返す
+    def _search(self, nominal: int, natural: int) -> int:
+        d = self.decimation
+        base = self._buf_start
+        template = self._buf[natural - base:natural - base + self.frame:d].mean(axis=1)
+        region = self._buf[nominal - self.delta - base:nominal + self.delta + self.frame - base:d].mean(axis=1)
+        candidates = np.lib.stride_tricks.sliding_window_view(region, len(template))
+        best = int(np.argmax(candidates @ template))
+        return nominal - self.delta + best * d
+
+
+# ブロックの列を伸縮しながら順に返す
+def time_stretch(blocks: Iterator[npt.NDArray[np.float32]], stretcher: WsolaTimeStretcher) -> Generator[npt.NDArray[np.float32], None, None]:
+    for block in blocks:
+        out = stretcher.process(block)
+        if len(out):
+            yield out
+    yield stretcher.flush()
+
+
+# ==================================
+#       本クラスのテスト用処理
+# ==================================
+
+
+def module_test() -> None:
+    rate = 44100
+    speed = float(sys.argv[1]) if len(sys.argv) >= 2 else 1.5
+
+    # 長さは 1 / speed になり、音の高さ (ゼロ交差の間隔) は変わらない
+    t = np.arange(rate * 2) / rate
+    tone = (np.sin(2 * np.pi * 220 * t) * 10000).astype(np.float32)
+    stretcher = WsolaTimeStretcher(rate, 2, speed)
+    stereo = np.repeat(tone[:, None], 2, axis=1)
+    started = time.process_time()
+    out = np.concatenate(list(time_stretch(iter([stereo[i:i + 2048] for i in range(0, len(stereo), 2048)]), stretcher)))
+    cpu = time.process_time() - started
+    crossings = np.count_nonzero(np.diff(np.signbit(out[rate // 10:-rate // 10, 0])))
+    freq = crossings / 2 / ((len(out) - rate // 5) / rate)
+    print("speed {}: {} -> {} frames, {:.1f}Hz, CPU {:.1f}ms per second of input".format(speed, len(stereo), len(out), freq, cpu * 1000 / 2))
+    assert len(out) == round(len(stereo) / speed) and abs(freq - 220) < 3
+
+    # 位相を合わせて重ねるので、定常音の振幅はほとんど変わらない
+    level = np.abs(out[rate // 10:-rate // 10, 0])
+    assert level.max() < 10000 * 1.05 and np.sqrt(np.mean(level ** 2)) > 10000 / np.sqrt(2) * 0.95
+
+    # 途中で速さを変えても続けて処理できる
+    stretcher = WsolaTimeStretcher(16000, 1, 1.0)
+    first = stretcher.process(np.ones((8000, 1), dtype=np.float32))
+    stretcher.speed = 2.0
+    rest = np.concatenate((stretcher.process(np.ones((8000, 1), dtype=np.float32)), stretcher.flush()))
+    assert len(first) + len(rest) == 8000 + 4000
+    assert np.allclose(np.concatenate((first, rest))[:-stretcher.frame], 1.0, atol=1e-5)
+    print("WsolaTimeStretcher OK")
+
+
+# ==================================
+# 本モジュールを直接呼出した時の処理
+# ==================================
+if __name__ == "__main__":
+    module_test()
@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import Union
+from typing import Iterator, Union
 
 
 class BaseConversationProvider(ABC):
@@ -14,3 +14,9 @@ class BaseConversationProvider(ABC):
     @abstractmethod
     def get_answer(self, prompt: str, **kwargs: str) -> Union[str, None]:
         pass
+
+    # 応答を生成しながら少しずつ返す (対応していない場合は、応答全体を 1 回で返す)
+    def stream_answer(self, prompt: str, **kwargs: str) -> Iterator[str]:
+        answer = self.get_answer(prompt, **kwargs)
+        if answer:
+            yield answer
@@ -1,7 +1,7 @@
 import os
 import openai
 
-from typing import Optional
+from typing import Iterator, Optional
 
 from clova.general.globals import global_config_prov
 
@@ -61,20 +61,51 @@ class OpenAIChatGPTConversationProvider(BaseConversationProvider, BaseLogger):
             self.log("get_answer", "AIからの応答が空でした。")
             return None
 
-        except openai.error.RateLimitError:
+        except Exception as e:
+            return self._error_message(e)
+
+    # 応答を生成しながら少しずつ返す (エラーの場合は、その説明を返して終わる)
+    # 途中でエラーになった場合は、読み上げ中の文とつながらないよう改行で区切ってから説明を返す
+    def stream_answer(self, prompt: str, **kwargs: str) -> Iterator[str]:
+        openai.api_key = self.OPENAI_API_KEY
+
+        self.log("stream_answer", "OpenAI 応答作成中 (ストリーミング)")
+
+        yielded = False
+        try:
+            ai_response = openai.ChatCompletion.create(
+                model=kwargs["model"],
+                messages=[
+                    {"role": "system", "content": self._char_setting_str},
+                    {"role": "user", "content": prompt},
+                ],
+                stream=True
+            )  # type: ignore[no-untyped-call]
+            for chunk in ai_response:
+                content = chunk["choices"][0]["delta"].get("content")
+                if content:
+                    yielded = True
+                    yield content
+
+        except Exception as e:
+            message = self._error_message(e)
+            if yielded:
+                self.log("stream_answer", "応答の途中でエラーが発生しました:{}".format(message))
+                yield "\n"
+            yield message
+
+    def _error_message(self, e: Exception) -> str:
+        if isinstance(e, openai.error.RateLimitError):
             return "OpenAIエラー：APIクオータ制限に達しました。しばらく待ってから再度お試しください。改善しない場合は、月間使用リミットに到達したか無料枠期限切れの可能性もあります。"
-        except openai.error.AuthenticationError:
+        if isinstance(e, openai.error.AuthenticationError):
             return "OpenAIエラー：Open AI APIキーが不正です。"
-        except openai.error.APIConnectionError:
+        if isinstance(e, openai.error.APIConnectionError):
             return "OpenAIエラー：Open AI APIに接続できませんでした。"
-        except openai.error.ServiceUnavailableError:
+        if isinstance(e, openai.error.ServiceUnavailableError):
             return "OpenAIエラー：Open AI サービス無効エラーです。"
-        except openai.error.OpenAIError as e:
+        if isinstance(e, openai.error.OpenAIError):
             return "OpenAIエラー：Open AI APIエラーが発生しました：{}".format(e)
-        except Exception as e:
-            return "不明なエラーが発生しました：{}".format(e)
-
-        return None
+        return "不明なエラーが発生しました：{}".format(e)
 
 # ==================================
 #       本クラスのテスト用処理
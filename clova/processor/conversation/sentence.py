@@ -0,0 +1,75 @@
+from typing import List
+
+# ==================================
+#          文の区切りクラス
+# ==================================
+
+
+class SentenceSplitter:
+    # 少しずつ届く応答の文字列を、文 (。！？ や改行で終わるまとまり) ごとに区切る
+    #   - 「！？」「。。。」のように続く終端記号や、直後の閉じ括弧・引用符は同じ文に含める
+    #   - 半角の "." は小数や略語に使われるので区切らない
+    TERMINATORS = "。！？!?\n"
+    CLOSERS = "」』）)】〉》\"'”’"
+
+    # コンストラクタ
+    def __init__(self) -> None:
+        self._buffer = ""
+
+    # 文字列を追加し、完成した文を返す (文末の記号の後に続く文字が届くまで、その文は返さない)
+    def feed(self, text: str) -> List[str]:
+        self._buffer += text
+        sentences = []
+        start = 0
+        i = 0
+        while i < len(self._buffer):
+            if self._buffer[i] not in self.TERMINATORS:
+                i += 1
+                continue
+
+            end = i + 1
+            while end < len(self._buffer) and (self._buffer[end] in self.TERMINATORS or self._buffer[end] in self.CLOSERS):
+                end += 1
+            if end == len(self._buffer):
+                break  # 終端記号・閉じ括弧がまだ続くかもしれない
+
+            sentence = self._buffer[start:end].strip()
+            if sentence:
+                sentences.append(sentence)
+            start = i = end
+
+        self._buffer = self._buffer[start:]
+        return sentences
+
+    # 残りの文字列を返す (応答の終わりに呼ぶ)
+    def flush(self) -> List[str]:
+        rest = self._buffer.strip()
+        self._buffer = ""
+        return [rest] if rest else []
+
+
+# ==================================
+#       本クラスのテスト用処理
+# ==================================
+
+
+def module_test() -> None:
+    splitter = SentenceSplitter()
+    text = "こんにちは！今日は「いい天気」ですね。気温は25.5度です！？\n\n散歩はいかがですか"
+    sentences = []
+    for i in range(0, len(text), 3):
+        sentences += splitter.feed(text[i:i + 3])
+    sentences += splitter.flush()
+    print(sentences)
+    assert sentences == ["こんにちは！", "今日は「いい天気」ですね。", "気温は25.5度です！？", "散歩はいかがですか"]
+
+    # 閉じ括弧までを 1 文にする
+    assert splitter.feed("「はい。」と言った。") == ["「はい。」"] and splitter.flush() == ["と言った。"]
+    print("SentenceSplitter OK")
+
+
+# ==================================
+# 本モジュールを直接呼出した時の処理
+# ==================================
+if __name__ == "__main__":
+    module_test()
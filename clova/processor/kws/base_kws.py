@@ -0,0 +1,17 @@
+import numpy as np
+import numpy.typing as npt
+
+from abc import ABC, abstractmethod
+from typing import Any, Optional
+
+
+class BaseKWSProvider(ABC):
+    def __init__(self, rate: int, **kwargs: Any) -> None:
+        self.rate = rate
+        super().__init__()
+
+    # audio: モノラル float32 [-1.0, 1.0)
+    # キーワードを検出した場合はキーワード終端のサンプル位置、検出しなかった場合は None を返す
+    @abstractmethod
+    def detect(self, audio: npt.NDArray[np.float32]) -> Optional[int]:
+        pass
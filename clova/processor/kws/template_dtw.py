@@ -0,0 +1,276 @@
+import os
+import sys
+import glob
+import shutil
+import tempfile
+import time
+import wave
+import numpy as np
+import numpy.typing as npt
+
+from typing import Any, List, Optional, Tuple
+
+from clova.processor.kws.base_kws import BaseKWSProvider
+
+from clova.general.logger import BaseLogger
+
+DEFAULT_TEMPLATE_DIR = os.path.join(os.path.expanduser("~/.config"), "clova", "wake")
+
+# ==================================
+#   テンプレート照合 キーワード検出クラス
+# ==================================
+
+
+class TemplateDTWKWSProvider(BaseKWSProvider, BaseLogger):
+    # 登録したウェイクワードの録音 (テンプレート) と、入力の先頭部分を MFCC + DTW で照合する
+    FRAME_LEN = 0.025  # 分析フレーム長 (秒)
+    FRAME_HOP = 0.010  # 分析フレーム間隔 (秒)
+    NUM_FFT = 512
+    NUM_MEL = 26
+    NUM_CEPS = 13
+    SEARCH_DURATION = 3.0  # 入力の先頭から探索する長さ (秒)
+
+    # sensitivity 0.0 (誤検出しにくい) ～ 1.0 (検出しやすい) を距離しきい値に対応付ける
+    THRESHOLD_MIN = 0.25
+    THRESHOLD_MAX = 0.45
+
+    def __init__(self, rate: int, **kwargs: Any) -> None:
+        super().__init__(rate, **kwargs)
+
+        self.frame_len = int(rate * self.FRAME_LEN)
+        self.frame_hop = int(rate * self.FRAME_HOP)
+        self._window = np.hamming(self.frame_len).astype(np.float32)
+        self._mel_fb = self._mel_filterbank(rate)
+        self._dct = self._dct_matrix()
+
+        self.set_sensitivity(float(kwargs.get("sensitivity", 0.5)))
+        if "threshold" in kwargs:
+            self.threshold = float(kwargs["threshold"])
+
+        self.template_dir = os.path.expanduser(kwargs.get("template_dir", DEFAULT_TEMPLATE_DIR))
+        self.templates: List[npt.NDArray[np.float32]] = []
+        self.load_templates(self.template_dir)
+
+    def __del__(self) -> None:
+        super().__del__()
+
+    def set_sensitivity(self, sensitivity: float) -> None:
+        sensitivity = min(1.0, max(0.0, sensitivity))
+        self.threshold = self.THRESHOLD_MIN + (self.THRESHOLD_MAX - self.THRESHOLD_MIN) * sensitivity
+
+    # テンプレート (16bit モノラル WAV) を読み込む
+    def load_templates(self, template_dir: str) -> None:
+        self.templates = []
+        for path in sorted(glob.glob(os.path.join(template_dir, "*.wav"))):
+            audio, rate = read_wav_mono(path)
+            if rate != self.rate:
+                self.log("load_templates", "サンプリングレートが異なるため無視します: {} ({}Hz)".format(path, rate))
+                continue
+            self.templates.append(self.features(audio))
+
+        self.log("load_templates", "{} 個のテンプレートを読み込みました: {}".format(len(self.templates), template_dir))
+
+    def _mel_filterbank(self, rate: int) -> npt.NDArray[np.float32]:
+        def hz_to_mel(hz: npt.NDArray[np.float64]) -> npt.NDArray[np.float64]:
+            return 2595.0 * np.log10(1.0 + hz / 700.0)  # type: ignore[no-any-return]
+
+        def mel_to_hz(mel: npt.NDArray[np.float64]) -> npt.NDArray[np.float64]:
+            return 700.0 * (10 ** (mel / 2595.0) - 1.0)  # type: ignore[no-any-return]
+
+        mel_points = np.linspace(hz_to_mel(np.array(0.0)), hz_to_mel(np.array(rate / 2)), self.NUM_MEL + 2)
+        bins = np.floor((self.NUM_FFT + 1) * mel_to_hz(mel_points) / rate).astype(int)
+
+        fb = np.zeros((self.NUM_MEL, self.NUM_FFT // 2 + 1), dtype=np.float32)
+        for m in range(1, self.NUM_MEL + 1):
+            left, center, right = bins[m - 1], bins[m], bins[m + 1]
+            if center > left:
+                fb[m - 1, left:center] = (np.arange(left, center) - left) / (center - left)
+            if right > center:
+                fb[m - 1, center:right] = (right - np.arange(center, right)) / (right - center)
+        return fb
+
+    def _dct_matrix(self) -> npt.NDArray[np.float32]:
+        n = np.arange(self.NUM_MEL)
+        k = np.arange(self.NUM_CEPS)[:, None]
+        return np.cos(np.pi * k * (2 * n + 1) / (2 * self.NUM_MEL)).astype(np.float32)
+
+    # MFCC (c0 を除き、音量の影響を受けないようフレームごとに長さ 1 に正規化) を求める
+    def features(self, audio: npt.NDArray[np.float32]) -> npt.NDArray[np.float32]:
+        if len(audio) < self.frame_len:
+            audio = np.pad(audio, (0, self.frame_len - len(audio)))
+
+        num_frames = 1 + (len(audio) - self.frame_len) // self.frame_hop
+        idx = np.arange(self.frame_len)[None, :] + self.frame_hop * np.arange(num_frames)[:, None]
+        frames = audio[idx] * self._window
+
+        power = np.abs(np.fft.rfft(frames, self.NUM_FFT)) ** 2
+        log_mel = np.log(power @ self._mel_fb.T + 1e-10)
+        ceps = (log_mel @ self._dct.T)[:, 1:]
+        return np.asarray(ceps / (np.linalg.norm(ceps, axis=1, keepdims=True) + 1e-6), dtype=np.float32)
+
+    # 部分系列 DTW: テンプレート全体と入力の任意の区間の照合距離 (テンプレート長で正規化) と終端フレームを返す
+    # 傾き制約 (1,1) (1,2) (2,1) のステップのみを使うことで、行ごとにベクトル演算できる
+    @staticmethod
+    def subsequence_dtw(template: npt.NDArray[np.float32], query: npt.NDArray[np.float32]) -> Tuple[float, int]:
+        cost = np.sqrt(((template[:, None, :] - query[None, :, :]) ** 2).sum(axis=2))
+        num_t, num_q = cost.shape
+
+        inf = np.float32(np.inf)
+        prev2 = np.full(num_q, inf, dtype=np.float32)
+        prev1 = cost[0].copy()  # 開始位置は自由
+        for i in range(1, num_t):
+            cur = np.full(num_q, inf, dtype=np.float32)
+            step = prev1[:-1]  # (1,1)
+            if num_q > 2:
+                step = np.minimum(step, np.concatenate(([inf], prev1[:-2])))  # (1,2)
+            step = np.minimum(step, prev2[:-1])  # (2,1)
+            cur[1:] = cost[i, 1:] + step
+            prev2, prev1 = prev1, cur
+
+        end = int(np.argmin(prev1))
+        return float(prev1[end]) / num_t, end
+
+    # 全テンプレート中の最小距離と、キーワード終端のサンプル位置
+    def score(self, audio: npt.NDArray[np.float32]) -> Tuple[float, int]:
+        query = self.features(audio[:int(self.rate * self.SEARCH_DURATION)])
+
+        best = (float("inf"), 0)
+        for template in self.templates:
+            if len(template) < 2 or len(query) < len(template) // 2:
+                continue
+            distance, end = self.subsequence_dtw(template, query)
+            if distance < best[0]:
+                best = (distance, end)
+
+        distance, end = best
+        return distance, min(len(audio), end * self.frame_hop + self.frame_len)
+
+    def detect(self, audio: npt.NDArray[np.float32]) -> Optional[int]:
+        if not self.templates:
+            return None
+
+        distance, end = self.score(audio)
+        self.log("detect", "distance={:.3f} threshold={:.3f}".format(distance, self.threshold))
+        if distance > self.threshold:
+            return None
+
+        return end
+
+
+def read_wav_mono(path: str) -> Tuple[npt.NDArray[np.float32], int]:
+    with wave.open(path, "rb") as wav:
+        assert wav.getsampwidth() == 2, "16bit PCM のみ対応"
+        rate = wav.getframerate()
+        ch = wav.getnchannels()
+        pcm = np.frombuffer(wav.readframes(wav.getnframes()), dtype=np.int16)
+    mono = pcm.reshape(-1, ch).mean(axis=1) if ch > 1 else pcm
+    return np.asarray(mono, dtype=np.float32) / np.float32(32768.0), rate
+
+
+# ==================================
+#     誤検出率・検出漏れ率の計測
+# ==================================
+
+
+# positive_dir: ウェイクワードを含む録音、negative_dir: 含まない録音 (テレビの音声・生活音など)
+def benchmark(positive_dir: str, negative_dir: str, template_dir: str = DEFAULT_TEMPLATE_DIR) -> None:
+    kws = TemplateDTWKWSProvider(16000, template_dir=template_dir)
+
+    def scores(directory: str) -> List[float]:
+        result = []
+        for path in sorted(glob.glob(os.path.join(directory, "*.wav"))):
+            audio, _ = read_wav_mono(path)
+            result.append(kws.score(audio)[0])
+        return result
+
+    started = time.process_time()
+    pos = scores(positive_dir)
+    neg = scores(negative_dir)
+    elapsed = time.process_time() - started
+
+    print("テンプレート: {} / 正例: {} / 負例: {} / CPU時間: {:.1f}ms/件".format(
+        len(kws.templates), len(pos), len(neg), elapsed * 1000 / max(1, len(pos) + len(neg))))
+    print_error_rates(kws, pos, neg)
+
+
+# sensitivity ごとの検出漏れ率・誤検出率を表示する
+def print_error_rates(kws: TemplateDTWKWSProvider, pos: List[float], neg: List[float]) -> None:
+    print("sensitivity threshold  FRR(検出漏れ)  FAR(誤検出)")
+    for sensitivity in np.linspace(0.0, 1.0, 11):
+        kws.set_sensitivity(float(sensitivity))
+        frr = sum(s > kws.threshold for s in pos) / max(1, len(pos))
+        far = sum(s <= kws.threshold for s in neg) / max(1, len(neg))
+        print("{:11.1f} {:9.3f}  {:12.1%}  {:11.1%}".format(sensitivity, kws.threshold, frr, far))
+
+
+# ==================================
+#       本クラスのテスト用処理
+# ==================================
+
+
+# 合成音声によるしきい値の確認用: 基本周波数が (開始, 終了) Hz で変化する倍音付きの音を並べた「発話」
+def synthetic_phrase(rate: int, contour: List[Tuple[float, float]], duration: float, stretch: float = 1.0) -> npt.NDArray[np.float32]:
+    parts = []
+    for f_start, f_end in contour:
+        num = int(rate * duration * stretch)
+        phase = 2 * np.pi * np.cumsum(np.linspace(f_start, f_end, num)) / rate
+        parts.append(sum(np.sin(k * phase) / k for k in range(1, 6)) * np.hanning(num))
+    return np.asarray(0.3 * np.concatenate(parts), dtype=np.float32)
+
+
+def module_test() -> None:
+    if len(sys.argv) >= 3:
+        benchmark(*sys.argv[1:4])
+        return
+
+    print("Usage> python {} positive_dir negative_dir [template_dir]".format(sys.argv[0]))
+
+    # 実際の録音が無い場合の確認: 合成した「ウェイクワード」で、既定の sensitivity (0.5) が正例と負例の間にあること
+    # (実機の FRR/FAR ではない。実際の録音で上のコマンドを実行して sensitivity を決めること)
+    rate = 16000
+    rng = np.random.default_rng(0)
+    wake = [(200.0, 320.0), (450.0, 300.0), (260.0, 520.0)]
+    other = [(600.0, 400.0), (180.0, 180.0), (350.0, 700.0)]
+    silence = np.zeros(rate // 5, dtype=np.float32)
+
+    def noisy(audio: npt.NDArray[np.float32], snr_db: float) -> npt.NDArray[np.float32]:
+        noise = rng.normal(0.0, np.sqrt(np.mean(audio ** 2) / 10 ** (snr_db / 10)), len(audio))
+        return np.asarray(audio + noise, dtype=np.float32)
+
+    template_dir = tempfile.mkdtemp()
+    try:
+        for i, stretch in enumerate([1.0, 0.95, 1.05]):
+            pcm = (noisy(synthetic_phrase(rate, wake, 0.18, stretch), 30) * 32767).astype(np.int16)
+            with wave.open(os.path.join(template_dir, "{}.wav".format(i)), "wb") as wav:
+                wav.setnchannels(1)
+                wav.setsampwidth(2)
+                wav.setframerate(rate)
+                wav.writeframes(pcm.tobytes())
+        kws = TemplateDTWKWSProvider(rate, template_dir=template_dir)
+    finally:
+        shutil.rmtree(template_dir)
+
+    # 正例: 話す速さ (±15%)・音量・雑音を変えたウェイクワードの後に続けて別の発話
+    positives = [np.concatenate([silence, noisy(synthetic_phrase(rate, wake, 0.18, stretch) * gain, snr), noisy(synthetic_phrase(rate, other, 0.2), 20)])
+                 for stretch, gain, snr in [(0.9, 1.0, 20), (1.1, 0.3, 15), (1.0, 2.0, 10), (0.85, 1.0, 20), (1.15, 1.0, 20)]]
+    # 負例: 別の発話・雑音のみ
+    negatives = [np.concatenate([silence, noisy(synthetic_phrase(rate, other, 0.18 * stretch), snr)]) for stretch, snr in [(1.0, 20), (1.2, 10)]]
+    negatives.append(rng.normal(0.0, 0.1, rate).astype(np.float32))
+
+    pos = [kws.score(audio)[0] for audio in positives]
+    neg = [kws.score(audio)[0] for audio in negatives]
+    print("正例の距離: {}".format(" ".join("{:.3f}".format(s) for s in pos)))
+    print("負例の距離: {}".format(" ".join("{:.3f}".format(s) for s in neg)))
+    print_error_rates(kws, pos, neg)
+
+    kws.set_sensitivity(0.5)
+    assert max(pos) < kws.threshold < min(neg), "既定のしきい値 {:.3f} で正例と負例を分けられません".format(kws.threshold)
+    assert all(kws.detect(audio) is not None for audio in positives) and all(kws.detect(audio) is None for audio in negatives)
+    print("TemplateDTWKWSProvider OK")
+
+
+# ==================================
+# 本モジュールを直接呼出した時の処理
+# ==================================
+if __name__ == "__main__":
+    module_test()
@@ -14,3 +14,8 @@ class BaseSkillProvider(ABC):
     @abstractmethod
     def try_get_answer_post_process(self, response: str) -> Union[str, None]:
         pass
+
+    # 直前の応答がユーザーへの質問で、すぐに返答が来る見込みがあるか
+    # 質問した問いかけの後に 1 回だけ True を返す (読んだら消す)。関係の無い問いかけの後まで残さない
+    def expects_follow_up(self) -> bool:
+        return False
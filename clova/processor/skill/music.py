@@ -1,16 +1,15 @@
 import yt_dlp  # type: ignore[import]
 import ffmpeg  # type: ignore[import]
-import pyaudio
-import numpy as np
 import os
 import threading
-import time
 
 from typing import IO, Optional
 
-from clova.general.globals import global_vol, global_speech_queue, global_config_prov
+from clova.general.globals import global_config_prov, global_vol, global_speech_queue, global_audio_mixer, GLOBAL_PLAY_RATE
 
-from clova.general.voice import PCM_PLAY_SIZEOF_CHUNK, SPEECH_FORMAT
+from clova.general.voice import PCM_PLAY_SIZEOF_CHUNK, PCM_PLAY_DEFAULT_LIMITER_THRESHOLD
+
+from clova.processor.audio.dsp import GainStage, readinto_full
 
 from clova.io.local.switch import SwitchInput
 
@@ -24,13 +23,24 @@ from clova.general.logger import BaseLogger
 
 class MusicSkillProvider(BaseSkillProvider, BaseLogger):
     YT_DLP_PIPE = "/tmp/yt_dlp_out.pipe"
+    YT_DLP_READ_SIZE = 16384
+    MUSIC_GAIN = 0.25  # かなりうるさいため 0.25 * 音量
+    MUSIC_MAX_QUEUED_SECONDS = 2.0
+    MUSIC_DEFAULT_DUCK_GAIN = 0.25  # 音声の再生中に音楽の音量を下げる倍率
 
     # コンストラクタ
     def __init__(self) -> None:
         super().__init__()
-        self.speaker_device_index = global_config_prov.get_user_config()["hardware"]["audio"]["speaker"]["index"]
         self.stop_btn = SwitchInput.init(SwitchInput.PIN_BACK_SW_MUTE, lambda _: self._stop())
         self._stop_flg = False
+        self._music_thread: Optional[threading.Thread] = None
+
+        # 音楽用の音源 (音声の再生中は音量が下がる)
+        speaker_conf = global_config_prov.get_user_config()["hardware"]["audio"]["speaker"]
+        self._player = global_audio_mixer.open_source("music", self.MUSIC_MAX_QUEUED_SECONDS,
+                                                      duck_gain=speaker_conf.get("duck_gain", self.MUSIC_DEFAULT_DUCK_GAIN))
+        self._gain = GainStage(speaker_conf.get("block_frames", PCM_PLAY_SIZEOF_CHUNK), self._player.num_ch,
+                               speaker_conf.get("limiter_threshold", PCM_PLAY_DEFAULT_LIMITER_THRESHOLD))
 
     # デストラクタ
     def __del__(self) -> None:
@@ -41,32 +51,29 @@ class MusicSkillProvider(BaseSkillProvider, BaseLogger):
 
     def _stop(self) -> None:
         self._stop_flg = True
+        self._player.flush()  # 再生キューの空き待ちで止まっている書き込みも再開させる
 
-    def _handle_ffmpeg_output(self, pyaud: pyaudio.PyAudio, stdout: IO[bytes]) -> None:
-        play_stream = None
-
-        # 再生処理
+    def _handle_ffmpeg_output(self, stdout: IO[bytes]) -> None:
+        # 再生処理 (ミキサーの音楽用の音源に書き込む。再生キューが一杯の間は write() が待つ)
+        # 読み込み・音量処理ともに同じバッファを使い回す
+        view = self._gain.input_view
         while True:
-            data = stdout.read(PCM_PLAY_SIZEOF_CHUNK)
-            if not data:
+            n = readinto_full(stdout, view)
+            if n == 0:
                 break
 
-            if play_stream is None:  # openしたときからwriteするまで結構大きめのノイズがするためデータが取得できてからopenする
-                play_stream = pyaud.open(format=SPEECH_FORMAT, channels=1, rate=44100, output=True, output_device_index=self.speaker_device_index)
-                play_stream.start_stream()
+            if self._stop_flg:
+                continue  # ffmpeg への書き込みが詰まらないよう読み捨てる
 
-            nd = (np.frombuffer(data, dtype=np.int16) * 0.25 * global_vol.vol_value).astype(np.int16)  # ボリューム倍率を更新; かなりうるさいため0.25 * 音量
-            play_stream.write(nd.tobytes())
+            self._player.write(self._gain.process_input(n, self.MUSIC_GAIN * global_vol.vol_value))  # ボリューム倍率を更新
 
-        # 再生終了処理
-        if play_stream is not None:
-            play_stream.stop_stream()
-            while play_stream.is_active():
-                time.sleep(0.1)
-            play_stream.close()
+        # 再生終了処理 (停止時は再生キューに残っている分を捨てる)
+        if self._stop_flg:
+            self._player.flush()
+        self._player.drain()
         self.log("_handle_ffmpeg_output", "Play done!")
 
-    def _handle_yt_dlp_output(self, pyaud: pyaudio.PyAudio) -> None:
+    def _handle_yt_dlp_output(self) -> None:
         fd = os.open(self.YT_DLP_PIPE, os.O_RDONLY)
 
         # 変換
@@ -75,22 +82,21 @@ class MusicSkillProvider(BaseSkillProvider, BaseLogger):
             input_stream.audio,
             "pipe:",
             format="s16le",
-            ar=44100,
-            ac=1,
+            ar=GLOBAL_PLAY_RATE,
+            ac=self._player.num_ch,
             # loglevel='error'
         )
 
         ffmpeg_proc = output_stream.run_async(pipe_stdin=True, pipe_stdout=True)
 
-        ffmpeg_handler = threading.Thread(target=self._handle_ffmpeg_output, args=[pyaud, ffmpeg_proc.stdout])
+        ffmpeg_handler = threading.Thread(target=self._handle_ffmpeg_output, args=[ffmpeg_proc.stdout])
         ffmpeg_handler.start()
 
         # パイプ
         while True:
-            chunk = os.read(fd, PCM_PLAY_SIZEOF_CHUNK)
+            chunk = os.read(fd, self.YT_DLP_READ_SIZE)
 
             if chunk == b"" or self._stop_flg:
-                self._stop_flg = False
                 break
 
             ffmpeg_proc.stdin.write(chunk)
@@ -105,16 +111,14 @@ class MusicSkillProvider(BaseSkillProvider, BaseLogger):
     #   -> _handle_yt_dlp_output()
     #        -> ffmpeg (m4a -> PCM S16_LE)
     #        -> _handle_ffmpeg_output()
-    #             -> pyaudio (PCM S16_LE -> Speaker)
+    #             -> global_audio_mixer (PCM S16_LE -> Speaker)
     def try_play_music(self, search_query: str) -> None:
         try:
             os.mkfifo(self.YT_DLP_PIPE)  # type: ignore[attr-defined]
         except Exception:
             pass
 
-        pyaud = pyaudio.PyAudio()
-
-        yt_dlp_handler = threading.Thread(target=self._handle_yt_dlp_output, args=[pyaud])
+        yt_dlp_handler = threading.Thread(target=self._handle_yt_dlp_output)
         yt_dlp_handler.start()
 
         with yt_dlp.YoutubeDL({
@@ -139,6 +143,17 @@ class MusicSkillProvider(BaseSkillProvider, BaseLogger):
         except Exception:
             pass
 
+    # 別スレッドで音楽を再生する (発話キューを止めないため、再生中もタイマー・LINE などの音声が音楽に重ねて再生される)
+    # 再生中の曲があれば止めてから再生する
+    def start_music(self, search_query: str) -> None:
+        if self._music_thread is not None and self._music_thread.is_alive():
+            self._stop_flg = True
+            self._music_thread.join()
+        self._stop_flg = False
+
+        self._music_thread = threading.Thread(target=self.try_play_music, args=[search_query], daemon=True)
+        self._music_thread.start()
+
     # 日時 質問に答える。日時の問い合わせではなければ None を返す
     def try_get_answer(self, prompt: str, use_stub: bool, **kwarg: str) -> Optional[str]:
         if not use_stub:
@@ -150,7 +165,7 @@ class MusicSkillProvider(BaseSkillProvider, BaseLogger):
 
         if ("音楽" in prompt) and (("かけて" in prompt) or ("再生" in prompt)):
             global_speech_queue.add("曲 {} を再生します。 ミュートボタンを押して停止します。".format(" ".join(prompt)))
-            global_speech_queue.add(lambda: self.try_play_music(prompt))
+            global_speech_queue.add(lambda: self.start_music(prompt))
             return ""  # 意図的
 
         # 該当がない場合は空で返信
@@ -162,7 +177,7 @@ class MusicSkillProvider(BaseSkillProvider, BaseLogger):
 
         args = response.split("\n")[0].split(" ")
         global_speech_queue.add("曲 {} を再生します。 ミュートボタンを押して停止します。".format(" ".join(args[1:])))
-        global_speech_queue.add(lambda: self.try_play_music(" ".join(args[1:])))
+        global_speech_queue.add(lambda: self.start_music(" ".join(args[1:])))
         return ""  # 意図的
 
 # ==================================
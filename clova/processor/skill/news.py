@@ -39,6 +39,7 @@ class NewsSkillProvider(BaseSkillProvider, BaseLogger):
         super().__init__()
 
         self._news_count = 0
+        self._follow_up = False  # この問いかけへの応答で番号を尋ねた
 
     # デストラクタ
     def __del__(self) -> None:
@@ -115,6 +116,7 @@ class NewsSkillProvider(BaseSkillProvider, BaseLogger):
                     return news_detail
                 else:
                     answer_text = "番号が不正または範囲外です。\n詳細を知りたい番号を1から{}で選んでください。\n終了するには終わりと言ってください。".format(str(self._news_count))
+                    self._follow_up = True
                     return answer_text
         return None
 
@@ -140,9 +142,16 @@ class NewsSkillProvider(BaseSkillProvider, BaseLogger):
         self._news_count = num - 1
         self._news_list = news_list
         news_headlines += "詳細を知りたい番号を1から{}で選んでください。\n".format(str(self._news_count))
+        self._follow_up = True
 
         return news_headlines
 
+    # 番号を尋ねた直後か (読むと消える。番号の選択待ちが続いていても、関係の無い問いかけの後は通常の待ち受けに戻る)
+    def expects_follow_up(self) -> bool:
+        follow_up = self._follow_up
+        self._follow_up = False
+        return follow_up
+
     def try_get_answer_post_process(self, response: str) -> Optional[str]:
         if not response.startswith("CALL_NEWS"):
             return None
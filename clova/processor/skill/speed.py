@@ -0,0 +1,93 @@
+import regex as re
+
+from typing import Optional
+
+from clova.general.globals import global_playback_speed
+
+from clova.processor.skill.base_skill import BaseSkillProvider
+
+from clova.general.logger import BaseLogger
+
+# 「もっと速く」「ゆっくり話して」など、速さだけを指示する短い発話 (質問の一部は対象外)
+SPEED_COMMAND_SUFFIX = "(して|話して|はなして|しゃべって|喋って|読んで)?(ください)?[\\p{P}\\p{Z}]*$"
+REGEX_FASTER = re.compile("^(もっと|もう少し|もうちょっと)?(速く|早く|はやく)" + SPEED_COMMAND_SUFFIX)
+REGEX_SLOWER = re.compile("^(もっと|もう少し|もうちょっと)?(ゆっくり|遅く|おそく)" + SPEED_COMMAND_SUFFIX)
+REGEX_NORMAL = re.compile("^(普通|ふつう|元|もと)の(速さ|早さ|スピード)(に戻して|にして)?(ください)?[\\p{P}\\p{Z}]*$")
+
+# ==================================
+#        読み上げ速度クラス
+# ==================================
+
+
+class SpeedSkillProvider(BaseSkillProvider, BaseLogger):
+    # コンストラクタ
+    def __init__(self) -> None:
+        super().__init__()
+
+    # デストラクタ
+    def __del__(self) -> None:
+        super().__del__()
+
+    def get_prompt_addition(self) -> str:
+        return "SpeedSkillProvider: これは読み上げの速さを変えるスキルです。 フォーマット: `CALL_SPEED <faster|slower|normal>`"
+
+    # 速さの指示に答える。速さの指示ではなければ None を返す
+    # (短い定型の指示なので、新スキルコードをサポートしている場合も AI に問い合わせずに処理する)
+    def try_get_answer(self, prompt: str, use_stub: bool, **kwarg: str) -> Optional[str]:
+        prompt = prompt.strip()
+        if REGEX_FASTER.match(prompt) is not None:
+            return self._change("faster")
+        if REGEX_SLOWER.match(prompt) is not None:
+            return self._change("slower")
+        if REGEX_NORMAL.match(prompt) is not None:
+            return self._change("normal")
+        return None
+
+    def try_get_answer_post_process(self, response: str) -> Optional[str]:
+        if not response.startswith("CALL_SPEED"):
+            return None
+
+        args = response.split("\n")[0].split(" ")
+        return self._change(args[1] if len(args) >= 2 else "normal")
+
+    def _change(self, direction: str) -> str:
+        before = global_playback_speed.user_speed
+        if direction == "faster":
+            speed = global_playback_speed.faster()
+        elif direction == "slower":
+            speed = global_playback_speed.slower()
+        else:
+            speed = global_playback_speed.reset()
+        self.log("_change", "{}: {} -> {}".format(direction, before, speed))
+
+        if speed == before and direction != "normal":
+            return "これ以上{}できません。".format("速く" if direction == "faster" else "ゆっくりに")
+        return "読み上げの速さを {} 倍にしました。".format(speed)
+
+
+# ==================================
+#       本クラスのテスト用処理
+# ==================================
+
+
+def module_test() -> None:
+    skill = SpeedSkillProvider()
+    base = global_playback_speed.user_speed
+    for prompt in ("もっと速く", "早く話して。", "もう少しゆっくり読んでください", "普通の速さに戻して"):
+        print("{} -> {}".format(prompt, skill.try_get_answer(prompt, False)))
+    assert global_playback_speed.user_speed == base
+
+    # 質問や別の話題には反応しない
+    for prompt in ("ゆっくり休む方法を教えて", "早く寝るにはどうすればいい", "速くなる"):
+        assert skill.try_get_answer(prompt, False) is None, prompt
+
+    assert skill.try_get_answer_post_process("CALL_SPEED faster") is not None
+    assert global_playback_speed.user_speed > base
+    global_playback_speed.reset()
+
+
+# ==================================
+# 本モジュールを直接呼出した時の処理
+# ==================================
+if __name__ == "__main__":
+    module_test()
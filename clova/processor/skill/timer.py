@@ -25,6 +25,7 @@ class TimerSkillProvider(BaseSkillProvider, BaseLogger):
         self._stop_event = th.Event()
         self._is_timer_set = False
         self._is_alarm_on = False
+        self._follow_up = False  # この問いかけへの応答で通知の終了を促した
         self._timer_thread = th.Thread(target=self._thread_timer, args=(), name="TimerMain", daemon=True)
         self._timer_thread.start()
         self._duration = ""
@@ -113,9 +114,16 @@ class TimerSkillProvider(BaseSkillProvider, BaseLogger):
                 # global_speech_queue.AddToQueue(answer_text)
 
                 answer_text = "終了待ちです。"
+                self._follow_up = True
                 self.log("try_get_answer", answer_text)
                 return answer_text
 
+    # タイマ通知の終了を促した直後か (読むと消える)
+    def expects_follow_up(self) -> bool:
+        follow_up = self._follow_up
+        self._follow_up = False
+        return follow_up
+
     def try_get_answer_post_process(self, response: str) -> Optional[str]:
         if not response.startswith("CALL_TIMER"):
             return None
@@ -1,9 +1,36 @@
 from abc import ABC, abstractmethod
-from typing import Union
+from typing import Callable, Optional, Tuple, Union
 
 
 class BaseSTTProvider(ABC):
+    # stt() に渡せる音声の形式 (params の "encoding" で選択、既定は LINEAR16)
+    SUPPORTED_ENCODINGS: Tuple[str, ...] = ("LINEAR16", )
+
     @abstractmethod
-    # audio: S16_LE? PCM audio
+    # audio: S16_LE PCM audio、または kwargs["encoding"] の形式に圧縮した音声
     def stt(self, audio: bytes, **kwargs: str) -> Union[str, None]:
         pass
+
+
+class StreamingSTTProvider(BaseSTTProvider):
+    # ストリーミング認識 (録音中に音声を逐次送信) に対応した音声認識
+
+    @abstractmethod
+    # ストリーミング認識を開始する。on_interim には途中経過のテキストが渡される
+    def stream_start(self, on_interim: Optional[Callable[[str], None]], **kwargs: str) -> None:
+        pass
+
+    @abstractmethod
+    # 録音中の音声チャンク (S16_LE PCM) を送信する
+    def stream_write(self, chunk: bytes) -> None:
+        pass
+
+    @abstractmethod
+    # 音声の送信を終了し、最終結果を返す。認識に失敗した場合は例外を送出する
+    def stream_finish(self) -> Union[str, None]:
+        pass
+
+    @abstractmethod
+    # ストリーミング認識を破棄する (通信中の要求も中止する)
+    def stream_cancel(self) -> None:
+        pass
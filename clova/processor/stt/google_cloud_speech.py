@@ -1,36 +1,97 @@
+import queue
+import threading
+
 from google.cloud import speech_v1p1beta1 as speech
 
-from typing import Optional
+from typing import Any, Callable, Iterator, List, Optional
 
 from clova.general.globals import global_config_prov
 
-from clova.processor.stt.base_stt import BaseSTTProvider
+from clova.processor.stt.base_stt import StreamingSTTProvider
+from clova.processor.audio.encoder import ENCODING_LINEAR16, STREAM_ENCODINGS, StreamEncoder
 
 from clova.general.logger import BaseLogger
 
 
-class GoogleCloudSpeechSTTProvider(BaseSTTProvider, BaseLogger):
+# ==================================
+#     ストリーミング認識 1 回分の状態
+# ==================================
+
+
+class _RecognitionStream:
+    # 破棄した認識のスレッドが、次の認識の結果を書き換えないよう 1 回ごとに分ける
+    def __init__(self) -> None:
+        self.chunks: "queue.Queue[Optional[bytes]]" = queue.Queue()
+        self.results: List[str] = []
+        self.error: Optional[Exception] = None
+        self.thread: Optional[threading.Thread] = None
+        self.lock = threading.Lock()
+        self.responses: Any = None  # streaming_recognize の応答 (cancel() で通信中の要求を中止できる)
+        self.encoder: Optional[StreamEncoder] = None  # 圧縮して送る場合の逐次エンコーダ
+        self.cancelled = False
+
+    # 通信中の要求を中止する (応答を受け取る前なら、受け取った時点で中止する)
+    def cancel(self) -> None:
+        with self.lock:
+            self.cancelled = True
+            responses = self.responses
+        if self.encoder is not None:
+            self.encoder.cancel()
+        self.chunks.put(None)
+        if responses is not None:
+            responses.cancel()
+
+
+# ==================================
+#   Google Cloud Speech 音声認識クラス
+# ==================================
+
+
+class GoogleCloudSpeechSTTProvider(StreamingSTTProvider, BaseLogger):
     GOOGLE_SPEECH_RATE = 16000
+    ENCODINGS = {
+        "LINEAR16": speech.RecognitionConfig.AudioEncoding.LINEAR16,
+        "FLAC": speech.RecognitionConfig.AudioEncoding.FLAC,
+        "OGG_OPUS": speech.RecognitionConfig.AudioEncoding.OGG_OPUS,
+    }
+    SUPPORTED_ENCODINGS = tuple(ENCODINGS.keys())
+    STREAM_FINISH_TIMEOUT = 10  # 音声送信終了から最終結果を待つ最大時間 (秒)
 
     def __init__(self) -> None:
         super().__init__()
 
         self._client_speech = speech.SpeechClient()
 
+        self._stream: Optional[_RecognitionStream] = None
+
     def __del__(self) -> None:
         super().__del__()
 
-    def stt(self, audio: bytes, **kwargs: str) -> Optional[str]:
-        self.log("stt", "音声からテキストに変換中(Google Cloud Speech)")
+    # 送信する音声の形式
+    # ストリーミング認識は録音中のチャンクを逐次圧縮できる形式のみ (それ以外は LINEAR16 で送る)
+    def _encoding(self, streaming: bool, **kwargs: str) -> str:
+        encoding = kwargs.get("encoding", ENCODING_LINEAR16)
+        if streaming and encoding not in STREAM_ENCODINGS:
+            self.log("_encoding", "ストリーミング認識は {} に対応していないため {} で送信します ({} を指定してください)".format(
+                encoding, ENCODING_LINEAR16, " / ".join(STREAM_ENCODINGS)))
+            return ENCODING_LINEAR16
+        return encoding
 
+    def _recognition_config(self, encoding: str, language: str) -> speech.RecognitionConfig:
         # Speech-to-Text の認識設定
-        config = speech.RecognitionConfig(
-            encoding=speech.RecognitionConfig.AudioEncoding.LINEAR16,
+        return speech.RecognitionConfig(
+            encoding=self.ENCODINGS[encoding],
             sample_rate_hertz=self.GOOGLE_SPEECH_RATE,
-            language_code=kwargs["language"],
+            language_code=language,
             enable_automatic_punctuation=True,
         )
 
+    def stt(self, audio: bytes, **kwargs: str) -> Optional[str]:
+        self.log("stt", "音声からテキストに変換中(Google Cloud Speech)")
+
+        # Speech-to-Text の認識設定
+        config = self._recognition_config(self._encoding(False, **kwargs), kwargs["language"])
+
         # Speech-to-Text の音声設定
         speech_audio = speech.RecognitionAudio(content=audio)
 
@@ -47,3 +108,92 @@ class GoogleCloudSpeechSTTProvider(BaseSTTProvider, BaseLogger):
             result = None
 
         return result
+
+    def stream_start(self, on_interim: Optional[Callable[[str], None]], **kwargs: str) -> None:
+        self.log("stream_start", "ストリーミング認識開始(Google Cloud Speech)")
+
+        self.stream_cancel()
+        stream = _RecognitionStream()
+        encoding = self._encoding(True, **kwargs)
+        streaming_config = speech.StreamingRecognitionConfig(config=self._recognition_config(encoding, kwargs["language"]), interim_results=True)
+        if encoding != ENCODING_LINEAR16:
+            # 録音と並行して圧縮し、できた分から送る
+            stream.encoder = StreamEncoder(encoding, self.GOOGLE_SPEECH_RATE, stream.chunks.put)
+        stream.thread = threading.Thread(target=self._stream_worker, args=(stream, streaming_config, on_interim), daemon=True)
+        stream.thread.start()
+        self._stream = stream
+
+    def _stream_requests(self, chunks: "queue.Queue[Optional[bytes]]") -> Iterator[speech.StreamingRecognizeRequest]:
+        while True:
+            chunk = chunks.get()
+            if chunk is None:
+                return
+            yield speech.StreamingRecognizeRequest(audio_content=chunk)
+
+    def _stream_worker(self, stream: _RecognitionStream, streaming_config: speech.StreamingRecognitionConfig,
+                       on_interim: Optional[Callable[[str], None]]) -> None:
+        try:
+            responses: Any = self._client_speech.streaming_recognize(config=streaming_config, requests=self._stream_requests(stream.chunks))  # type: ignore[call-arg]
+            with stream.lock:
+                stream.responses = responses
+                cancelled = stream.cancelled
+            if cancelled:
+                responses.cancel()
+                return
+
+            for response in responses:
+                for result in response.results:
+                    if len(result.alternatives) == 0:
+                        continue
+                    transcript = result.alternatives[0].transcript.strip()
+                    if result.is_final:
+                        stream.results.append(transcript)
+                    elif on_interim is not None:
+                        on_interim("".join(stream.results) + transcript)
+        except Exception as e:
+            if not stream.cancelled:
+                stream.error = e
+
+    def stream_write(self, chunk: bytes) -> None:
+        if self._stream is None:
+            return
+        if self._stream.encoder is not None:
+            self._stream.encoder.write(chunk)
+        else:
+            self._stream.chunks.put(chunk)
+
+    def stream_finish(self) -> Optional[str]:
+        stream, self._stream = self._stream, None
+        assert stream is not None and stream.thread is not None
+
+        # 圧縮して送る場合は、残りの出力を送り終えてから終了する
+        if stream.encoder is not None:
+            try:
+                stream.encoder.finish(self.STREAM_FINISH_TIMEOUT)
+            except Exception:
+                stream.cancel()
+                raise
+        stream.chunks.put(None)
+        thread = stream.thread
+        thread.join(self.STREAM_FINISH_TIMEOUT)
+
+        if thread.is_alive():
+            stream.cancel()
+            raise TimeoutError("streaming_recognize did not finish in time")
+        if stream.error is not None:
+            raise stream.error
+
+        result = "".join(stream.results)
+        if global_config_prov.verbose():
+            self.log("stream_finish", stream.results)  # デバッグ用
+        if result == "":
+            self.log("stream_finish", "音声取得に失敗")
+            return None
+
+        return result
+
+    def stream_cancel(self) -> None:
+        if self._stream is not None:
+            self.log("stream_cancel", "ストリーミング認識を中止します")
+            self._stream.cancel()
+        self._stream = None
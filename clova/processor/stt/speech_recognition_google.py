@@ -10,6 +10,9 @@ GOOGLE_SPEECH_RATE = 16000
 
 
 class SpeechRecognitionGoogleSTTProvider(BaseSTTProvider, BaseLogger):
+    # recognize_google() は送信時に自前で FLAC に変換するため、PCM のまま受け取る
+    SUPPORTED_ENCODINGS = ("LINEAR16", )
+
     def __init__(self) -> None:
         super().__init__()
 
@@ -0,0 +1,266 @@
+import io
+import os
+import json
+import wave
+import hashlib
+import threading
+import unicodedata
+import collections
+import numpy as np
+
+from typing import Any, Callable, Dict, Mapping, Optional
+
+from clova.processor.audio.decoder import decode_audio
+
+from clova.general.logger import BaseLogger
+
+TTS_CACHE_DIR = os.path.join(os.path.expanduser("~/.config"), "clova", "tts_cache")
+TTS_CACHE_DEFAULT_MAX_SIZE_MB = 64
+TTS_CACHE_DECODE_BLOCK = 8192  # 変換時のブロック長 (フレーム数)
+
+# ==================================
+#       合成音声キャッシュクラス
+# ==================================
+
+
+class _Flight:
+    # 同じキーの合成を待っているスレッドに結果を渡す
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Optional[bytes] = None
+
+
+class TTSCache(BaseLogger):
+    # 音声合成の結果を、再生ストリームの形式 (サンプリングレート・チャンネル数) の WAV に変換してディスクに保存する
+    #   - キーは TTS の種類・パラメータ (声の種類や速さ)・正規化したテキスト・再生形式のハッシュ
+    #   - 合計サイズが max_bytes を超えたら、最後に使ってから時間が経ったものから削除する (使った時にファイルの更新時刻を更新し、再起動後も順序を保つ)
+    #   - 同じキーの合成が同時に要求された場合は 1 回だけ合成し、結果を共有する
+    #   - 保存した音声は再生ストリームと同じ形式なので、再生時のリサンプリングも不要
+
+    # コンストラクタ
+    def __init__(self, rate: int, num_ch: int, max_bytes: int = TTS_CACHE_DEFAULT_MAX_SIZE_MB * 1024 * 1024, cache_dir: str = TTS_CACHE_DIR) -> None:
+        super().__init__()
+
+        self.rate = rate
+        self.num_ch = num_ch
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._flights: Dict[str, _Flight] = {}
+        self._entries: "collections.OrderedDict[str, int]" = collections.OrderedDict()  # キー -> サイズ (古い順)
+        self._total_bytes = 0
+        self._load_index()
+
+    # デストラクタ
+    def __del__(self) -> None:
+        super().__del__()
+
+    # 読み上げが変わらない範囲でテキストを揃える (全角英数字・空白の違いなど)
+    @staticmethod
+    def normalize_text(text: str) -> str:
+        return " ".join(unicodedata.normalize("NFKC", text).split())
+
+    def make_key(self, system: str, params: Mapping[str, Any], text: str) -> str:
+        source = json.dumps({"system": system, "params": params, "text": self.normalize_text(text), "rate": self.rate, "num_ch": self.num_ch},
+                            sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + ".wav")
+
+    # 保存済みのファイルを、最後に使った順に並べる
+    def _load_index(self) -> None:
+        try:
+            names = [n for n in os.listdir(self.cache_dir) if n.endswith(".wav")]
+        except OSError:
+            names = []
+
+        entries = []
+        for name in names:
+            try:
+                stat = os.stat(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime_ns, name[:-4], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._entries[key] = size
+            self._total_bytes += size
+        self.log("_load_index", "{} 件 ({:.1f}MB) / 上限 {:.1f}MB".format(len(self._entries), self._total_bytes / 1048576, self.max_bytes / 1048576))
+
+    # キャッシュにあれば返し、無ければ synthesize() で合成して保存する
+    # synthesize() が None を返した場合は保存せずに None を返す
+    def get(self, system: str, params: Mapping[str, Any], text: str, synthesize: Callable[[], Optional[bytes]]) -> Optional[bytes]:
+        key = self.make_key(system, params, text)
+
+        with self._lock:
+            audio = self._read(key)
+            if audio is not None:
+                self.hits += 1
+                return audio
+
+            flight = self._flights.get(key)
+            owner = flight is None
+            if flight is None:
+                flight = self._flights[key] = _Flight()
+                self.misses += 1
+
+        if not owner:
+            self.log("get", "合成中の同じ音声を待ちます: {}".format(text))
+            flight.done.wait()
+            return flight.result
+
+        try:
+            flight.result = self._synthesize(key, text, synthesize)
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.result
+
+    # 保存済みの音声を読む (ロックを取った状態で呼ぶ)
+    def _read(self, key: str) -> Optional[bytes]:
+        if key not in self._entries:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                audio = f.read()
+            os.utime(path)
+        except OSError:
+            self._total_bytes -= self._entries.pop(key)
+            return None
+        self._entries.move_to_end(key)
+        return audio
+
+    def _synthesize(self, key: str, text: str, synthesize: Callable[[], Optional[bytes]]) -> Optional[bytes]:
+        audio = synthesize()
+        if audio is None:
+            return None
+
+        # 再生ストリームの形式に変換する (変換できない場合は保存せずにそのまま返す)
+        try:
+            frames = np.concatenate([np.zeros((0, self.num_ch), dtype=np.float32)] + list(decode_audio(audio, self.rate, self.num_ch, TTS_CACHE_DECODE_BLOCK)))
+        except Exception as e:
+            self.log("_synthesize", "変換できないため保存しません:{}".format(e))
+            return audio
+
+        buf = io.BytesIO()
+        with wave.open(buf, "wb") as wav:
+            wav.setnchannels(self.num_ch)
+            wav.setsampwidth(2)
+            wav.setframerate(self.rate)
+            wav.writeframes(np.clip(np.rint(frames), -32768, 32767).astype("<i2").tobytes())
+        pcm = buf.getvalue()
+
+        with self._lock:
+            self._write(key, pcm)
+        self.log("_synthesize", "保存しました ({:.2f}秒): {}".format(len(frames) / self.rate, text))
+        return pcm
+
+    # 保存し、上限を超えた分を古いものから削除する (ロックを取った状態で呼ぶ)
+    def _write(self, key: str, pcm: bytes) -> None:
+        if len(pcm) > self.max_bytes:
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = self._path(key) + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(pcm)
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            self.log("_write", "保存できません:{}".format(e))
+            return
+
+        self._total_bytes += len(pcm) - self._entries.pop(key, 0)
+        self._entries[key] = len(pcm)
+        while self._total_bytes > self.max_bytes:
+            old_key, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                os.remove(self._path(old_key))
+            except OSError:
+                pass
+
+    @property
+    def total_bytes(self) -> int:
+        with self._lock:
+            return self._total_bytes
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+# ==================================
+#       本クラスのテスト用処理
+# ==================================
+
+
+def module_test() -> None:
+    import time
+    import tempfile
+
+    def tone_wav(seconds: float) -> bytes:
+        buf = io.BytesIO()
+        with wave.open(buf, "wb") as w:
+            w.setnchannels(1)
+            w.setsampwidth(2)
+            w.setframerate(24000)
+            w.writeframes((np.sin(np.arange(int(24000 * seconds)) / 24000 * 2 * np.pi * 440) * 8000).astype(np.int16).tobytes())
+        return buf.getvalue()
+
+    calls = []
+
+    def synthesize(text: str) -> Callable[[], Optional[bytes]]:
+        def run() -> Optional[bytes]:
+            calls.append(text)
+            time.sleep(0.1)
+            return tone_wav(0.5)
+        return run
+
+    params = {"name": "ja-JP-Standard-A", "speed": "0.0"}
+    with tempfile.TemporaryDirectory() as tmp:
+        # 0.5 秒 (44.1kHz ステレオで約 88KB) を 2 つまで保存できる
+        cache = TTSCache(44100, 2, 200 * 1024, tmp)
+
+        # 同時に同じテキストを要求しても合成は 1 回
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get("VoiceVox", params, "はい。何でしょう。", synthesize("A")))) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert calls == ["A"] and len(set(results)) == 1 and results[0] is not None
+        with wave.open(io.BytesIO(results[0])) as w:
+            assert (w.getframerate(), w.getnchannels(), w.getnframes()) == (44100, 2, 22050)
+
+        # 前後の空白・全角の違いは同じキー、声のパラメータが違えば別のキー
+        assert cache.get("VoiceVox", params, "  はい。何でしょう。\n", synthesize("A2")) == results[0]
+        assert cache.get("VoiceVox", {"name": "ja-JP-Standard-A", "speed": "0.5"}, "はい。何でしょう。", synthesize("B")) is not None
+        assert calls == ["A", "B"] and cache.hits == 1 and cache.misses == 2
+
+        # 上限を超えたら最後に使ってから時間が経ったもの (B) を削除
+        cache.get("VoiceVox", params, "はい。何でしょう。", synthesize("A3"))
+        cache.get("VoiceVox", params, "ボリュームを７に設定しました。", synthesize("C"))
+        assert len(cache) == 2 and cache.total_bytes <= 200 * 1024
+        assert cache.get("VoiceVox", {"name": "ja-JP-Standard-A", "speed": "0.5"}, "はい。何でしょう。", synthesize("B2")) is not None
+        assert calls == ["A", "B", "C", "B2"]
+
+        # 再起動後もディスクから読む (ボリューム 7 は全角・半角で同じ)
+        cache = TTSCache(44100, 2, 200 * 1024, tmp)
+        assert len(cache) == 2
+        assert cache.get("VoiceVox", params, "ボリュームを7に設定しました。", synthesize("C2")) is not None and calls[-1] == "B2"
+
+        # 合成に失敗した場合は保存しない
+        assert cache.get("VoiceVox", params, "失敗", lambda: None) is None and len(cache) == 2
+    print("TTSCache OK")
+
+
+# ==================================
+# 本モジュールを直接呼出した時の処理
+# ==================================
+if __name__ == "__main__":
+    module_test()
@@ -0,0 +1,234 @@
+import threading
+
+from typing import List, Optional, Tuple
+
+from clova.processor.conversation.sentence import SentenceSplitter
+
+from clova.general.logger import BaseLogger
+
+TTS_CHUNK_DEFAULT_FIRST_DURATION = 0.6  # 最初のまとまりの合成時間の目安 (秒)
+TTS_CHUNK_DEFAULT_TARGET_DURATION = 2.0  # 2 つ目以降のまとまりの合成時間の目安 (秒)
+
+# ==================================
+#        音声合成の速さの推定
+# ==================================
+
+
+class SynthesisRate:
+    # 実際に音声合成にかかった時間から、合成時間 = 固定のオーバーヘッド + 1 文字あたりの時間 × 文字数 を推定する
+    #   - 古い計測ほど軽くする重み付き最小二乗 (TTS の種類・通信状況の変化に追従する)
+    #   - 計測が少ないうちは初期値 (DEFAULT_*) に寄せる
+    DEFAULT_OVERHEAD = 0.2  # 秒
+    DEFAULT_SECONDS_PER_CHAR = 0.05  # 秒
+    DECAY = 0.9  # 1 回の計測ごとに過去の重みに掛ける係数
+    PRIOR_CHARS = (10, 40)  # 初期値の仮の計測点 (文字数)
+
+    # コンストラクタ
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.reset()
+
+    # 計測をすべて捨てて初期値に戻す (TTS の種類が変わった時など)
+    def reset(self) -> None:
+        with self._lock:
+            self._w = self._wn = self._wt = self._wnn = self._wnt = 0.0
+            for chars in self.PRIOR_CHARS:
+                self._add(chars, self.DEFAULT_OVERHEAD + self.DEFAULT_SECONDS_PER_CHAR * chars)
+
+    # 合成した文字数と、かかった時間 (秒) を記録する (複数のスレッドから呼ばれる)
+    def record(self, chars: int, seconds: float) -> None:
+        if chars <= 0 or seconds < 0.0:
+            return
+        with self._lock:
+            self._w *= self.DECAY
+            self._wn *= self.DECAY
+            self._wt *= self.DECAY
+            self._wnn *= self.DECAY
+            self._wnt *= self.DECAY
+            self._add(chars, seconds)
+
+    def _add(self, chars: float, seconds: float) -> None:
+        self._w += 1.0
+        self._wn += chars
+        self._wt += seconds
+        self._wnn += chars * chars
+        self._wnt += chars * seconds
+
+    # (オーバーヘッド, 1 文字あたりの時間)
+    def estimate(self) -> Tuple[float, float]:
+        with self._lock:
+            det = self._w * self._wnn - self._wn * self._wn
+            per_char = (self._w * self._wnt - self._wn * self._wt) / det if det > 1e-9 else 0.0
+            if per_char <= 1e-4:
+                # 文字数によらず同じ時間がかかっている (または計測が 1 点に偏っている) 場合は、平均から求める
+                per_char = max(self._wt / self._wn, 1e-4)
+                return 0.0, per_char
+            overhead = max(0.0, (self._wt - per_char * self._wn) / self._w)
+            return overhead, per_char
+
+    # seconds 秒で合成できる文字数
+    def chars_for(self, seconds: float) -> int:
+        overhead, per_char = self.estimate()
+        return int(max(0.0, seconds - overhead) / per_char)
+
+
+# ==================================
+#       読み上げ単位の区切りクラス
+# ==================================
+
+
+class UtteranceChunker(BaseLogger):
+    # 応答の文字列を、音声合成 1 回分のまとまり (チャンク) に区切り直す
+    #   - 最初のチャンクは最初の文だけにして (長ければ読点で分けて)、すぐに合成・再生を始める
+    #   - 2 つ目以降は、合成時間が target_duration 程度になるまで短い文・行をまとめる (見出しの一覧など)
+    #   - 長い文は読点・空白で分ける (記事の本文など)
+    #   合成時間は SynthesisRate の推定から文字数に換算する
+    MIN_CHARS = 8  # チャンクの文字数の下限 (短すぎると合成の回数が増えるだけ)
+    MAX_CHARS = 200  # チャンクの文字数の上限 (速い TTS でも 1 回の要求を大きくしすぎない)
+    SOFT_BREAKS = "、，,　 "  # 長い文を分ける位置 (この文字の直後)
+    JOINABLE_ENDS = SentenceSplitter.TERMINATORS + SentenceSplitter.CLOSERS + SOFT_BREAKS
+
+    # コンストラクタ
+    def __init__(self, rate: SynthesisRate, first_duration: float = TTS_CHUNK_DEFAULT_FIRST_DURATION,
+                 target_duration: float = TTS_CHUNK_DEFAULT_TARGET_DURATION) -> None:
+        super().__init__()
+
+        self.rate = rate
+        self.first_duration = first_duration
+        self.target_duration = target_duration
+        self._buffer = ""
+        self._first = True
+
+    # デストラクタ
+    def __del__(self) -> None:
+        super().__del__()
+
+    # 区切りまで揃った文字列 (1 つ以上の文・行) を追加し、完成したチャンクを返す
+    def add(self, text: str) -> List[str]:
+        splitter = SentenceSplitter()
+        chunks: List[str] = []
+        for sentence in splitter.feed(text) + splitter.flush():
+            for piece in self._split_long(sentence, self._limit()):
+                if self._first:
+                    chunks.append(piece)
+                    self._first = False
+                    continue
+
+                limit = self._limit()
+                if self._buffer and len(self._buffer) + len(piece) > limit:
+                    chunks.append(self._buffer)
+                    self._buffer = ""
+                self._buffer = self._join(self._buffer, piece)
+                if len(self._buffer) >= limit:
+                    chunks.append(self._buffer)
+                    self._buffer = ""
+        return chunks
+
+    # まとめている途中のチャンクを返す (応答の終わりや、再生する音声が尽きた時に呼ぶ)
+    def drain(self) -> List[str]:
+        chunk = self._buffer
+        self._buffer = ""
+        return [chunk] if chunk else []
+
+    # まとめている途中のチャンクがあるか
+    @property
+    def pending(self) -> bool:
+        return self._buffer != ""
+
+    # 一度に決まった文字列を区切る
+    def split(self, text: str) -> List[str]:
+        return self.add(text) + self.drain()
+
+    # 次のチャンクの文字数の目安
+    def _limit(self) -> int:
+        return self._chars(self.first_duration if self._first else self.target_duration)
+
+    def _chars(self, duration: float) -> int:
+        return min(max(self.rate.chars_for(duration), self.MIN_CHARS), self.MAX_CHARS)
+
+    # 文・行をつなぐ (区切りの記号が無い行の間には「。」を入れて、間を空けて読ませる)
+    def _join(self, head: str, tail: str) -> str:
+        if head and head[-1] not in self.JOINABLE_ENDS:
+            head += "。"
+        return head + tail
+
+    # limit 文字 (2 つ目以降は target_duration 分の文字数) を超える文を、読点・空白の位置で分ける
+    # 分けられる位置が無ければ、MAX_CHARS を超える場合だけ文字数で分ける
+    def _split_long(self, sentence: str, limit: int) -> List[str]:
+        pieces: List[str] = []
+        rest = sentence
+        while len(rest) > limit:
+            cut = self._find_break(rest, limit)
+            if cut is None:
+                if len(rest) <= self.MAX_CHARS:
+                    break
+                cut = limit
+            pieces.append(rest[:cut].strip())
+            rest = rest[cut:].strip()
+            limit = self._chars(self.target_duration)
+        if rest:
+            pieces.append(rest)
+        return pieces
+
+    # limit 文字以内の最後の区切り位置 (無ければ limit 文字より後の最初の区切り位置)
+    def _find_break(self, text: str, limit: int) -> Optional[int]:
+        breaks = [i + 1 for i, c in enumerate(text[:-1]) if c in self.SOFT_BREAKS and i + 1 >= self.MIN_CHARS]
+        if not breaks:
+            return None
+        within = [b for b in breaks if b <= limit]
+        return within[-1] if within else breaks[0]
+
+
+# ==================================
+#       本クラスのテスト用処理
+# ==================================
+
+
+def module_test() -> None:
+    # 合成時間の推定: 0.3 秒 + 0.02 秒/文字 の TTS
+    rate = SynthesisRate()
+    for chars in [5, 20, 40, 10, 60, 30] * 5:
+        rate.record(chars, 0.3 + 0.02 * chars)
+    overhead, per_char = rate.estimate()
+    print("overhead={:.3f}, per_char={:.4f}".format(overhead, per_char))
+    assert abs(overhead - 0.3) < 0.05 and abs(per_char - 0.02) < 0.003
+    assert 80 <= rate.chars_for(2.0) <= 90 and 10 <= rate.chars_for(0.6) <= 20
+
+    # 見出しの一覧: 最初の行はそのまま、以降の短い行はまとめる
+    chunker = UtteranceChunker(rate)
+    headlines = ["以下のニュースがあります。"] + ["{}. 見出しの例その{}".format(i, i) for i in range(1, 13)] + ["詳細を知りたい番号を1から12で選んでください。"]
+    chunks = []
+    for line in headlines:
+        chunks += chunker.add(line)
+    assert chunker.pending
+    chunks += chunker.drain()
+    assert not chunker.pending
+    print(chunks)
+    assert chunks[0] == "以下のニュースがあります。"
+    assert 2 <= len(chunks) - 1 <= 4 and all(len(c) <= rate.chars_for(2.0) for c in chunks[1:])
+    assert "1. 見出しの例その1。2. 見出しの例その2" in chunks[1]
+
+    # 記事の本文: 最初の文はそのまま、以降は長い文を読点で分ける
+    body = ("政府は十八日、新しい経済対策を発表しました。" + "対策には、中小企業への支援、エネルギー価格の抑制、子育て世帯への給付などが含まれ、総額は前年を上回る見通しです。" * 3)
+    chunks = UtteranceChunker(rate).split(body)
+    print(chunks)
+    assert chunks[0] == "政府は十八日、新しい経済対策を発表しました。"
+    assert "".join(chunks).replace("。", "") == body.replace("。", "")
+    assert all(len(c) <= UtteranceChunker.MAX_CHARS for c in chunks) and len(chunks) < 10
+
+    # 遅い TTS ではチャンクが短くなる
+    slow = SynthesisRate()
+    for _ in range(20):
+        slow.record(40, 0.5 + 0.1 * 40)
+    assert UtteranceChunker(slow)._limit() == UtteranceChunker.MIN_CHARS
+    chunks = UtteranceChunker(slow).split(body)
+    print(chunks)
+    assert len(chunks) > 10 and all(c[-1] in "、。" for c in chunks)
+    print("UtteranceChunker OK")
+
+
+# ==================================
+# 本モジュールを直接呼出した時の処理
+# ==================================
+if __name__ == "__main__":
+    module_test()
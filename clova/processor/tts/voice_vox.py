@@ -1,25 +1,43 @@
+import io
 import os
 import requests
 import json
 import time
+import wave
+import zipfile
+import threading
+import collections
 
-from typing import Optional
+from typing import List, Optional, Tuple
 
 from clova.general.globals import global_config_prov
 
 from clova.processor.tts.base_tts import BaseTTSProvider
+from clova.processor.conversation.sentence import SentenceSplitter
 
 from clova.general.logger import BaseLogger
 
+VOICEVOX_TIMEOUT = (3.05, 30.0)  # (接続, 応答) のタイムアウト (秒)
+VOICEVOX_AUDIO_QUERY_CACHE_SIZE = 256  # audio_query の結果を覚えておく件数
+
 
 class VoiceVoxTTSProvider(BaseTTSProvider, BaseLogger):
+    # audio_query の結果は、キャラクタの切り替えでインスタンスを作り直しても使えるように共有する
+    _audio_query_cache: "collections.OrderedDict[Tuple[str, str, str], bytes]" = collections.OrderedDict()
+    _audio_query_lock = threading.Lock()
+
     def __init__(self) -> None:
         super().__init__()
 
+        # 接続を使い回す (先読みのスレッドからも同時に使われる)
+        # 環境変数が無く例外で抜けてもデストラクタが参照できるよう、先に作っておく
+        self._session = requests.Session()
+
         self.web_voicevox_api_key = os.environ["WEB_VOICEVOX_API_KEY"]
         self.voicevox_custom_api_endpoint = os.environ["VOICEVOX_CUSTOM_API_ENDPOINT"]
 
     def __del__(self) -> None:
+        self._session.close()
         super().__del__()
 
     def tts(self, text: str, **kwargs: str) -> Optional[bytes]:
@@ -38,7 +56,7 @@ class VoiceVoxTTSProvider(BaseTTSProvider, BaseLogger):
 
         try:
             # APIにリクエストを送信してデータを取得
-            res = requests.post(url, data=params)
+            res = self._session.post(url, data=params, timeout=VOICEVOX_TIMEOUT)
 
             # HTTPエラーがあれば例外を発生させる
             res.raise_for_status()
@@ -55,7 +73,7 @@ class VoiceVoxTTSProvider(BaseTTSProvider, BaseLogger):
                     if global_config_prov.verbose():
                         self.log("tts", "webDownloadUrl = '{}'".format(res_json["wavDownloadUrl"]))
 
-                    response = requests.get(res_json["wavDownloadUrl"])
+                    response = self._session.get(res_json["wavDownloadUrl"], timeout=VOICEVOX_TIMEOUT)
 
                     if (response.status_code == 200):
                         break
@@ -83,21 +101,188 @@ class VoiceVoxTTSProvider(BaseTTSProvider, BaseLogger):
 
         return None
 
+    # VOICEVOX Engine (https://github.com/VOICEVOX/voicevox_engine/blob/master/README.md) で合成する
+    # 複数の文を含む場合は、文ごとの audio_query (キャッシュ) を 1 回の /multi_synthesis で合成してつなげる
     def _tts_engine(self, text: str, **kwargs: str) -> Optional[bytes]:
         self.log("_tts_engine", "_tts_engineに自動移管")
 
-        # impl of https://github.com/VOICEVOX/voicevox_engine/blob/master/README.md
+        splitter = SentenceSplitter()
+        sentences = splitter.feed(text) + splitter.flush()
+        if len(sentences) <= 1:
+            return self._synthesize_engine([text], str(kwargs["x_voice_vox_id"]), False)[0]
+
+        wavs = self._synthesize_engine(sentences, str(kwargs["x_voice_vox_id"]), True)
+        if any(wav is None for wav in wavs):
+            return None
+        try:
+            return self._join_wav([wav for wav in wavs if wav is not None])
+        except (wave.Error, EOFError) as e:
+            self.log("_tts_engine", "WAV の連結エラー:{}".format(e))
+            return None
+
+    # multi: /multi_synthesis で合成する (False の場合は texts[0] を /synthesis で合成する)
+    def _synthesize_engine(self, texts: List[str], speaker: str, multi: bool) -> List[Optional[bytes]]:
         try:
-            phrase = requests.post(self.voicevox_custom_api_endpoint + "/audio_query", params={
-                "speaker": kwargs["x_voice_vox_id"],
-                "text": text
-            })
-            phrase.raise_for_status()
+            queries = [self._audio_query(speaker, text) for text in texts]
 
-            res = requests.post(self.voicevox_custom_api_endpoint + "/synthesis", params={"speaker": kwargs["x_voice_vox_id"]}, data=phrase.content)
-            res.raise_for_status()
+            if not multi:
+                res = self._session.post(self.voicevox_custom_api_endpoint + "/synthesis", params={"speaker": speaker}, data=queries[0],
+                                         headers={"Content-Type": "application/json"}, timeout=VOICEVOX_TIMEOUT)
+                res.raise_for_status()
+                return [res.content]
 
-            return res.content
+            # 結果は文の順に WAV を格納した zip
+            res = self._session.post(self.voicevox_custom_api_endpoint + "/multi_synthesis", params={"speaker": speaker}, data=b"[" + b",".join(queries) + b"]",
+                                     headers={"Content-Type": "application/json"}, timeout=VOICEVOX_TIMEOUT)
+            res.raise_for_status()
+            with zipfile.ZipFile(io.BytesIO(res.content)) as archive:
+                wavs: List[Optional[bytes]] = [archive.read(name) for name in sorted(archive.namelist())]
+            if len(wavs) != len(texts):
+                self.log("_synthesize_engine", "/multi_synthesis の結果の数が合いません ({} != {})".format(len(wavs), len(texts)))
+                return [None] * len(texts)
+            return wavs
         except Exception as e:
-            self.log("_tts_engine", e)
-            return None
+            self.log("_synthesize_engine", e)
+            return [None] * len(texts)
+
+    # 読み・アクセントの解析結果 (同じ話者・文字列は前回の結果を使う)
+    def _audio_query(self, speaker: str, text: str) -> bytes:
+        key = (self.voicevox_custom_api_endpoint, speaker, text)
+        with self._audio_query_lock:
+            query = self._audio_query_cache.get(key)
+            if query is not None:
+                self._audio_query_cache.move_to_end(key)
+                return query
+
+        res = self._session.post(self.voicevox_custom_api_endpoint + "/audio_query", params={"speaker": speaker, "text": text}, timeout=VOICEVOX_TIMEOUT)
+        res.raise_for_status()
+        query = res.content
+
+        with self._audio_query_lock:
+            self._audio_query_cache[key] = query
+            while len(self._audio_query_cache) > VOICEVOX_AUDIO_QUERY_CACHE_SIZE:
+                self._audio_query_cache.popitem(last=False)
+        return query
+
+    # 同じ形式の WAV をつなげる
+    @staticmethod
+    def _join_wav(wavs: List[bytes]) -> bytes:
+        params: Optional[Tuple[int, int, int]] = None
+        frames = []
+        for wav in wavs:
+            with wave.open(io.BytesIO(wav)) as r:
+                wav_params = (r.getnchannels(), r.getsampwidth(), r.getframerate())
+                if params is not None and wav_params != params:
+                    raise wave.Error("形式が異なります {} != {}".format(wav_params, params))
+                params = wav_params
+                frames.append(r.readframes(r.getnframes()))
+        assert params is not None
+
+        buf = io.BytesIO()
+        with wave.open(buf, "wb") as w:
+            w.setnchannels(params[0])
+            w.setsampwidth(params[1])
+            w.setframerate(params[2])
+            w.writeframes(b"".join(frames))
+        return buf.getvalue()
+
+
+# ==================================
+#       本クラスのテスト用処理
+# ==================================
+
+
+def module_test() -> None:
+    import socketserver
+    from http.server import BaseHTTPRequestHandler
+    from urllib.parse import parse_qs, urlparse
+
+    requests_log: List[Tuple[str, int]] = []
+
+    def tone_wav(text: str) -> bytes:
+        buf = io.BytesIO()
+        with wave.open(buf, "wb") as w:
+            w.setnchannels(1)
+            w.setsampwidth(2)
+            w.setframerate(24000)
+            w.writeframes(b"\x00\x00" * 2400 * len(text))  # 1 文字 0.1 秒
+        return buf.getvalue()
+
+    # VOICEVOX Engine の代わりのサーバー (audio_query の結果には文字列をそのまま入れる)
+    class EngineHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self) -> None:
+            url = urlparse(self.path)
+            params = parse_qs(url.query)
+            body = self.rfile.read(int(self.headers.get("Content-Length", "0")))
+            requests_log.append((url.path, self.client_address[1]))
+
+            if url.path == "/audio_query":
+                content = json.dumps({"accent_phrases": [], "kana": params["text"][0], "speedScale": 1.0}).encode()
+            elif url.path == "/synthesis":
+                content = tone_wav(json.loads(body)["kana"])
+            elif url.path == "/multi_synthesis":
+                buf = io.BytesIO()
+                with zipfile.ZipFile(buf, "w") as archive:
+                    for i, query in enumerate(json.loads(body)):
+                        archive.writestr("{:03}.wav".format(i + 1), tone_wav(query["kana"]))
+                content = buf.getvalue()
+            else:
+                self.send_error(404)
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        def log_message(self, format: str, *args: object) -> None:
+            pass
+
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), EngineHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    os.environ.setdefault("WEB_VOICEVOX_API_KEY", "")
+    os.environ["VOICEVOX_CUSTOM_API_ENDPOINT"] = "http://127.0.0.1:{}".format(server.server_address[1])
+    tts = VoiceVoxTTSProvider()
+
+    def frames(wav: Optional[bytes]) -> int:
+        assert wav is not None
+        with wave.open(io.BytesIO(wav)) as r:
+            return int(r.getnframes())
+
+    # 1 文: audio_query と synthesis
+    assert frames(tts.tts("こんにちは。", x_voice_vox_id="1")) == 2400 * 6
+    # 同じ文は audio_query を省く
+    assert frames(tts.tts("こんにちは。", x_voice_vox_id="1")) == 2400 * 6
+    assert [path for path, _ in requests_log] == ["/audio_query", "/synthesis", "/synthesis"]
+
+    # 複数の文: 新しい文の audio_query と、1 回の multi_synthesis
+    requests_log.clear()
+    assert frames(tts.tts("こんにちは。元気ですか？", x_voice_vox_id="1")) == 2400 * 12
+    assert [path for path, _ in requests_log] == ["/audio_query", "/multi_synthesis"]
+
+    # 話者が違えば別の audio_query
+    requests_log.clear()
+    assert frames(tts.tts("こんにちは。\nさようなら。", x_voice_vox_id="3")) == 2400 * 12
+    assert [path for path, _ in requests_log] == ["/audio_query", "/audio_query", "/multi_synthesis"]
+
+    # 接続は使い回す
+    assert len(set(port for _, port in requests_log)) == 1
+
+    # エンジンに接続できない場合は None
+    tts.voicevox_custom_api_endpoint = "http://127.0.0.1:1"
+    assert tts.tts("接続できない。", x_voice_vox_id="1") is None
+
+    server.shutdown()
+    server.server_close()
+    print("VoiceVoxTTSProvider OK")
+
+
+# ==================================
+# 本モジュールを直接呼出した時の処理
+# ==================================
+if __name__ == "__main__":
+    module_test()
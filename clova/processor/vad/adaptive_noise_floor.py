@@ -0,0 +1,132 @@
+import numpy as np
+
+from typing import Optional, Union
+
+from clova.processor.vad.base_vad import BaseVADProvider
+
+from clova.general.logger import BaseLogger
+
+
+class AdaptiveNoiseFloorVADProvider(BaseVADProvider, BaseLogger):
+    # 部屋の背景雑音レベル (ノイズフロア) を追従し、フレームエネルギーとゼロ交差率、ヒステリシスで発話を判定する
+    FRAME_DURATION = 10  # 判定フレーム長 (ms)
+
+    DEFAULT_PARAMS = {
+        "on_margin_db": 12.0,  # 発話開始: ノイズフロア + この値 (dB) を超える
+        "off_margin_db": 6.0,  # 発話継続: ノイズフロア + この値 (dB) を超えている間
+        "min_speech_dbfs": -55.0,  # これ未満のフレームは常に無音扱い
+        "max_zcr": 0.45,  # これを超えるゼロ交差率 (サンプル当たり) のフレームは雑音 (ヒスノイズ等) とみなす
+        "onset_frames": 3,  # 発話開始に必要な連続フレーム数
+        "hangover_frames": 8,  # しきい値を下回ってから無音と判定するまでのフレーム数
+        "floor_rise": 0.02,  # ノイズフロアの上昇追従係数 (ゆっくり)
+        "floor_fall": 0.3,  # ノイズフロアの下降追従係数 (すばやく)
+    }
+
+    def __init__(self, rate: int, num_ch: int, **kwargs: float) -> None:
+        super().__init__(rate, num_ch, **kwargs)
+
+        params = dict(self.DEFAULT_PARAMS)
+        params.update({k: float(v) for k, v in kwargs.items() if k in self.DEFAULT_PARAMS})
+        self.on_margin_db = params["on_margin_db"]
+        self.off_margin_db = params["off_margin_db"]
+        self.min_speech_dbfs = params["min_speech_dbfs"]
+        self.max_zcr = params["max_zcr"]
+        self.onset_frames = int(params["onset_frames"])
+        self.hangover_frames = int(params["hangover_frames"])
+        self.floor_rise = params["floor_rise"]
+        self.floor_fall = params["floor_fall"]
+        self.frame_len = int(rate * self.FRAME_DURATION / 1000)
+
+        self.noise_floor_db: Optional[float] = None
+        self._level = -100.0
+        self.reset()
+
+    def __del__(self) -> None:
+        super().__del__()
+
+    def reset(self) -> None:
+        self._in_speech = False
+        self._onset_count = 0
+        self._hangover_count = 0
+
+    def get_level(self) -> float:
+        return self._level
+
+    def process(self, chunk: Union[bytes, bytearray, memoryview]) -> bool:
+        mono = self.to_mono(chunk)
+        num_frames = len(mono) // self.frame_len
+        if num_frames == 0:
+            return self._in_speech
+
+        # フレーム単位の特徴量 (ベクトル演算)
+        frames = mono[:num_frames * self.frame_len].reshape(num_frames, self.frame_len)
+        energy_db = 10.0 * np.log10(np.mean(frames * frames, axis=1) + 1e-10)
+        zcr = np.mean(np.signbit(frames[:, 1:]) != np.signbit(frames[:, :-1]), axis=1)
+
+        self._level = float(energy_db.max())
+
+        if self.noise_floor_db is None:
+            self.noise_floor_db = float(np.median(energy_db))
+
+        # ヒステリシス付きの状態遷移 (フレーム数はチャンク当たり 10 程度)
+        chunk_has_speech = False
+        for e, z in zip(energy_db.tolist(), zcr.tolist()):
+            floor = self.noise_floor_db
+            above_on = e > max(floor + self.on_margin_db, self.min_speech_dbfs) and z < self.max_zcr
+            above_off = e > max(floor + self.off_margin_db, self.min_speech_dbfs)
+
+            if not self._in_speech:
+                self._onset_count = self._onset_count + 1 if above_on else 0
+                if self._onset_count >= self.onset_frames:
+                    self._in_speech = True
+                    self._hangover_count = 0
+                else:
+                    # 無音区間のみノイズフロアを更新する
+                    coef = self.floor_rise if e > floor else self.floor_fall
+                    self.noise_floor_db = floor + coef * (e - floor)
+            else:
+                if above_off:
+                    self._hangover_count = 0
+                else:
+                    self._hangover_count += 1
+                    if self._hangover_count >= self.hangover_frames:
+                        self._in_speech = False
+                        self._onset_count = 0
+
+            chunk_has_speech = chunk_has_speech or self._in_speech
+
+        return chunk_has_speech
+
+
+# ==================================
+#       本クラスのテスト用処理
+# ==================================
+
+
+def module_test() -> None:
+    rate = 16000
+    vad = AdaptiveNoiseFloorVADProvider(rate, 1)
+    rng = np.random.default_rng(0)
+    t = np.arange(rate // 10) / rate
+
+    noise = (rng.normal(size=(20, rate // 10)) * 200).astype(np.int16)
+    results = [vad.process(c.tobytes()) for c in noise]
+    assert vad.noise_floor_db is not None
+    print("noise: {} / floor={:.1f}dB".format(results, vad.noise_floor_db))
+    assert not any(results)
+
+    voice = (np.sin(2 * np.pi * 220 * t) * 8000).astype(np.int16) + noise[0]
+    results = [vad.process(voice.tobytes()) for _ in range(5)]
+    print("voice: {}".format(results))
+    assert all(results)
+
+    results = [vad.process(c.tobytes()) for c in noise]
+    print("noise: {}".format(results))
+    assert not results[-1]
+
+
+# ==================================
+# 本モジュールを直接呼出した時の処理
+# ==================================
+if __name__ == "__main__":
+    module_test()
@@ -0,0 +1,34 @@
+import numpy as np
+import numpy.typing as npt
+
+from abc import ABC, abstractmethod
+from typing import Union
+
+
+class BaseVADProvider(ABC):
+    def __init__(self, rate: int, num_ch: int, **kwargs: float) -> None:
+        self.rate = rate
+        self.num_ch = num_ch
+        super().__init__()
+
+    # S16_LE PCM (インタリーブ) をモノラルの float32 [-1.0, 1.0) に変換する
+    def to_mono(self, chunk: Union[bytes, bytearray, memoryview]) -> npt.NDArray[np.float32]:
+        pcm = np.frombuffer(chunk, dtype=np.int16)
+        if self.num_ch > 1:
+            return np.asarray(pcm.reshape(-1, self.num_ch).mean(axis=1), dtype=np.float32) / np.float32(32768.0)
+        return pcm.astype(np.float32) / np.float32(32768.0)
+
+    # 発話状態をリセットする (学習済みのノイズレベル等は保持)
+    @abstractmethod
+    def reset(self) -> None:
+        pass
+
+    # チャンクを処理し、発話中なら True を返す
+    @abstractmethod
+    def process(self, chunk: Union[bytes, bytearray, memoryview]) -> bool:
+        pass
+
+    # 直近のチャンクのレベル (ログ用、単位は実装依存)
+    @abstractmethod
+    def get_level(self) -> float:
+        pass
@@ -0,0 +1,240 @@
+import time
+import threading
+import collections
+import numpy as np
+import numpy.typing as npt
+
+from typing import Any, Deque, Dict, List, NamedTuple, Optional, Tuple, Union
+
+from clova.processor.vad.peak_threshold import PeakThresholdVADProvider
+from clova.processor.vad.endpoint import DynamicEndpointer
+
+from clova.general.logger import BaseLogger
+
+# ==================================
+#         チャンクのレベル計測
+# ==================================
+
+
+# チャンクのレベル: (silent_thresh と比べるピーク値 (audioop.maxpp 互換), 平均パワー (dBFS))
+def measure_chunk(chunk: Union[bytes, bytearray, memoryview], num_ch: int) -> Tuple[int, float]:
+    pcm = np.frombuffer(chunk, dtype=np.int16)
+    peak = PeakThresholdVADProvider.maxpp(pcm)
+    mono = pcm.reshape(-1, num_ch).mean(axis=1) / 32768.0 if num_ch > 1 else pcm / 32768.0
+    dbfs = 10.0 * np.log10(np.mean(mono * mono) + 1e-10) if len(mono) > 0 else -100.0
+    return peak, float(dbfs)
+
+
+# ==================================
+#       ライブレベル表示用クラス
+# ==================================
+
+
+class MicLevelMeter:
+    # 直近のマイクのレベルを保持し、設定画面 (/levels) に渡す
+    # 発話検出スレッドと調整ツールが書き込み、HTTP サーバーのスレッドが読み出す
+    HISTORY = 50  # 保持するチャンク数
+
+    # コンストラクタ
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._peaks: Deque[int] = collections.deque(maxlen=self.HISTORY)
+        self._dbfs: Deque[float] = collections.deque(maxlen=self.HISTORY)
+        self._updated = 0.0
+        self._phase = ""
+        self._suggestion: Optional[Dict[str, Any]] = None
+
+    # チャンクのレベルを記録する
+    def feed(self, chunk: Union[bytes, bytearray, memoryview], num_ch: int) -> Tuple[int, float]:
+        peak, dbfs = measure_chunk(chunk, num_ch)
+        with self._lock:
+            self._peaks.append(peak)
+            self._dbfs.append(dbfs)
+            self._updated = time.monotonic()
+        return peak, dbfs
+
+    # 調整ツールの状態 (画面に表示するメッセージ)
+    def set_phase(self, phase: str) -> None:
+        with self._lock:
+            self._phase = phase
+
+    # 調整ツールの提案値
+    def set_suggestion(self, suggestion: Optional[Dict[str, Any]]) -> None:
+        with self._lock:
+            self._suggestion = suggestion
+
+    # JSON にできる形で現在の状態を返す (age: 最後に記録してからの秒数。記録が無ければ None)
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "peak": self._peaks[-1] if self._peaks else 0,
+                "dbfs": self._dbfs[-1] if self._dbfs else -100.0,
+                "peaks": list(self._peaks),
+                "age": time.monotonic() - self._updated if self._peaks else None,
+                "phase": self._phase,
+                "suggestion": self._suggestion,
+            }
+
+
+# ==================================
+#       マイク感度の調整クラス
+# ==================================
+
+
+class MicCalibration(NamedTuple):
+    silent_thresh: int  # 提案する silent_thresh
+    min_term_duration: int  # 提案する min_term_duration (ms)
+    on_margin_db: float  # 提案する AdaptiveNoiseFloor の on_margin_db
+    off_margin_db: float  # 提案する AdaptiveNoiseFloor の off_margin_db
+    noise_peak: int  # 周囲の雑音のピーク (99 パーセンタイル)
+    speech_peak: int  # 発話のピーク (発話チャンクの 20 パーセンタイル)
+    noise_dbfs: float  # 周囲の雑音のパワー (中央値)
+    speech_dbfs: float  # 発話のパワー (発話チャンクの 20 パーセンタイル)
+    longest_pause: int  # 発話途中の最長の間 (ms)。間が無ければ 0
+
+
+class MicCalibrator(BaseLogger):
+    # 周囲の雑音と、テスト用の発話を録音したチャンクのレベルから、しきい値を提案する
+    #   silent_thresh: 雑音の上限 (に余裕を持たせた値) と、小さめの発話の間 (対数上の中間)
+    #   min_term_duration: テスト発話の途中の最長の間 × DynamicEndpointer.PAUSE_MARGIN (間が無ければ現在の値のまま)
+    #     (長い文の後の無音時間の下限。一言だけの発話に使う term_duration (DynamicEndpointer の max_duration) は変えない)
+    #   on/off_margin_db: 雑音と発話のパワーの差の半分 (off はその半分)
+    NOISE_MARGIN = 1.5  # 雑音のピークに対する余裕 (倍率)
+    MIN_SPEECH_CHUNKS = 5  # 発話と判断できるチャンクがこれ未満なら提案しない
+    THRESH_RANGE = (10, 10000)  # 設定画面の入力範囲
+    MIN_TERM_DURATION_MIN = 300  # min_term_duration の下限 (上限は term_duration)
+    ON_MARGIN_RANGE = (6.0, 20.0)
+    PEAK_BINS = [0, 20, 40, 80, 160, 320, 640, 1280, 2560, 5120, 10240, 20480, 65536]
+
+    # コンストラクタ
+    #   chunk_duration: チャンク 1 つあたりの時間 (ms)
+    def __init__(self, chunk_duration: int, num_ch: int) -> None:
+        super().__init__()
+
+        self.chunk_duration = chunk_duration
+        self.num_ch = num_ch
+        self.noise: List[Tuple[int, float]] = []
+        self.speech: List[Tuple[int, float]] = []
+
+    # デストラクタ
+    def __del__(self) -> None:
+        super().__del__()
+
+    def add_noise(self, chunk: Union[bytes, bytearray, memoryview]) -> None:
+        self.noise.append(measure_chunk(chunk, self.num_ch))
+
+    def add_speech(self, chunk: Union[bytes, bytearray, memoryview]) -> None:
+        self.speech.append(measure_chunk(chunk, self.num_ch))
+
+    # しきい値を提案する。発話が小さすぎる (雑音と区別できない) 場合は None
+    def suggest(self, current_min_term_duration: int, term_duration: int) -> Optional[MicCalibration]:
+        if not self.noise or not self.speech:
+            return None
+
+        noise_peaks = np.array([p for p, _ in self.noise], dtype=np.float64)
+        noise_dbfs = np.array([d for _, d in self.noise], dtype=np.float64)
+        speech_peaks = np.array([p for p, _ in self.speech], dtype=np.float64)
+        speech_dbfs = np.array([d for _, d in self.speech], dtype=np.float64)
+
+        noise_peak = float(np.percentile(noise_peaks, 99))
+        noise_limit = max(noise_peak * self.NOISE_MARGIN, float(self.THRESH_RANGE[0]))
+        voiced = speech_peaks > noise_limit
+        if np.count_nonzero(voiced) < self.MIN_SPEECH_CHUNKS:
+            self.log("suggest", "発話が検出できません (雑音のピーク={:.0f}, 発話の最大={:.0f})".format(noise_peak, speech_peaks.max()))
+            return None
+
+        speech_peak = float(np.percentile(speech_peaks[voiced], 20))
+        silent_thresh = int(round(np.sqrt(noise_limit * max(speech_peak, noise_limit)) / 10.0) * 10)
+        silent_thresh = min(max(silent_thresh, self.THRESH_RANGE[0]), self.THRESH_RANGE[1])
+
+        # 提案したしきい値で区切ったときの、発話途中の最長の間
+        longest_pause = self.longest_pause(speech_peaks >= silent_thresh)
+        min_term_duration = current_min_term_duration
+        if longest_pause > 0:
+            min_term_duration = int(np.ceil((longest_pause * DynamicEndpointer.PAUSE_MARGIN + self.chunk_duration) / 100.0) * 100)
+            min_term_duration = min(max(min_term_duration, self.MIN_TERM_DURATION_MIN), term_duration)
+
+        noise_db = float(np.median(noise_dbfs))
+        speech_db = float(np.percentile(speech_dbfs[voiced], 20))
+        on_margin_db = min(max(float(round((speech_db - noise_db) / 2.0)), self.ON_MARGIN_RANGE[0]), self.ON_MARGIN_RANGE[1])
+
+        return MicCalibration(silent_thresh, min_term_duration, on_margin_db, on_margin_db / 2.0, int(noise_peak), int(speech_peak),
+                              round(noise_db, 1), round(speech_db, 1), longest_pause)
+
+    # 発話判定の列から、最初と最後の発話の間にある無音区間の最長の長さ (ms)
+    def longest_pause(self, is_speech: npt.NDArray[np.bool_]) -> int:
+        idx = np.flatnonzero(is_speech)
+        if len(idx) < 2:
+            return 0
+        gaps = np.diff(idx) - 1
+        return int(gaps.max()) * self.chunk_duration
+
+    # 雑音と発話のピークのヒストグラム (表示用の行)
+    def histogram(self, silent_thresh: Optional[int] = None, width: int = 24) -> List[str]:
+        noise_counts, _ = np.histogram([p for p, _ in self.noise], bins=self.PEAK_BINS)
+        speech_counts, _ = np.histogram([p for p, _ in self.speech], bins=self.PEAK_BINS)
+        scale = max(1, int(noise_counts.max(initial=0)), int(speech_counts.max(initial=0)))
+
+        lines = ["{:>11} | {:<{w}} | {:<{w}}".format("ピーク", "雑音", "発話", w=width)]
+        for i, (n, s) in enumerate(zip(noise_counts.tolist(), speech_counts.tolist())):
+            low, high = self.PEAK_BINS[i], self.PEAK_BINS[i + 1]
+            mark = " <- silent_thresh" if silent_thresh is not None and low <= silent_thresh < high else ""
+            lines.append("{:>5}～{:<5} | {:<{w}} | {:<{w}}{}".format(low, high, "#" * (n * width // scale) + (" {}".format(n) if n else ""),
+                                                                   "#" * (s * width // scale) + (" {}".format(s) if s else ""), mark, w=width))
+        return lines
+
+
+# ==================================
+#       本クラスのテスト用処理
+# ==================================
+
+
+def module_test() -> None:
+    rate = 16000
+    chunk = rate // 10
+    rng = np.random.default_rng(0)
+    t = np.arange(chunk) / rate
+
+    def noise() -> bytes:
+        return (rng.normal(size=chunk) * 60).astype(np.int16).tobytes()
+
+    def voice(amp: float) -> bytes:
+        return ((np.sin(2 * np.pi * 220 * t) * amp) + rng.normal(size=chunk) * 60).astype(np.int16).tobytes()
+
+    # 静かな部屋 (3秒) と、途中に 0.4 秒の間がある発話
+    calibrator = MicCalibrator(100, 1)
+    for _ in range(30):
+        calibrator.add_noise(noise())
+    for c in [noise()] * 3 + [voice(3000)] * 8 + [noise()] * 4 + [voice(1500)] * 6 + [noise()] * 5:
+        calibrator.add_speech(c)
+
+    result = calibrator.suggest(700, 3000)
+    assert result is not None
+    print(result)
+    for line in calibrator.histogram(result.silent_thresh):
+        print(line)
+    assert result.noise_peak < result.silent_thresh < result.speech_peak
+    assert result.longest_pause == 400 and result.min_term_duration == 600
+    assert 6.0 <= result.off_margin_db * 2 == result.on_margin_db <= 20.0
+
+    # 発話が聞こえない場合は提案しない
+    silent = MicCalibrator(100, 1)
+    for _ in range(30):
+        silent.add_noise(noise())
+        silent.add_speech(noise())
+    assert silent.suggest(700, 3000) is None
+
+    # ライブレベル
+    meter = MicLevelMeter()
+    assert meter.snapshot()["age"] is None
+    peak, dbfs = meter.feed(np.repeat(np.frombuffer(voice(3000), dtype=np.int16), 2).tobytes(), 2)
+    snapshot = meter.snapshot()
+    assert snapshot["peak"] == peak > 5000 and -27.0 < dbfs < -20.0 and snapshot["age"] is not None
+    print("MicCalibrator OK")
+
+
+# ==================================
+# 本モジュールを直接呼出した時の処理
+# ==================================
+if __name__ == "__main__":
+    module_test()
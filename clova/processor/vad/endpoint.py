@@ -0,0 +1,112 @@
+from clova.general.logger import BaseLogger
+
+# ==================================
+#       発話終端検出クラス
+# ==================================
+
+
+class DynamicEndpointer(BaseLogger):
+    # 発話の長さと話す速さから、発話終了と判定するのに必要な無音時間を決める
+    #   - 一言だけ話して止まった場合: まだ続きがある可能性が高いので長め (max_duration)
+    #   - 長い文を話し終えた場合: 短め (min_duration)
+    #   - 発話途中で長い間 (ま) を置く人の場合: 観測した最長の間より長くする
+    #   - 質問直後の応答 (フォローアップ): 短い返答が想定されるので follow_up_duration
+    SHORT_UTTERANCE = 800  # これ以下の発話長 (ms) では max_duration を使う
+    LONG_UTTERANCE = 3000  # これ以上の発話長 (ms) では min_duration を使う
+    PAUSE_MARGIN = 1.25  # 観測した最長の間に対する倍率
+    REFERENCE_SEGMENT_RATE = 1.5  # 標準的な話速 (発話区間数/秒)
+
+    # コンストラクタ
+    #   chunk_duration: update() 1 回あたりの時間 (ms)
+    def __init__(self, chunk_duration: int, min_duration: int, max_duration: int, follow_up_duration: int) -> None:
+        super().__init__()
+
+        self.chunk_duration = chunk_duration
+        self.min_duration = min(min_duration, max_duration)
+        self.max_duration = max_duration
+        self.follow_up_duration = min(follow_up_duration, max_duration)
+        self.reset(False)
+
+    # デストラクタ
+    def __del__(self) -> None:
+        super().__del__()
+
+    # 新しい発話の待ち受けを開始する
+    def reset(self, follow_up: bool) -> None:
+        self.follow_up = follow_up
+        self.speech_ms = 0  # 発話区間の合計
+        self.silence_ms = 0  # 現在の無音の長さ
+        self.longest_pause_ms = 0  # 発話途中の最長の間
+        self.segments = 0  # 発話区間の数
+        self._in_speech = False
+
+    # チャンクごとの発話判定結果を与える
+    def update(self, is_speech: bool) -> None:
+        if is_speech:
+            if not self._in_speech:
+                self.segments += 1
+                if self.speech_ms > 0:
+                    self.longest_pause_ms = max(self.longest_pause_ms, self.silence_ms)
+            self.speech_ms += self.chunk_duration
+            self.silence_ms = 0
+        else:
+            self.silence_ms += self.chunk_duration
+        self._in_speech = is_speech
+
+    # 発話終了と判定するのに必要な無音時間 (ms)
+    def required_silence(self) -> int:
+        if self.follow_up:
+            return self.follow_up_duration
+
+        # 発話長に応じて max_duration から min_duration へ線形に短くする
+        ratio = (self.speech_ms - self.SHORT_UTTERANCE) / (self.LONG_UTTERANCE - self.SHORT_UTTERANCE)
+        ratio = min(1.0, max(0.0, ratio))
+        duration = self.max_duration - (self.max_duration - self.min_duration) * ratio
+
+        # 話す速さ (発話区間の切り替わり頻度) が遅い人ほど間が長いので長めにする
+        if self.speech_ms > 0 and self.segments > 1:
+            segment_rate = self.segments / (self.speech_ms / 1000)
+            duration *= min(1.5, max(0.75, self.REFERENCE_SEGMENT_RATE / segment_rate))
+
+        # 発話途中の最長の間では終了させない
+        duration = max(duration, self.longest_pause_ms * self.PAUSE_MARGIN)
+
+        return int(min(self.max_duration, max(self.min_duration, duration)))
+
+    # 発話が終了したか
+    def is_end(self) -> bool:
+        return self.speech_ms > 0 and self.silence_ms >= self.required_silence()
+
+
+# ==================================
+#       本クラスのテスト用処理
+# ==================================
+
+
+def module_test() -> None:
+    ep = DynamicEndpointer(100, 700, 3000, 800)
+
+    # 一言だけ
+    for s in [True] * 5:
+        ep.update(s)
+    print("short utterance: {}ms".format(ep.required_silence()))
+    assert ep.required_silence() == 3000
+
+    # 長い文
+    for s in ([True] * 8 + [False] * 2) * 5:
+        ep.update(s)
+    print("long utterance: {}ms".format(ep.required_silence()))
+    assert ep.required_silence() < 1500
+
+    # フォローアップ
+    ep.reset(True)
+    ep.update(True)
+    print("follow up: {}ms".format(ep.required_silence()))
+    assert ep.required_silence() == 800
+
+
+# ==================================
+# 本モジュールを直接呼出した時の処理
+# ==================================
+if __name__ == "__main__":
+    module_test()
@@ -0,0 +1,187 @@
+import queue
+import threading
+import numpy as np
+
+from typing import NamedTuple, Optional
+
+from clova.processor.vad.base_vad import BaseVADProvider
+from clova.processor.vad.endpoint import DynamicEndpointer
+from clova.processor.vad.adaptive_noise_floor import AdaptiveNoiseFloorVADProvider
+from clova.processor.vad.calibration import MicLevelMeter
+
+from clova.io.local.microphone import AudioRingBuffer
+
+from clova.general.logger import BaseLogger
+
+# ==================================
+#         発話検出イベント
+# ==================================
+
+
+class ListenerEvent(NamedTuple):
+    kind: str  # SpeechListener.EVENT_*
+    start: int  # チャンクの開始位置 (リングバッファ上のバイト位置)
+    end: int  # チャンクの終了位置
+    generation: int  # SpeechListener.start() の戻り値。他のスレッドからのイベントは -1
+
+
+# ==================================
+#       発話検出スレッドクラス
+# ==================================
+
+
+class SpeechListener(BaseLogger):
+    # 録音スレッドとは別の専用スレッドでリングバッファを読み、発話判定 (VAD) と終端判定の結果をイベントとして送る
+    # 呼び出し側は events を待つだけでよく、音声処理のタイミングが呼び出し側の処理に左右されない
+    EVENT_SILENCE = "silence"  # 無音のチャンク
+    EVENT_SPEECH = "speech"  # 発話を含むチャンク
+    EVENT_END = "end"  # 発話終了 (start: 最後に発話を検出したチャンクの終了位置)
+    EVENT_INTERRUPT = "interrupt"  # 発話キューへの追加 (呼び出し側が送る)
+    EVENT_INTERFACE = "interface"  # デバッグインタフェースからのメッセージ (呼び出し側が送る)
+    READ_TIMEOUT = 0.5  # リングバッファ待ちのタイムアウト (秒)
+
+    # コンストラクタ
+    #   chunk_bytes: VAD 1 回あたりのバイト数
+    #   meter: 指定すると、処理したチャンクのレベルを記録する (設定画面のライブ表示用)
+    def __init__(self, ring: AudioRingBuffer, vad: BaseVADProvider, endpointer: DynamicEndpointer, chunk_bytes: int,
+                 events: "queue.Queue[ListenerEvent]", meter: Optional[MicLevelMeter] = None) -> None:
+        super().__init__()
+
+        self.ring = ring
+        self.vad = vad
+        self.endpointer = endpointer
+        self.chunk_bytes = chunk_bytes
+        self.events = events
+        self.meter = meter
+        self.overruns = 0  # 読み出しが追いつかずにリングバッファが上書きされた回数
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._generation = 0
+        self._active = False
+        self._read_pos = 0
+        self._follow_up = False
+
+    # デストラクタ
+    def __del__(self) -> None:
+        super().__del__()
+
+    # pos から待ち受けを開始する。以降のイベントの generation を返す
+    def start(self, pos: int, follow_up: bool) -> int:
+        with self._lock:
+            self._generation += 1
+            self._active = True
+            self._read_pos = pos
+            self._follow_up = follow_up
+
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+            self._wakeup.set()
+            return self._generation
+
+    # 待ち受けを終了する (処理中のチャンクのイベントは送られない)
+    def stop(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._active = False
+
+    def _run(self) -> None:
+        chunk = bytearray(self.chunk_bytes)
+        chunk_view = memoryview(chunk)
+        processing_generation = -1
+        level_min = level_max = 0.0
+        voice_end_pos = 0
+
+        while True:
+            self._wakeup.wait()
+            with self._lock:
+                if not self._active:
+                    self._wakeup.clear()
+                    continue
+                generation = self._generation
+                read_pos = self._read_pos
+                follow_up = self._follow_up
+
+            # 新しい待ち受けの開始時に状態をリセット (VAD・終端判定の状態はこのスレッドでのみ変更する)
+            if generation != processing_generation:
+                processing_generation = generation
+                self.vad.reset()
+                self.endpointer.reset(follow_up)
+                level_min, level_max = float("inf"), float("-inf")
+                voice_end_pos = read_pos
+
+            # データ取得
+            if not self.ring.wait_for(read_pos + self.chunk_bytes, timeout=self.READ_TIMEOUT):
+                continue
+            if read_pos < self.ring.oldest_pos:
+                # 読み出しが追いつかずに上書きされた場合は最新位置から再開
+                self.overruns += 1
+                self.log("_run", "リングバッファのオーバーラン ({}回目)".format(self.overruns))
+                read_pos = self.ring.write_pos - self.chunk_bytes
+            self.ring.read_into(read_pos, chunk_view)
+            end_pos = read_pos + self.chunk_bytes
+
+            # 発話判定と、発話長・話速に応じた無音時間での終端判定
+            is_speech = self.vad.process(chunk_view)
+            self.endpointer.update(is_speech)
+            level = self.vad.get_level()
+            level_min = min(level_min, level)
+            level_max = max(level_max, level)
+            if is_speech:
+                voice_end_pos = end_pos
+            if self.meter is not None:
+                self.meter.feed(chunk_view, self.vad.num_ch)
+
+            with self._lock:
+                if generation != self._generation:
+                    continue  # 処理中に停止・再開された
+                self._read_pos = end_pos
+
+                self.events.put(ListenerEvent(self.EVENT_SPEECH if is_speech else self.EVENT_SILENCE, read_pos, end_pos, generation))
+
+                if (not is_speech) and self.endpointer.is_end():
+                    self.log("_run", "録音終了 / Rec level: {0:.1f}～{1:.1f} / 無音 {2}ms".format(level_min, level_max, self.endpointer.silence_ms))
+                    self.events.put(ListenerEvent(self.EVENT_END, voice_end_pos, end_pos, generation))
+                    self._active = False
+
+
+# ==================================
+#       本クラスのテスト用処理
+# ==================================
+
+
+def module_test() -> None:
+    rate = 16000
+    chunk_bytes = rate // 10 * 2
+    ring = AudioRingBuffer(rate * 2 * 10)
+    events: "queue.Queue[ListenerEvent]" = queue.Queue()
+    listener = SpeechListener(ring, AdaptiveNoiseFloorVADProvider(rate, 1), DynamicEndpointer(100, 300, 500, 300), chunk_bytes, events)
+
+    rng = np.random.default_rng(0)
+    t = np.arange(rate // 10) / rate
+    noise = (rng.normal(size=rate // 10) * 200).astype(np.int16)
+    voice = (np.sin(2 * np.pi * 220 * t) * 8000).astype(np.int16) + noise
+
+    generation = listener.start(ring.write_pos, False)
+    for c in [noise] * 10 + [voice] * 5 + [noise] * 10:
+        ring.write(c.tobytes())
+
+    kinds = []
+    while True:
+        event = events.get(timeout=5)
+        assert event.generation == generation
+        kinds.append(event.kind)
+        if event.kind == SpeechListener.EVENT_END:
+            break
+    print("events: {}".format(" ".join(k[:2] for k in kinds)))
+    assert kinds.count(SpeechListener.EVENT_SPEECH) >= 5 and chunk_bytes * 15 <= event.start <= chunk_bytes * 16
+
+
+# ==================================
+# 本モジュールを直接呼出した時の処理
+# ==================================
+if __name__ == "__main__":
+    module_test()
@@ -0,0 +1,46 @@
+import numpy as np
+import numpy.typing as npt
+
+from typing import Union
+
+from clova.processor.vad.base_vad import BaseVADProvider
+
+from clova.general.logger import BaseLogger
+
+
+class PeakThresholdVADProvider(BaseVADProvider, BaseLogger):
+    # 従来の audioop.maxpp と silent_thresh による固定しきい値判定
+    def __init__(self, rate: int, num_ch: int, **kwargs: float) -> None:
+        super().__init__(rate, num_ch, **kwargs)
+
+        self.silent_thresh = kwargs["silent_thresh"]
+        self._level = 0.0
+
+    def __del__(self) -> None:
+        super().__del__()
+
+    def reset(self) -> None:
+        pass
+
+    def process(self, chunk: Union[bytes, bytearray, memoryview]) -> bool:
+        self._level = float(self.maxpp(np.frombuffer(chunk, dtype=np.int16)))
+        return self._level >= self.silent_thresh
+
+    def get_level(self) -> float:
+        return self._level
+
+    # audioop.maxpp 互換: 隣り合う極値間の差の最大値
+    @staticmethod
+    def maxpp(pcm: npt.NDArray[np.int16]) -> int:
+        x = pcm.astype(np.int32)
+        diff = np.diff(x)
+        idx = np.flatnonzero(diff)
+        if len(idx) < 2:
+            return 0
+
+        falling = diff[idx] < 0
+        extremes = x[idx[1:][falling[1:] != falling[:-1]]]
+        if len(extremes) < 2:
+            return 0
+
+        return int(np.abs(np.diff(extremes)).max())
@@ -1,17 +1,27 @@
 import sys
 import os
+import math
 import threading
 import time
+import wave
+import numpy as np
+
+from typing import Callable
+
 try:
     import RPi.GPIO as GPIO
 except ImportError:
     from fake_rpi.RPi import GPIO  # type: ignore[no-redef]
-import pyaudio as PyAudio
 
 sys.path.append(os.getcwd())
 
-from clova.general.globals import global_speech_queue  # noqa: E402
-from clova.general.voice import VoiceController  # noqa: E402
+from clova.general.globals import global_config_prov, global_speech_queue, global_audio_backend, global_audio_devices, global_mic_level  # noqa: E402
+from clova.general.voice import VoiceController, GOOGLE_SPEECH_RATE, GOOGLE_SPEECH_SIZEOF_CHUNK, MIC_RING_BUFFER_SECONDS, MIC_DEFAULT_MIN_TERM_DURATION, MIC_DEFAULT_VAD_SYSTEM  # noqa: E402
+from clova.io.local.microphone import MicrophoneStream  # noqa: E402
+from clova.io.network.http_server import HttpServer  # noqa: E402
+from clova.config.config_server import HttpReqSettingHandler  # noqa: E402
+from clova.processor.kws.template_dtw import DEFAULT_TEMPLATE_DIR  # noqa: E402
+from clova.processor.vad.calibration import MicCalibrator  # noqa: E402
 
 
 PIN_FRONT_SW = 4
@@ -25,6 +35,14 @@ PIN_LED_R = 13
 PIN_LED_G = 12
 PIN_LED_B = 6
 
+WAKE_ENROLL_COUNT = 5
+
+MIC_CALIBRATION_PORT = 8000  # 設定画面と同じポート
+MIC_NOISE_SECONDS = 3  # 周囲の雑音の測定時間
+MIC_SPEECH_SECONDS = 6  # テスト用の発話の測定時間
+MIC_CALIBRATION_PHRASE = "ねえクローバー、明日の天気を教えて。それと、ニュースも読んで"
+MIC_LEVEL_BAR_WIDTH = 40
+
 # ==================================
 #           テスト用クラス
 # ==================================
@@ -153,24 +171,122 @@ class TestClass:
         GPIO.cleanup(PIN_LED_G)
         GPIO.cleanup(PIN_LED_B)
 
-    def scan_indexes(self) -> None:
-        pyaud = PyAudio.PyAudio()
+    # ウェイクワードのテンプレートを録音する
+    def enroll_wake_word(self) -> None:
+        voice = VoiceController()
+        voice.kws = None
+        global_speech_queue.clear()
 
-        print("デバイスインデックス総数: {0}".format(pyaud.get_device_count()))
+        os.makedirs(DEFAULT_TEMPLATE_DIR, exist_ok=True)
+        print("テンプレートの保存先: {}".format(DEFAULT_TEMPLATE_DIR))
 
-        found_index = -1
-        for i in range(pyaud.get_device_count()):
-            line_str = pyaud.get_device_info_by_index(i)
-            print(line_str)
-            json_data = line_str  # json.loads(line_str)
+        num = 0
+        while num < WAKE_ENROLL_COUNT:
+            print("[{}/{}] 「ねえクローバー」と話しかけてください".format(num + 1, WAKE_ENROLL_COUNT))
+            audio = voice.microphone_record()
+            if not audio:
+                continue
 
-            # print("{}:{},{},{}".format(json_data["index"],json_data["name"],json_data["maxInputChannels"],json_data["maxOutputChannels"])) #デバッグ用
-            if ((json_data["name"] == "dmic_hw") and (json_data["maxInputChannels"] != 0) and (json_data["maxOutputChannels"] != 0)):
-                found_index = int(json_data["index"])
+            pcm = np.frombuffer(audio, dtype=np.int16)
+            path = os.path.join(DEFAULT_TEMPLATE_DIR, "wake_{}.wav".format(int(time.time() * 1000)))
+            with wave.open(path, "wb") as wav:
+                wav.setnchannels(1)
+                wav.setsampwidth(2)
+                wav.setframerate(GOOGLE_SPEECH_RATE)
+                wav.writeframes(pcm.tobytes())
+            print("保存しました: {} ({:.1f}秒)".format(path, len(pcm) / GOOGLE_SPEECH_RATE))
+            num += 1
+
+    # マイクのレベルを測り、silent_thresh と term_duration を提案する
+    def adjust_mic(self) -> None:
+        conf = global_config_prov.get_user_config()
+        mic_conf = conf["hardware"]["audio"]["microphone"]
+        num_ch = mic_conf["num_ch"]
+        device_index = global_audio_devices.resolve(mic_conf.get("device_name"), True, num_ch, mic_conf["index"])
+        mic = MicrophoneStream(global_audio_backend, num_ch, device_index, GOOGLE_SPEECH_RATE, GOOGLE_SPEECH_SIZEOF_CHUNK, MIC_RING_BUFFER_SECONDS)
+        calibrator = MicCalibrator(GOOGLE_SPEECH_SIZEOF_CHUNK * 1000 // GOOGLE_SPEECH_RATE, num_ch)
+
+        # 測定中のレベルは設定画面にも表示する (CLOVA_RasPi 本体はマイクを使うので、停止してから実行する)
+        HttpServer(MIC_CALIBRATION_PORT, HttpReqSettingHandler, threaded=True)
+        print("設定画面 (http://<ラズパイのIPアドレス>:{}) でもレベルを確認できます".format(MIC_CALIBRATION_PORT))
+
+        mic.start()
+        try:
+            input("[1/2] 普段の生活音はそのままで、話さずに [Enter] を押してください ({}秒間測定します)".format(MIC_NOISE_SECONDS))
+            self._measure_levels(mic, MIC_NOISE_SECONDS, calibrator.add_noise, "周囲の雑音を測定中")
+            input("[2/2] [Enter] を押した後、「{}」と普段の声で話しかけてください ({}秒間測定します)".format(MIC_CALIBRATION_PHRASE, MIC_SPEECH_SECONDS))
+            self._measure_levels(mic, MIC_SPEECH_SECONDS, calibrator.add_speech, "発話を測定中")
+        finally:
+            mic.stop()
+
+        min_term_duration = mic_conf.get("min_term_duration", MIC_DEFAULT_MIN_TERM_DURATION)
+        result = calibrator.suggest(min_term_duration, mic_conf["term_duration"])
+        print()
+        for line in calibrator.histogram(result.silent_thresh if result is not None else None):
+            print(line)
+        print()
+        if result is None:
+            print("発話が雑音と区別できませんでした。マイクに近づくか、周囲を静かにしてもう一度試してください")
+            return
+
+        vad_conf = mic_conf.get("vad", {"system": MIC_DEFAULT_VAD_SYSTEM, "params": {}})
+        adaptive = vad_conf["system"] == "AdaptiveNoiseFloor"
+        print("雑音: ピーク {} / {:.1f} dBFS, 発話: ピーク {} / {:.1f} dBFS, 発話途中の最長の間: {}ms".format(
+              result.noise_peak, result.noise_dbfs, result.speech_peak, result.speech_dbfs, result.longest_pause))
+        print("silent_thresh: {} -> {}".format(mic_conf["silent_thresh"], result.silent_thresh))
+        print("min_term_duration: {} -> {} (term_duration は {} のまま)".format(min_term_duration, result.min_term_duration, mic_conf["term_duration"]))
+        if adaptive:
+            print("vad.params.on_margin_db: {} -> {}".format(vad_conf["params"].get("on_margin_db", "(既定値)"), result.on_margin_db))
+            print("vad.params.off_margin_db: {} -> {}".format(vad_conf["params"].get("off_margin_db", "(既定値)"), result.off_margin_db))
+            print("(silent_thresh は vad を PeakThreshold にした場合にのみ使われます。AdaptiveNoiseFloor では on/off_margin_db で判定します)")
+        global_mic_level.set_phase("測定が終わりました")
+        global_mic_level.set_suggestion(result._asdict())
+
+        if input("設定ファイルに書き込みますか? [y/N] ").strip().lower() != "y":
+            return
+        mic_conf["silent_thresh"] = result.silent_thresh
+        mic_conf["min_term_duration"] = result.min_term_duration
+        if adaptive:
+            vad_conf["params"]["on_margin_db"] = result.on_margin_db
+            vad_conf["params"]["off_margin_db"] = result.off_margin_db
+            mic_conf["vad"] = vad_conf
+        global_config_prov.commit_user_config(conf)
+        print("書き込みました")
+
+    # 指定時間分のチャンクを add に渡しながら、レベルを表示する
+    def _measure_levels(self, mic: MicrophoneStream, seconds: int, add: Callable[[bytes], None], phase: str) -> None:
+        global_mic_level.set_phase(phase)
+        chunk_bytes = GOOGLE_SPEECH_SIZEOF_CHUNK * mic.bytes_per_frame
+        pos = mic.ring.write_pos
+        for _ in range(seconds * GOOGLE_SPEECH_RATE // GOOGLE_SPEECH_SIZEOF_CHUNK):
+            if not mic.ring.wait_for(pos + chunk_bytes, timeout=1.0):
+                print("マイクから入力がありません")
+                break
+            chunk = mic.ring.read(pos, pos + chunk_bytes)
+            pos += chunk_bytes
+            add(chunk)
+
+            # ピーク値を対数目盛りで表示 (10～32768)
+            peak, dbfs = global_mic_level.feed(chunk, mic.num_ch)
+            bar = int(MIC_LEVEL_BAR_WIDTH * max(0.0, math.log10(max(peak, 10)) - 1) / (math.log10(32768) - 1))
+            print("\r{:>5} |{:<{w}}| {:6.1f} dBFS".format(peak, "#" * bar, dbfs, w=MIC_LEVEL_BAR_WIDTH), end="", flush=True)
+        print()
+        global_mic_level.set_phase("")
 
-        if (found_index != -1):
-            print("入力(MIC)デバイスインデックス = {}".format(found_index))
-            print("出力(SPEAKER)デバイスインデックス = {}".format(found_index))
+    def scan_indexes(self) -> None:
+        # キャッシュを使わずに列挙し直す (キャッシュも更新される)
+        devices = global_audio_devices.get_devices(use_cache=False)
+
+        print("デバイスインデックス総数: {0}".format(len(devices)))
+        for device in devices:
+            print(device)
+
+        mic = global_audio_devices.find("dmic_hw", True, 1)
+        speaker = global_audio_devices.find("dmic_hw", False, 1)
+        if (mic is not None) and (speaker is not None):
+            print("入力(MIC)デバイスインデックス = {}".format(mic.device_index))
+            print("出力(SPEAKER)デバイスインデックス = {}".format(speaker.device_index))
+            print("(\"device_name\": \"dmic_hw\" を設定している場合は、起動時に自動で検出します)")
         else:
             print("該当するものが見当たりません。設定が正しいか確認してください。")
 
@@ -220,9 +336,13 @@ def module_test() -> None:
         elif (sys.argv[1] == "get_indexes"):
             test.scan_indexes()
 
+        # ウェイクワードの登録
+        elif (sys.argv[1] == "enroll_wake"):
+            test.enroll_wake_word()
+
         # マイクの最低音量調整
         elif (sys.argv[1] == "adjust_mic"):
-            print("マイクの最低音量調整用のテストは未実装")
+            test.adjust_mic()
 
         # それ以外(不正)の場合
         else:
@@ -233,7 +353,7 @@ def module_test() -> None:
 
     # ヘルプ表示
     else:
-        print("Usage> python {} [ hw_test | get_indexes | adjust_mic ]".format(sys.argv[0]))
+        print("Usage> python {} [ hw_test | get_indexes | adjust_mic | enroll_wake ]".format(sys.argv[0]))
 
 
 # ==================================
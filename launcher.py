@@ -1,4 +1,4 @@
-from clova.general.conversation import ConversationController
+from clova.general.conversation import ConversationController, StreamingAnswer
 from clova.general.voice import VoiceController
 
 from clova.general.globals import global_led_ill, global_vol, global_character_prov, global_speech_queue, global_debug_interface
@@ -12,9 +12,13 @@ from clova.io.local.switch import SwitchInput
 
 from clova.general.logger import Logger
 
+from typing import Optional
+
 import platform
 import time
 
+ANSWER_WAIT_INTERVAL = 0.5  # 応答の続きの文を待つ間に、割り込み発話を確認する間隔 (秒)
+
 
 def main() -> None:
     logger = Logger("LAUNCHER")
@@ -24,7 +28,7 @@ def main() -> None:
 
     # HTTPサーバー系のインスタンス作成
     line_svr = HttpServer(8080, HttpReqLineHandler)
-    config_svr = HttpServer(8000, HttpReqSettingHandler)
+    config_svr = HttpServer(8000, HttpReqSettingHandler, threaded=True)
 
     # LINE送信モジュールのインスタンス
     line_sender = LineSkillProvider()
@@ -52,8 +56,16 @@ def main() -> None:
         logger.log("main", "\033[93mplatform.system()がWindowsまたはDarwinを返しました。プログラムはデバッグセッションであることを想定し、メインループで実際にマイクを起動しません。\033[0m")
         is_debug_session = True
 
+    # 生成中の応答 (完成した文から発話キューに追加される)
+    answering: Optional[StreamingAnswer] = None
+
     # メインループ
     while True:
+        # 割り込み発話で再生を止めたら、生成中の応答の残りは読み上げない
+        if (answering is not None) and voice.playback_stopped:
+            answering.cancel()
+            global_speech_queue.clear()
+
         str_or_func = conv.check_for_interrupted_voice()
 
         # 割り込み音声ありの時
@@ -70,6 +82,22 @@ def main() -> None:
             else:
                 logger.log("main", "音声ファイルを取得できませんでした。")
 
+        # 応答の生成中は、続きの文が届くのを待つ
+        elif answering is not None:
+            if not answering.wait(ANSWER_WAIT_INTERVAL):
+                continue
+
+            if answering.cancelled:
+                conv.expects_follow_up(answering.result)  # スキルが尋ねた状態は読み捨てる
+                voice.set_follow_up(False)
+            else:
+                # 質問で終わる応答の後は、短い返答を想定して待ち受ける
+                voice.set_follow_up(conv.expects_follow_up(answering.result))
+                if answering.result != "":
+                    global_debug_interface.send_all(answering.result)
+                    logger.log("main", "応答メッセージ:{}".format(answering.result))
+            answering = None
+
         # 割り込み音声無の時
         else:
             answer_result = None
@@ -104,8 +132,14 @@ def main() -> None:
                 is_exit = True
 
             else:
-                # 会話モジュールから、問いかけに対する応答を取得
-                answer_result = conv.get_answer(stt_result)
+                # 会話モジュールで問いかけに対する応答を生成し、完成した文から読み上げる
+                # (最初の文ができるまでに時間がかかる場合は応答待ちの効果音を鳴らす)
+                voice.start_thinking()
+                try:
+                    answering = StreamingAnswer(conv, stt_result)
+                    answering.wait()
+                finally:
+                    voice.stop_thinking()
                 is_exit = False
 
             # 応答が空でなかったら再生する。